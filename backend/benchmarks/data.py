@@ -0,0 +1,70 @@
+"""Synthetic prompt libraries for benchmarks."""
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+TAGS = [
+    "code", "review", "writing", "sql", "support", "marketing", "legal", "finance",
+    "research", "summarize", "translate", "classify", "extract", "email", "sre", "qa",
+]
+TOOLS = ["openai", "claude", "gemini", "groq", "ollama", "generic", "copilot", "my-local-llm"]
+CATEGORIES = ["code", "content", "business", "data", "ops", ""]
+WORDS = (
+    "analyze context customer data draft explain format guidelines helpful improve "
+    "instructions language output performance persona policy provide query question "
+    "respond review rules safety step structured summary task thorough tone user "
+    "validate verify workflow concise accurate example evidence constraints"
+).split()
+VARIABLES = ["topic", "audience", "tone", "language", "code", "document", "product", "company"]
+
+_MARKER = ".benchmark-complete"
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _prompt_text(rng: random.Random, i: int) -> str:
+    variables = rng.sample(VARIABLES, rng.randint(0, 3))
+    tags = rng.sample(TAGS, rng.randint(1, 4))
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)
+    body = [f"You are an expert assistant for {{{{{variables[0]}}}}}." if variables else "You are an expert assistant."]
+    for section in ("Task", "Instructions", "Constraints", "Output Format"):
+        body.append(f"\n## {section}")
+        body.extend(f"- {_paragraph(rng, rng.randint(6, 16))}" for _ in range(rng.randint(2, 6)))
+    for var in variables[1:]:
+        body.append(f"\nUse {{{{{var}}}}} where relevant.")
+    lines = [
+        "---",
+        f"name: prompt-{i:06d}",
+        f"description: {_paragraph(rng, rng.randint(5, 12))}",
+        "tags:",
+        *(f"- {t}" for t in tags),
+        f"tool: {rng.choice(TOOLS)}",
+        *(["variables:", *(f"- {v}" for v in variables)] if variables else ["variables: []"]),
+        f"created_at: '{created.isoformat()}'",
+        f"updated_at: '{created.isoformat()}'",
+    ]
+    category = rng.choice(CATEGORIES)
+    if category:
+        lines.append(f"category: {category}")
+    lines.append("---")
+    return "\n".join(lines) + "\n" + "\n".join(body) + "\n"
+
+
+def generate_library(directory: Path, size: int, seed: int = 0) -> Path:
+    """Write `size` prompt files into directory, reusing a previous run's output."""
+    marker = directory / _MARKER
+    if marker.exists() and marker.read_text() == f"{size}:{seed}":
+        return directory
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale in directory.iterdir():
+        if stale.is_file():
+            stale.unlink()
+    rng = random.Random(seed)
+    for i in range(size):
+        (directory / f"prompt-{i:06d}.md").write_text(_prompt_text(rng, i))
+    marker.write_text(f"{size}:{seed}")
+    return directory
@@ -0,0 +1,223 @@
+"""Benchmarks for the store, renderer, exporter and API hot paths.
+
+    python -m benchmarks.run --sizes 100,10000 --out results.json
+    python -m benchmarks.run --compare old.json new.json
+
+Each benchmark reports throughput and p50/p99 latency. Synthetic libraries
+are generated once per size under --workdir and reused by later runs.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from .data import generate_library
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 1) -> dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "total_s": total,
+        "ops_per_s": iterations / total if total else float("inf"),
+        "p50_ms": statistics.median(samples) * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+def _iterations(size: int, per_item: bool) -> int:
+    # Whole-library operations get fewer rounds on big libraries.
+    if per_item:
+        return 2000
+    return max(3, min(200, 200_000 // max(size, 1)))
+
+
+def bench_size(directory: Path, size: int) -> dict[str, dict[str, float]]:
+    from prompter.core.index import INDEX_FILENAME
+    from prompter.core.renderer import render_prompt, template_cache
+    from prompter.core.store import PromptStore
+    from prompter.tools.exporters import export_prompt
+
+    rng = random.Random(1)
+    ids = [p.stem for p in sorted(directory.glob("*.md"))]
+    results: dict[str, dict[str, float]] = {}
+    whole = _iterations(size, per_item=False)
+    single = _iterations(size, per_item=True)
+
+    def cold_list():
+        (directory / INDEX_FILENAME).unlink(missing_ok=True)
+        PromptStore(directory).list_prompts()
+
+    results["store.list_prompts[cold]"] = measure(cold_list, max(1, whole // 10), warmup=0)
+    store = PromptStore(directory)
+    results["store.list_prompts[indexed]"] = measure(store.list_prompts, whole)
+    results["store.query[tag+limit]"] = measure(lambda: store.query(tag="code", limit=50), whole)
+    results["store.search"] = measure(lambda: store.search("structured output"), single)
+    results["store.get_prompt[uncached]"] = measure(lambda: store.get_prompt(rng.choice(ids)), single)
+    cached = PromptStore(directory, cache_size=len(ids))
+    results["store.get_prompt[cached]"] = measure(lambda: cached.get_prompt(rng.choice(ids)), single)
+
+    results.update(bench_backends(directory, ids, whole, single, rng))
+    results.update(bench_build(directory, whole))
+
+    prompts = [store.get_prompt(i) for i in ids[:200]]
+    variables = {v: v.upper() for v in ("topic", "audience", "tone", "language", "code", "document", "product", "company")}
+    template_cache.clear()
+
+    def render():
+        p = rng.choice(prompts)
+        render_prompt(p.content, variables, key=p.id)
+
+    results["render_prompt"] = measure(render, single)
+    for fmt in ("messages", "markdown", "openai"):
+        results[f"export_prompt[{fmt}]"] = measure(
+            lambda fmt=fmt: export_prompt(rng.choice(prompts), fmt, directory=directory), single,
+        )
+    results.update(bench_api(directory, ids, variables, whole, single, rng))
+    return results
+
+
+def bench_backends(
+    directory: Path,
+    ids: list[str],
+    whole: int,
+    single: int,
+    rng: random.Random,
+) -> dict[str, dict[str, float]]:
+    """The same store operations on the SQLite and in-memory backends. The
+    SQLite copy lives in a sibling directory so the two don't share an index."""
+    from prompter.core.backends import MarkdownBackend, MemoryBackend, SQLiteBackend, migrate
+    from prompter.core.store import PromptStore
+
+    results = {}
+    source = MarkdownBackend(directory)
+    for backend in (SQLiteBackend(directory.with_name(directory.name + "-sqlite")), MemoryBackend()):
+        migrate(source, backend)
+        store = PromptStore(backend.directory if backend.persistent else directory, backend=backend)
+        results[f"store[{backend.kind}].list_prompts"] = measure(store.list_prompts, whole)
+        results[f"store[{backend.kind}].get_prompt"] = measure(lambda: store.get_prompt(rng.choice(ids)), single)
+    return results
+
+
+def bench_build(directory: Path, whole: int) -> dict[str, dict[str, float]]:
+    """prompter build from scratch and with nothing to do, on all CPUs."""
+    from prompter.core.store import PromptStore
+    from prompter.tools.bundle import build_directory
+
+    store = PromptStore(directory)
+    out = directory.with_name(directory.name + "-build")
+    workers = os.cpu_count() or 1
+    results = {
+        "build[full]": measure(
+            lambda: build_directory(store, out, workers, force=True), max(1, whole // 20), warmup=0,
+        ),
+        "build[unchanged]": measure(lambda: build_directory(store, out, workers), max(1, whole // 4)),
+    }
+    shutil.rmtree(out, ignore_errors=True)
+    return results
+
+
+def bench_api(
+    directory: Path,
+    ids: list[str],
+    variables: dict[str, str],
+    whole: int,
+    single: int,
+    rng: random.Random,
+) -> dict[str, dict[str, float]]:
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:  # httpx missing
+        return {}
+    from prompter import api
+
+    api.DEFAULT_DIR = str(directory)
+    results = {}
+    with TestClient(api.app) as client:
+        results["api GET /prompts"] = measure(lambda: client.get("/prompts"), whole)
+        results["api GET /prompts?limit=50"] = measure(lambda: client.get("/prompts", params={"limit": 50}), single // 4)
+        results["api GET /prompts/{id}"] = measure(lambda: client.get(f"/prompts/{rng.choice(ids)}"), single // 4)
+        results["api POST /render"] = measure(
+            lambda: client.post(f"/prompts/{rng.choice(ids)}/render", json={"variables": variables}), single // 4,
+        )
+        results["api POST /export"] = measure(
+            lambda: client.post(f"/prompts/{rng.choice(ids)}/export", params={"fmt": "openai"}), single // 4,
+        )
+    return results
+
+
+def run(sizes: list[int], workdir: Path, out: Path | None) -> dict:
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    for size in sizes:
+        directory = generate_library(workdir / f"lib-{size}", size)
+        print(f"\n== {size} prompts ({directory})")
+        results = bench_size(directory, size)
+        for name, r in results.items():
+            print(f"{name:32} {r['ops_per_s']:>12.1f} ops/s  p50 {r['p50_ms']:>9.3f}ms  p99 {r['p99_ms']:>9.3f}ms")
+        report["sizes"][str(size)] = results
+    if out is not None:
+        out.write_text(json.dumps(report, indent=2))
+        print(f"\nWrote {out}")
+    return report
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    old = json.loads(old_path.read_text())["sizes"]
+    new = json.loads(new_path.read_text())["sizes"]
+    for size in sorted(new.keys() & old.keys(), key=int):
+        print(f"\n== {size} prompts: p50 old -> new")
+        for name in new[size]:
+            if name not in old[size]:
+                continue
+            a, b = old[size][name]["p50_ms"], new[size][name]["p50_ms"]
+            change = (b - a) / a * 100 if a else 0.0
+            print(f"{name:32} {a:>9.3f}ms -> {b:>9.3f}ms  {change:+6.1f}%")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,10000", help="Comma-separated library sizes (e.g. 100,10000,100000)")
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "prompter-bench")
+    parser.add_argument("--out", type=Path, default=None, help="Write results as JSON")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"), help="Compare two result files")
+    parser.add_argument("--clean", action="store_true", help="Delete generated libraries afterwards")
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+    # Keep the API's default directory from pointing at the caller's cwd.
+    os.environ.setdefault("PROMPTER_DIR", str(args.workdir))
+    try:
+        run([int(s) for s in args.sizes.split(",") if s], args.workdir, args.out)
+    finally:
+        if args.clean:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
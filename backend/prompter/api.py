@@ -1,129 +1,693 @@
 from __future__ import annotations
 
+import functools
+import gzip
+import hashlib
+import json
 import os
-
-from fastapi import FastAPI, HTTPException
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, Iterator
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from jinja2 import TemplateError
+
+from .core.aio import AsyncPromptStore, IOExecutor, StoreBusyError
+from .core.archive import COMPRESSIONS, iter_pack, unpack
+from .core import metrics
+from .core.models import (
+    BulkResult, Prompt, PromptCreate, PromptListItem, PromptUpdate, RenderRequest, Revision, SearchHit,
+)
+from .core.renderer import (
+    missing_variables, output_cache, output_key, render_prompt, render_row, template_cache,
+    template_references,
+)
+from .core.store import PromptStore, TemplateStore, data_file_signature, load_hints, load_scaffold
+from .tools.bundle import export_archive, resolve_targets
+from .tools.exporters import list_providers, resolve_format
+
+DEFAULT_DIR = os.environ.get("PROMPTER_DIR", os.path.join(os.getcwd(), "prompts"))
+
+# Store I/O runs on its own bounded pool so a slow PROMPTER_DIR cannot starve
+# routes that never touch it (hints, scaffolds, stats).
+_io = IOExecutor(
+    max_workers=int(os.environ.get("PROMPTER_IO_WORKERS", "8")),
+    max_queue=int(os.environ.get("PROMPTER_IO_QUEUE", "0")),
+)
+
 
-from .core.models import Prompt, PromptCreate, PromptListItem, PromptUpdate, RenderRequest
-from .core.renderer import render_prompt
-from .core.store import PromptStore, TemplateStore, load_hints, load_scaffold
-from .tools.exporters import export_prompt, list_providers
+# PROMPTER_WATCH=1 keeps caches hot from filesystem events (inotify via the
+# optional watchfiles package, else polling); PROMPTER_WATCH=poll forces polling.
+_WATCH = os.environ.get("PROMPTER_WATCH", "").lower()
 
-app = FastAPI(title="Prompter API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    watcher = None
+    # Only files can be watched; other backends keep stat-validating reads.
+    if _WATCH in ("1", "true", "yes", "poll") and _store().store.backend.watchable:
+        from .core.watcher import PromptWatcher
+
+        watcher = PromptWatcher(_store().store, force_polling=_WATCH == "poll")
+        await _io.run(watcher.start)
+    yield
+    if watcher is not None:
+        watcher.stop()
+    _io.shutdown()
+
+
+app = FastAPI(title="Prompter API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "ETag", "Last-Modified", "Server-Timing", "X-Export-Errors", "X-Export-Files", "X-Next-Cursor",
+        "X-Total-Count",
+    ],
 )
 
-DEFAULT_DIR = os.environ.get("PROMPTER_DIR", os.path.join(os.getcwd(), "prompts"))
+
+# --- Metrics ---
+
+_requests = metrics.registry.counter(
+    "prompter_http_requests", "HTTP requests by route, method and status.", ("route", "method", "status"),
+)
+_request_seconds = metrics.registry.histogram(
+    "prompter_http_request_duration_seconds",
+    "Time from receiving a request to sending its response headers.",
+    ("route", "method"),
+)
+
+
+def _route(scope) -> str:
+    # The path template, not the path, so ids don't become label values.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class _MetricsMiddleware:
+    """Counts and times every request, and sends a Server-Timing header
+    with the time spent in each stage (load, save, render, export).
+
+    Streamed bodies are produced after the headers are sent, so for those
+    the timings cover the work done before streaming starts.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_timed(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - start
+                _request_seconds.observe(elapsed, route=_route(scope), method=scope["method"])
+                header = metrics.server_timing(timings, elapsed).encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        with metrics.measure_request() as timings:
+            try:
+                await self.app(scope, receive, send_timed)
+            finally:
+                _requests.inc(route=_route(scope), method=scope["method"], status=str(status))
+
+
+app.add_middleware(_MetricsMiddleware)
+
+_BATCH_SPOOL_BYTES = 8 * 1024 * 1024
+_BATCH_CHUNK_ROWS = 256
 
 
-def _store() -> PromptStore:
-    return PromptStore(DEFAULT_DIR)
+_CACHE_SIZE = int(os.environ.get("PROMPTER_CACHE_SIZE", "1024"))
+_SHARED_CACHE = os.environ.get("PROMPTER_SHARED_CACHE", "1").lower() not in ("0", "false", "no", "")
+
+# One long-lived store per directory, so parsed prompts stay warm in memory
+# across requests; with the shared cache, also across worker processes.
+_stores: dict[str, PromptStore] = {}
+_templates: TemplateStore | None = None
+
+
+def _store() -> AsyncPromptStore:
+    store = _stores.get(DEFAULT_DIR)
+    if store is None:
+        store = _stores.setdefault(
+            DEFAULT_DIR, PromptStore(DEFAULT_DIR, cache_size=_CACHE_SIZE, shared=_SHARED_CACHE),
+        )
+    return AsyncPromptStore(store, _io)
 
 
 def _template_store() -> TemplateStore:
-    return TemplateStore()
+    global _templates
+    if _templates is None:
+        _templates = TemplateStore(cache_size=_CACHE_SIZE)
+    return _templates
+
+
+# --- Conditional requests ---
+
+# Prompts change at any time: clients may keep them but must revalidate.
+_REVALIDATE = "no-cache"
+# hints.json and scaffolds.json only change when Prompter is upgraded.
+_STATIC_DATA = "public, max-age=3600"
+
+
+def _etag(*parts) -> str:
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _is_fresh(request: Request, etag: str, last_modified: datetime | None = None) -> bool:
+    """Whether the client's copy is current. If-None-Match decides when it is
+    sent; If-Modified-Since is only consulted without it (RFC 9110 13.2.2).
+
+    On POST (render, export), the ETag names a result the client got
+    before, so only an exact tag matches: "*" would answer 304 without
+    checking the request at all."""
+    header = request.headers.get("if-none-match")
+    if header is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+        return etag in tags or ("*" in tags and request.method in ("GET", "HEAD"))
+    header = request.headers.get("if-modified-since")
+    if header is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def _not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+@app.exception_handler(StoreBusyError)
+async def store_busy_handler(request: Request, exc: StoreBusyError):
+    return JSONResponse({"detail": "Server busy, retry later"}, status_code=503, headers={"Retry-After": "1"})
+
+
+_NDJSON = "application/x-ndjson"
+_NDJSON_CHUNK = 64 * 1024
+
+
+def _wants_ndjson(request: Request) -> bool:
+    return _NDJSON in request.headers.get("accept", "")
+
+
+async def _on_io(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Drive a blocking iterator on the I/O pool, one chunk per call, rather
+    than on the default threadpool Starlette would use for it."""
+    while (chunk := await _io.run(next, chunks, None)) is not None:
+        yield chunk
+
+
+def _ndjson(items, headers: dict[str, str] | None = None) -> StreamingResponse:
+    """Serialize models one line at a time from a (sync) iterator. Producing
+    items may read the index or prompt files, so it runs on the I/O pool."""
+
+    def lines():
+        buffer = bytearray()
+        for item in items:
+            buffer += item.model_dump_json().encode() + b"\n"
+            if len(buffer) >= _NDJSON_CHUNK:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+
+    return StreamingResponse(_on_io(lines()), media_type=_NDJSON, headers=headers)
 
 
 @app.get("/prompts", response_model=list[PromptListItem])
-def list_prompts_route():
-    return _store().list_prompts()
+async def list_prompts_route(
+    request: Request,
+    response: Response,
+    tag: str | None = None,
+    tool: str | None = None,
+    category: str | None = None,
+    tag_contains: str | None = Query(None, description="Case-insensitive substring of any tag"),
+    q: str | None = Query(None, description="Case-insensitive substring of name or description"),
+    prefix: str | None = Query(None, description="Case-insensitive prefix of name"),
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+):
+    """List prompts sorted by id. Filters combine with AND. When a page is cut
+    short by limit, the X-Next-Cursor header holds the cursor for the next one.
+
+    With `Accept: application/x-ndjson`, items are streamed one per line; an
+    unfiltered listing is then read from the index in batches as it is sent.
+    """
+    unfiltered = not any((tag, tool, category, tag_contains, q, prefix, limit, cursor))
+    if unfiltered and _wants_ndjson(request):
+        return _ndjson(_store().store.iter_list_prompts())
+    try:
+        items, total, next_cursor = await _store().query(
+            tag=tag, tool=tool, category=category, tag_contains=tag_contains, q=q, prefix=prefix,
+            limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    headers = {"X-Total-Count": str(total)}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if _wants_ndjson(request):
+        return _ndjson(items, headers)
+    response.headers.update(headers)
+    return items
+
+
+@app.get("/search", response_model=list[SearchHit])
+async def search_prompts(q: str, limit: int = Query(20, ge=1, le=200)):
+    """Full-text search over prompt names, descriptions, tags and bodies,
+    ranked by BM25, with a highlighted snippet per hit."""
+    try:
+        return await _store().search(q, limit)
+    except RuntimeError as e:
+        raise HTTPException(501, str(e))
+
+
+_ARCHIVE_TYPES = {"gzip": "application/gzip", "zstd": "application/zstd", "none": "application/x-ndjson"}
+_ARCHIVE_SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}
+
+
+@app.get("/archive")
+async def pack_prompts(compression: str = "gzip"):
+    """Stream the whole library as one compressed JSONL archive."""
+    if compression not in COMPRESSIONS:
+        raise HTTPException(400, f"compression must be one of {', '.join(COMPRESSIONS)}")
+    try:
+        chunks = iter_pack(_store().store.iter_prompts(), compression)
+    except RuntimeError as e:  # zstandard not installed
+        raise HTTPException(400, str(e))
+    return StreamingResponse(
+        _on_io(chunks),
+        media_type=_ARCHIVE_TYPES[compression],
+        headers={"Content-Disposition": f'attachment; filename="prompts{_ARCHIVE_SUFFIXES[compression]}"'},
+    )
+
+
+@app.post("/archive", response_model=BulkResult)
+async def unpack_prompts(request: Request, overwrite: bool = False):
+    """Load an archive produced by GET /archive (or `prompter pack`).
+    Existing prompts are reported as conflicts unless overwrite is set."""
+    body = tempfile.SpooledTemporaryFile(max_size=_BATCH_SPOOL_BYTES)
+    with body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        try:
+            return await _io.run(unpack, _store().store, body, overwrite)
+        except (ValueError, RuntimeError, EOFError, gzip.BadGzipFile) as e:
+            raise HTTPException(400, f"Invalid archive: {e}")
 
 
 @app.get("/prompts/{prompt_id}", response_model=Prompt)
-def get_prompt(prompt_id: str):
+async def get_prompt(prompt_id: str, request: Request, response: Response):
+    """Get a prompt. The ETag comes from the file's stat signature, so a
+    matching If-None-Match is answered with 304 without reading the file."""
+    store = _store()
     try:
-        return _store().get_prompt(prompt_id)
+        etag = _etag(await store.signature(prompt_id))
+        headers = {"ETag": etag, "Cache-Control": _REVALIDATE}
+        if _is_fresh(request, etag):
+            return _not_modified(headers)
+        prompt = await store.get_prompt(prompt_id)
     except FileNotFoundError:
         raise HTTPException(404, "Prompt not found")
+    if _is_fresh(request, etag, prompt.updated_at):
+        return _not_modified(headers)
+    headers["Last-Modified"] = _http_date(prompt.updated_at)
+    response.headers.update(headers)
+    return prompt
 
 
 @app.post("/prompts", response_model=Prompt, status_code=201)
-def create_prompt(data: PromptCreate):
+async def create_prompt(data: PromptCreate):
     try:
-        return _store().create_prompt(data)
+        return await _store().create_prompt(data)
     except FileExistsError:
         raise HTTPException(409, "Prompt already exists")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 
 @app.put("/prompts/{prompt_id}", response_model=Prompt)
-def update_prompt(prompt_id: str, data: PromptUpdate):
+async def update_prompt(prompt_id: str, data: PromptUpdate):
     try:
-        return _store().update_prompt(prompt_id, data)
+        return await _store().update_prompt(prompt_id, data)
     except FileNotFoundError:
         raise HTTPException(404, "Prompt not found")
+    except FileExistsError:
+        raise HTTPException(409, "Prompt already exists with that name")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 
 @app.delete("/prompts/{prompt_id}", status_code=204)
-def delete_prompt(prompt_id: str):
+async def delete_prompt(prompt_id: str):
     try:
-        _store().delete_prompt(prompt_id)
+        await _store().delete_prompt(prompt_id)
     except FileNotFoundError:
         raise HTTPException(404, "Prompt not found")
 
 
+@app.get("/prompts/{prompt_id}/revisions", response_model=list[Revision])
+async def list_revisions(prompt_id: str):
+    """Every saved revision of a prompt, oldest first; kept after deletion."""
+    try:
+        return await _store().revisions(prompt_id)
+    except FileNotFoundError:
+        raise HTTPException(404, "No history for this prompt")
+
+
+@app.get("/prompts/{prompt_id}/revisions/{rev}", response_model=Prompt)
+async def get_revision(prompt_id: str, rev: int):
+    """The prompt as saved in revision rev (negative counts back from the latest)."""
+    try:
+        return await _store().get_revision(prompt_id, rev)
+    except FileNotFoundError:
+        raise HTTPException(404, "Revision not found")
+
+
+async def _dependencies(prompt: Prompt) -> str:
+    # Most prompts reference nothing; only read fragments for those that do.
+    if not template_references(prompt.content):
+        return ""
+    return await _store().dependency_digest(prompt)
+
+
 @app.post("/prompts/{prompt_id}/render")
-def render(prompt_id: str, req: RenderRequest):
+async def render(prompt_id: str, req: RenderRequest, request: Request, response: Response):
+    """Render with variables. Results are cached by prompt body, variables
+    and the current source of any included, extended or imported prompts;
+    the ETag names that combination, so a client repeating a request with
+    If-None-Match gets a 304 instead of the body."""
+    try:
+        prompt = await _store().get_prompt(prompt_id)
+    except FileNotFoundError:
+        raise HTTPException(404, "Prompt not found")
+    key = output_key(prompt.content, "render", req.variables, await _dependencies(prompt))
+    etag = f'"{key[:32]}"'
+    if _is_fresh(request, etag):
+        output_cache.count_not_modified()
+        return _not_modified({"ETag": etag})
+    result = output_cache.get(key)
+    if result is None:
+        # Variables the template always reads were found when it was saved;
+        # reject a request lacking any of them before Jinja runs.
+        missing = missing_variables(await _store().template_variables(prompt_id), req.variables)
+        if missing:
+            raise HTTPException(400, f"Missing variables: {', '.join(missing)}")
+        store = _store().store
+
+        def compute() -> str:
+            # Compiling may read included prompts, and rendering is CPU-bound:
+            # neither belongs on the event loop.
+            return render_prompt(prompt.content, req.variables, key=prompt.id, env=store.environment())
+
+        try:
+            result = await _io.run(compute)
+        except (TemplateError, TypeError, ValueError) as e:
+            raise HTTPException(400, str(e))
+        except RecursionError:
+            raise HTTPException(400, "Template references nest too deeply")
+        output_cache.put(key, result, tag=prompt.id)
+    response.headers["ETag"] = etag
+    return {"rendered": result}
+
+
+async def _request_lines(request: Request):
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    yield buffer
+
+
+@app.post("/prompts/{prompt_id}/render/batch")
+async def render_batch(prompt_id: str, request: Request):
+    """Render one prompt against an NDJSON body of variable maps, returning
+    one NDJSON result per non-blank input line."""
     try:
-        prompt = _store().get_prompt(prompt_id)
+        prompt = await _store().get_prompt(prompt_id)
+        required = (await _store().template_variables(prompt_id)).required
     except FileNotFoundError:
         raise HTTPException(404, "Prompt not found")
+    store = _store().store
     try:
-        result = render_prompt(prompt.content, req.variables)
-    except ValueError as e:
+        template = await _io.run(lambda: template_cache.get_or_compile(prompt.content, prompt.id, store.environment()))
+    except (TemplateError, TypeError, ValueError) as e:
         raise HTTPException(400, str(e))
-    return {"rendered": result}
+    except RecursionError:
+        raise HTTPException(400, "Template references nest too deeply")
+    # Starlette's streaming responses compete with the handler for receive(),
+    # so the body is consumed first. Rows are rendered in chunks on the I/O
+    # pool as they arrive and spooled, which keeps memory flat for large
+    # batches and the event loop free for other requests.
+    out = tempfile.SpooledTemporaryFile(max_size=_BATCH_SPOOL_BYTES)
+
+    def write_rows(start: int, lines: list[bytes]) -> None:
+        out.write(b"".join(
+            json.dumps(render_row(template, start + i, line, required)).encode() + b"\n"
+            for i, line in enumerate(lines)
+        ))
+
+    index = 0
+    chunk: list[bytes] = []
+    async for line in _request_lines(request):
+        if not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) == _BATCH_CHUNK_ROWS:
+            await _io.run(write_rows, index, chunk)
+            index += len(chunk)
+            chunk = []
+    if chunk:
+        await _io.run(write_rows, index, chunk)
+    out.seek(0)
+
+    def results():
+        with out:
+            yield from iter(lambda: out.read(64 * 1024), b"")
+
+    return StreamingResponse(results(), media_type=_NDJSON)
 
 
 @app.get("/providers")
-def get_providers():
-    return list_providers(directory=DEFAULT_DIR)
+async def get_providers():
+    return await _io.run(list_providers, directory=DEFAULT_DIR)
 
 
 @app.post("/prompts/{prompt_id}/export")
-def export(prompt_id: str, fmt: str = "text"):
+async def export(prompt_id: str, request: Request, response: Response, fmt: str = "text"):
+    """Export for a provider; cached and ETagged like render, keyed by
+    prompt body and resolved format."""
     try:
-        prompt = _store().get_prompt(prompt_id)
+        prompt = await _store().get_prompt(prompt_id)
     except FileNotFoundError:
         raise HTTPException(404, "Prompt not found")
-    result = export_prompt(prompt, fmt, directory=DEFAULT_DIR)
+    resolved = await _io.run(resolve_format, fmt, _store().directory)
+    key = output_key(prompt.content, f"export:{resolved}")
+    etag = f'"{key[:32]}"'
+    if _is_fresh(request, etag):
+        output_cache.count_not_modified()
+        return _not_modified({"ETag": etag})
+    result = output_cache.get(key)
+    if result is None:
+        # Through the store, so an export another worker already produced
+        # is taken from the shared cache.
+        try:
+            result = await _store().export_prompt(prompt.id, resolved)
+        except FileNotFoundError:
+            raise HTTPException(404, "Prompt not found")
+        output_cache.put(key, result, tag=prompt.id)
+    response.headers["ETag"] = etag
     return {"exported": result, "format": fmt}
 
 
+_EXPORT_TYPES = {"tar.gz": "application/gzip", "tar": "application/x-tar", "zip": "application/zip"}
+
+
+@app.post("/export")
+async def export_all(request: Request, fmt: str = "openai", archive: str = "tar.gz"):
+    """Every prompt in each of fmt's comma-separated formats or providers,
+    as one archive laid out <target>/<id><ext> with a manifest.json of
+    hashes. The ETag covers the library and the resolved formats, so a
+    pipeline sending it back in If-None-Match skips an unchanged bundle."""
+    if archive not in _EXPORT_TYPES:
+        raise HTTPException(400, f"Unknown archive type {archive!r}; expected zip, tar or tar.gz")
+    store = _store()
+    try:
+        targets = await _io.run(resolve_targets, fmt.split(","), store.directory)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    etag = _etag(await _io.run(store.store.fingerprint), targets, archive)
+    if _is_fresh(request, etag):
+        return _not_modified({"ETag": etag})
+    out = tempfile.SpooledTemporaryFile(max_size=_BATCH_SPOOL_BYTES)
+    result = await _io.run(export_archive, store.store, targets, out, archive)
+    out.seek(0)
+
+    def body():
+        with out:
+            yield from iter(lambda: out.read(64 * 1024), b"")
+
+    headers = {
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="prompts.{archive}"',
+        "X-Export-Files": str(len(result.written)),
+    }
+    if result.errors:
+        headers["X-Export-Errors"] = str(len(result.errors))
+    return StreamingResponse(body(), media_type=_EXPORT_TYPES[archive], headers=headers)
+
+
 # --- Templates ---
 
 @app.get("/templates", response_model=list[PromptListItem])
-def list_templates():
-    return _template_store().list_templates()
+async def list_templates(request: Request, response: Response):
+    """List starter templates; revalidate with the ETag to skip re-listing."""
+    ts = _template_store()
+    ndjson = _wants_ndjson(request)
+    etag = _etag(await _io.run(ts.fingerprint), ndjson)
+    headers = {"ETag": etag, "Cache-Control": _REVALIDATE, "Vary": "Accept"}
+    if _is_fresh(request, etag):
+        return _not_modified(headers)
+    if ndjson:
+        return _ndjson(ts.iter_templates(), headers)
+    response.headers.update(headers)
+    return await _io.run(ts.list_templates)
 
 
 @app.post("/templates/{template_id}/clone", response_model=Prompt, status_code=201)
-def clone_template(template_id: str, name: str | None = None):
+async def clone_template(template_id: str, name: str | None = None):
     ts = _template_store()
     new_name = name or template_id
     try:
-        return ts.clone_template(template_id, new_name, _store())
+        return await _io.run(ts.clone_template, template_id, new_name, _store().store)
     except FileNotFoundError:
         raise HTTPException(404, "Template not found")
     except FileExistsError:
         raise HTTPException(409, "Prompt already exists with that name")
 
 
+# --- Stats ---
+
+@app.get("/stats")
+def get_stats():
+    return {
+        "io": _io.stats(),
+        "prompts": _store().store.cache.info(),
+        "templates": template_cache.info(),
+        "outputs": output_cache.info(),
+    }
+
+
+def _cache_metrics():
+    caches = {
+        "prompts": _store().store.cache,
+        "templates": template_cache,
+        "outputs": output_cache,
+    }
+    infos = {name: cache.info() for name, cache in caches.items()}
+    for field, kind, help in (
+        ("hits", "counter", "Cache lookups answered from the cache."),
+        ("misses", "counter", "Cache lookups that had to load, parse or compute."),
+        ("size", "gauge", "Entries currently held."),
+    ):
+        suffix = "_total" if kind == "counter" else ""
+        yield (
+            f"prompter_cache_{field}{suffix}", kind, help,
+            [("", {"cache": name}, info[field]) for name, info in infos.items()],
+        )
+    yield (
+        "prompter_not_modified_total", "counter", "Render and export requests answered with 304.",
+        [("", {}, infos["outputs"]["not_modified"])],
+    )
+
+
+metrics.registry.add_collector(_cache_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request, stage and cache metrics in the Prometheus text format. Each
+    worker process keeps its own."""
+    return PlainTextResponse(metrics.registry.exposition(), media_type=metrics.CONTENT_TYPE)
+
+
 # --- Hints ---
 
-@app.get("/hints")
-def get_hints():
+def _static_validators(filename: str, *key) -> tuple[dict[str, str], datetime | None]:
+    """Caching headers for a bundled data file, and its modification time."""
+    sig = data_file_signature(filename)
+    if sig is None:
+        return {}, None
+    modified = datetime.fromtimestamp(sig[0] / 1e9, tz=timezone.utc)
+    headers = {
+        "ETag": _etag(sig, *key),
+        "Last-Modified": _http_date(modified),
+        "Cache-Control": _STATIC_DATA,
+    }
+    return headers, modified
+
+
+# Bundled data ships with the code, not in PROMPTER_DIR, and is small. Each
+# version (named by its ETag) is parsed once and then served from memory,
+# so these routes run on the event loop and wait for neither thread pool.
+@functools.lru_cache(maxsize=4)
+def _hints(etag: str | None) -> list[dict]:
     return load_hints()
 
 
+@functools.lru_cache(maxsize=64)
+def _scaffold(provider: str, etag: str | None) -> str:
+    return load_scaffold(provider)
+
+
+@app.get("/hints")
+async def get_hints(request: Request, response: Response):
+    headers, modified = _static_validators("hints.json")
+    if headers and _is_fresh(request, headers["ETag"], modified):
+        return _not_modified(headers)
+    response.headers.update(headers)
+    return _hints(headers.get("ETag"))
+
+
 # --- Scaffolds ---
 
 @app.get("/scaffold/{provider}")
-def get_scaffold(provider: str):
-    content = load_scaffold(provider)
+async def get_scaffold(provider: str, request: Request, response: Response):
+    headers, modified = _static_validators("scaffolds.json", provider)
+    if headers and _is_fresh(request, headers["ETag"], modified):
+        return _not_modified(headers)
+    response.headers.update(headers)
+    content = _scaffold(provider, headers.get("ETag"))
     return {"provider": provider, "content": content}
@@ -1,34 +1,64 @@
 from __future__ import annotations
 
 import os
-import subprocess
 import sys
-import tempfile
-from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import typer
-from rich.console import Console
-from rich.table import Table
 
-from .core.models import PromptCreate, PromptUpdate
-from .core.renderer import render_prompt
-from .core.store import PromptStore, TemplateStore, load_scaffold
-from .tools.exporters import export_prompt, init_config, list_providers
+# Heavy dependencies (rich, pydantic, frontmatter, jinja2, yaml) are imported
+# inside the commands that need them: scripts call `prompter render` and
+# `prompter export` in loops, and startup time dominates those calls.
+# tests/test_startup.py guards this.
+if TYPE_CHECKING:
+    from .core.store import PromptStore
 
 app = typer.Typer(help="Prompter - Prompt engineering toolkit")
-console = Console()
+
+
+class _LazyConsole:
+    """Stands in for a rich Console, importing rich on first use."""
+
+    _console = None
+
+    def __getattr__(self, name: str):
+        if _LazyConsole._console is None:
+            from rich.console import Console
+
+            _LazyConsole._console = Console()
+        return getattr(_LazyConsole._console, name)
+
+
+console = _LazyConsole()
 
 DEFAULT_DIR = os.environ.get("PROMPTER_DIR", os.path.join(os.getcwd(), "prompts"))
 
 
 def _store() -> PromptStore:
+    from .core.store import PromptStore
+
     return PromptStore(DEFAULT_DIR)
 
 
+def _forward(command: str, **args) -> str | None:
+    """Hand a command to a running `prompter daemon`; None means run it here."""
+    from .daemon import DaemonError, forward
+
+    try:
+        return forward(
+            command, directory=os.path.abspath(DEFAULT_DIR),
+            backend=os.environ.get("PROMPTER_BACKEND", "markdown"), **args,
+        )
+    except DaemonError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+
+
 @app.command()
 def init():
     """Initialize a prompts directory with default config."""
+    from .tools.exporters import init_config
+
     store = _store()
     store.init()
     config_path = init_config(store.directory)
@@ -37,10 +67,17 @@ def init():
 
 
 @app.command("list")
-def list_prompts():
+def list_prompts(
+    tag: Optional[str] = typer.Option(None, "--tag", help="Only prompts with this tag"),
+    tool: Optional[str] = typer.Option(None, "--tool", help="Only prompts for this tool"),
+    category: Optional[str] = typer.Option(None, "--category", help="Only prompts in this category"),
+    search: Optional[str] = typer.Option(None, "--search", "-s", help="Substring of name or description"),
+):
     """List all prompts."""
+    from rich.table import Table
+
     store = _store()
-    items = store.list_prompts()
+    items, _, _ = store.query(tag=tag, tool=tool, category=category, q=search)
     if not items:
         console.print("No prompts found.")
         return
@@ -55,10 +92,43 @@ def list_prompts():
 
 
 @app.command()
-def show(name: str):
+def search(
+    query: str,
+    limit: int = typer.Option(20, "--limit", "-n", help="Maximum number of hits"),
+):
+    """Full-text search over prompt names, descriptions, tags and content."""
+    from rich.markup import escape
+    from rich.table import Table
+
+    store = _store()
+    hits = store.search(query, limit)
+    if not hits:
+        console.print("No matches.")
+        return
+    table = Table()
+    table.add_column("Name")
+    table.add_column("Score", justify="right")
+    table.add_column("Match")
+    for hit in hits:
+        table.add_row(hit.name, f"{hit.score:.2f}", escape(hit.snippet))
+    console.print(table)
+
+
+@app.command()
+def show(
+    name: str,
+    rev: Optional[int] = typer.Option(None, "--rev", "-r", help="Show this revision instead (see `prompter history`)"),
+):
     """Display a prompt."""
     store = _store()
-    prompt = store.get_prompt(name)
+    if rev is None:
+        prompt = store.get_prompt(name)
+    else:
+        try:
+            prompt = store.get_revision(name, rev)
+        except FileNotFoundError as e:
+            console.print(f"[red]{e}[/red]")
+            raise typer.Exit(1)
     console.print(f"[bold]{prompt.name}[/bold]")
     if prompt.description:
         console.print(f"[dim]{prompt.description}[/dim]")
@@ -80,6 +150,8 @@ def create(
     content: Optional[str] = typer.Option(None, "--content", "-c"),
 ):
     """Create a new prompt."""
+    from .core.models import PromptCreate
+
     store = _store()
     store.init()
     tag_list = [t.strip() for t in tags.split(",") if t.strip()] if tags else []
@@ -94,6 +166,12 @@ def create(
 @app.command()
 def edit(name: str):
     """Open a prompt in $EDITOR."""
+    import subprocess
+    import tempfile
+    from pathlib import Path
+
+    from .core.models import PromptUpdate
+
     store = _store()
     prompt = store.get_prompt(name)
     editor = os.environ.get("EDITOR", "vi")
@@ -108,14 +186,54 @@ def edit(name: str):
     console.print(f"Updated prompt: {name}")
 
 
+@app.command()
+def history(name: str):
+    """List the saved revisions of a prompt."""
+    from rich.table import Table
+
+    try:
+        revisions = _store().revisions(name)
+    except FileNotFoundError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    table = Table()
+    table.add_column("Rev", justify="right")
+    table.add_column("Saved")
+    table.add_column("Action")
+    table.add_column("Hash")
+    table.add_column("Size", justify="right")
+    for r in revisions:
+        table.add_row(
+            str(r.rev), r.saved_at.strftime("%Y-%m-%d %H:%M:%S"), r.action,
+            r.hash[:12] if r.hash else "-", str(r.size),
+        )
+    console.print(table)
+
+
+@app.command()
+def diff(
+    name: str,
+    old: int = typer.Argument(-2, help="Older revision (negative counts back from the latest)"),
+    new: int = typer.Argument(-1, help="Newer revision"),
+):
+    """Show what changed between two revisions of a prompt (default: the last two)."""
+    try:
+        output = _store().diff(name, old, new)
+    except FileNotFoundError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    sys.stdout.write(output)
+    sys.stdout.flush()
+
+
 @app.command()
 def render(
     name: str,
     var: list[str] = typer.Option([], "--var", "-v", help="key=value pairs"),
+    input_file: Optional[str] = typer.Option(None, "--input", "-i", help="NDJSON file of variable maps ('-' for stdin); renders every row"),
+    workers: int = typer.Option(1, "--workers", "-w", help="Processes to spread --input rows over"),
 ):
     """Render a prompt with variable substitution."""
-    store = _store()
-    prompt = store.get_prompt(name)
     variables = {}
     for v in var:
         if "=" not in v:
@@ -123,25 +241,270 @@ def render(
             raise typer.Exit(1)
         k, val = v.split("=", 1)
         variables[k.strip()] = val.strip()
-    result = render_prompt(prompt.content, variables)
+    if input_file is None:
+        result = _forward("render", name=name, variables=variables)
+        if result is not None:
+            console.print(result)
+            return
+
+    from .core.renderer import render_prompt
+
+    store = _store()
+    prompt = store.get_prompt(name)
+    if input_file is not None:
+        _render_batch(store, prompt.content, input_file, workers, key=prompt.id)
+        return
+    result = render_prompt(prompt.content, variables, key=prompt.id, env=store.environment())
     console.print(result)
 
 
+def _render_batch(store: PromptStore, content: str, input_file: str, workers: int, key: str) -> None:
+    import json
+
+    from .core.renderer import render_batch, render_batch_parallel
+
+    stream = sys.stdin if input_file == "-" else open(input_file)
+    failed = 0
+    try:
+        if workers > 1:
+            results = render_batch_parallel(content, stream, workers, directory=str(store.directory))
+        else:
+            results = render_batch(content, stream, key=key, env=store.environment())
+        for result in results:
+            failed += "error" in result
+            sys.stdout.write(json.dumps(result) + "\n")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    sys.stdout.flush()
+    if failed:
+        raise typer.Exit(1)
+
+
 @app.command()
 def export(
-    name: str,
-    fmt: str = typer.Option("text", "--format", "-f", help="Format or provider name (messages, markdown, text, openai, groq, ollama, claude, etc.)"),
+    name: Optional[str] = typer.Argument(None, help="Prompt to export (omit with --all)"),
+    fmt: str = typer.Option("text", "--format", "-f", help="Format or provider name (messages, markdown, text, openai, groq, ollama, claude, etc.); with --all, a comma-separated list"),
+    all_: bool = typer.Option(False, "--all", help="Export every prompt to --out"),
+    out: Optional[str] = typer.Option(None, "--out", "-o", help="With --all: a directory, or a .zip, .tar or .tar.gz archive ('-' for a tar.gz on stdout)"),
+    workers: int = typer.Option(1, "--workers", "-w", help="With --all: processes to spread prompts over"),
+    force: bool = typer.Option(False, "--force", help="With --all: rewrite outputs even if unchanged"),
 ):
     """Export a prompt for any provider. Use --format with a format name (messages, markdown, text) or a provider name (openai, groq, ollama, claude, etc.). Reads providers.yaml for custom providers."""
+    if all_ or name is None:
+        if name is not None or not all_ or out is None:
+            console.print("[red]Give a prompt name, or --all with --out[/red]")
+            raise typer.Exit(1)
+        _export_all(fmt, out, workers, force)
+        return
+    result = _forward("export", name=name, fmt=fmt)
+    if result is not None:
+        console.print(result)
+        return
+
+    from .tools.exporters import export_prompt
+
     store = _store()
     prompt = store.get_prompt(name)
     result = export_prompt(prompt, fmt, directory=store.directory)
     console.print(result)
 
 
+def _export_all(fmt: str, out: str, workers: int, force: bool) -> None:
+    from .tools.bundle import archive_kind, export_archive, export_directory, resolve_targets
+
+    store = _store()
+    try:
+        targets = resolve_targets(fmt.split(","), store.directory)
+        kind = "tar.gz" if out == "-" else archive_kind(out)
+        if out == "-":
+            result = export_archive(store, targets, sys.stdout.buffer, kind, workers)
+            sys.stdout.buffer.flush()
+        elif kind is not None:
+            from .core.fileio import atomic_writer
+
+            with atomic_writer(out) as f:
+                result = export_archive(store, targets, f, kind, workers)
+        else:
+            result = export_directory(store, targets, out, workers, force)
+    except (ValueError, OSError) as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    _report_export(result)
+    if result.errors:
+        raise typer.Exit(1)
+
+
+def _report_export(result) -> None:
+    typer.echo(
+        f"Wrote {len(result.written)} files, {result.unchanged} unchanged, {len(result.removed)} removed",
+        err=True,
+    )
+    for error in result.errors:
+        typer.echo(error, err=True)
+
+
+@app.command()
+def build(
+    out: str = typer.Option("dist", "--out", "-o", help="Directory to keep the exports in"),
+    workers: int = typer.Option(0, "--workers", "-w", help="Processes to spread prompts over (0: one per CPU)"),
+    force: bool = typer.Option(False, "--force", help="Rewrite every output, even if unchanged"),
+    watch: bool = typer.Option(False, "--watch", help="Keep rebuilding as prompts or providers.yaml change"),
+):
+    """Export every prompt for the provider in its tool field, as <id>.json, .md or .txt in --out. Only prompts changed since the last build, or moved to another format by providers.yaml, are exported again."""
+    import threading
+
+    from .tools.bundle import build_directory
+
+    store = _store()
+    workers = workers or os.cpu_count() or 1
+    lock = threading.Lock()
+
+    def run(force: bool = False) -> bool:
+        with lock:
+            try:
+                result = build_directory(store, out, workers, force)
+            except (ValueError, OSError) as e:
+                console.print(f"[red]{e}[/red]")
+                return False
+        _report_export(result)
+        return not result.errors
+
+    if not watch:
+        if not run(force):
+            raise typer.Exit(1)
+        return
+
+    from .core.watcher import PromptWatcher
+
+    # Start watching first, so nothing saved during the initial build is missed.
+    watcher = PromptWatcher(
+        store,
+        force_polling=not store.backend.watchable or os.environ.get("PROMPTER_WATCH", "").lower() == "poll",
+        on_change=lambda changed: run(),
+    )
+    watcher.start()
+    try:
+        run(force)
+        console.print(f"Watching {store.directory} (Ctrl-C to stop)")
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+
+
+def _compression_for(path: str, compression: Optional[str]) -> str:
+    if compression:
+        return compression
+    if path.endswith(".zst"):
+        return "zstd"
+    if path.endswith(".jsonl"):
+        return "none"
+    return "gzip"
+
+
+@app.command()
+def pack(
+    output: str = typer.Argument(..., help="Archive to write ('-' for stdout)"),
+    compression: Optional[str] = typer.Option(None, "--compression", "-c", help="gzip, zstd or none (default: from the file name, else gzip)"),
+):
+    """Write the whole prompt library to one compressed JSONL archive."""
+    from .core.archive import pack as pack_store
+
+    store = _store()
+    compression = _compression_for(output, compression)
+    try:
+        if output == "-":
+            count = pack_store(store, sys.stdout.buffer, compression)
+            sys.stdout.buffer.flush()
+        else:
+            from .core.fileio import atomic_writer
+
+            with atomic_writer(output) as f:
+                count = pack_store(store, f, compression)
+    except (ValueError, RuntimeError) as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    typer.echo(f"Packed {count} prompts", err=True)
+
+
+@app.command()
+def unpack(
+    archive: str = typer.Argument(..., help="Archive to read ('-' for stdin); compression is detected"),
+    overwrite: bool = typer.Option(False, "--overwrite", help="Replace prompts that already exist"),
+):
+    """Load prompts from an archive written by `prompter pack`."""
+    from .core.archive import unpack as unpack_store
+
+    store = _store()
+    try:
+        if archive == "-":
+            result = unpack_store(store, sys.stdin.buffer, overwrite=overwrite)
+        else:
+            with open(archive, "rb") as f:
+                result = unpack_store(store, f, overwrite=overwrite)
+    except (ValueError, RuntimeError, EOFError, OSError) as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    console.print(
+        f"Created {len(result.created)}, overwrote {len(result.overwritten)}, "
+        f"skipped {len(result.conflicts)} existing"
+    )
+    if result.conflicts:
+        console.print("[yellow]Already exist (use --overwrite to replace):[/yellow] " + ", ".join(result.conflicts[:20])
+                      + (f" and {len(result.conflicts) - 20} more" if len(result.conflicts) > 20 else ""))
+    for error in result.errors:
+        console.print(f"[red]{error}[/red]")
+    if result.errors:
+        raise typer.Exit(1)
+
+
+@app.command()
+def migrate(
+    to: str = typer.Argument(..., help="Backend to move prompts to: markdown or sqlite"),
+    source: Optional[str] = typer.Option(None, "--from", help="Backend to read from (default: $PROMPTER_BACKEND or markdown)"),
+    overwrite: bool = typer.Option(False, "--overwrite", help="Replace prompts the target already has"),
+    remove: bool = typer.Option(False, "--remove-source", help="Delete prompts from the source once copied"),
+):
+    """Copy the prompt library to another storage backend in the same directory.
+
+    Documents are copied verbatim and read back to check; history, the
+    index and providers.yaml stay where they are and keep working. Set
+    PROMPTER_BACKEND to the new backend afterwards.
+    """
+    from .core.backends import backend_kind, migrate as migrate_backend, open_backend
+    from .core.fileio import fsync_policy
+
+    try:
+        source, to = backend_kind(source), backend_kind(to)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    if "memory" in (source, to) or source == to:
+        console.print("[red]Migrate between two different persistent backends (markdown, sqlite)[/red]")
+        raise typer.Exit(1)
+    directory, fsync = os.path.abspath(DEFAULT_DIR), fsync_policy()
+    try:
+        copied, skipped = migrate_backend(
+            open_backend(source, directory, fsync), open_backend(to, directory, fsync),
+            overwrite=overwrite, move=remove,
+        )
+    except (OSError, RuntimeError) as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    console.print(f"Copied {len(copied)} prompts from {source} to {to}, skipped {len(skipped)} existing")
+    if skipped:
+        console.print("[yellow]Already in the target (use --overwrite to replace):[/yellow] " + ", ".join(skipped[:20])
+                      + (f" and {len(skipped) - 20} more" if len(skipped) > 20 else ""))
+    console.print(f"[dim]Use it with: export PROMPTER_BACKEND={to}[/dim]")
+
+
 @app.command()
 def providers():
     """List all supported providers and their export formats. Includes custom providers from providers.yaml."""
+    from rich.table import Table
+
     store = _store()
     table = Table()
     table.add_column("Provider")
@@ -161,6 +524,10 @@ def providers():
 @app.command()
 def templates():
     """List available starter templates."""
+    from rich.table import Table
+
+    from .core.store import TemplateStore
+
     ts = TemplateStore()
     items = ts.list_templates()
     if not items:
@@ -182,6 +549,8 @@ def clone(
     name: Optional[str] = typer.Option(None, "--name", "-n", help="Name for the new prompt"),
 ):
     """Clone a template into your prompts directory."""
+    from .core.store import TemplateStore
+
     ts = TemplateStore()
     store = _store()
     new_name = name or template_id
@@ -199,6 +568,8 @@ def clone(
 @app.command()
 def scaffold(provider: str):
     """Print a scaffold prompt for a given provider."""
+    from .core.store import load_scaffold
+
     content = load_scaffold(provider)
     if not content:
         console.print(f"[yellow]No scaffold found for '{provider}', using generic.[/yellow]")
@@ -206,6 +577,42 @@ def scaffold(provider: str):
     console.print(content)
 
 
+@app.command()
+def daemon(
+    socket: Optional[str] = typer.Option(None, "--socket", help="Socket path (default: $PROMPTER_DAEMON_SOCKET or a per-user runtime path)"),
+    stop: bool = typer.Option(False, "--stop", help="Stop a running daemon"),
+    status: bool = typer.Option(False, "--status", help="Report whether a daemon is running"),
+):
+    """Keep prompts, templates and provider config warm for fast `render` and `export` calls."""
+    from pathlib import Path
+
+    from . import daemon as warm
+
+    path = Path(socket) if socket else warm.socket_path()
+    if stop:
+        if not warm.stop(path):
+            console.print(f"No daemon listening on {path}")
+            raise typer.Exit(1)
+        console.print(f"Stopped daemon on {path}")
+        return
+    if status:
+        running = warm.is_running(path)
+        console.print(f"Daemon {'running' if running else 'not running'} on {path}")
+        raise typer.Exit(0 if running else 1)
+    try:
+        server = warm.make_server(path)
+    except RuntimeError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    console.print(f"Prompter daemon listening on {path} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 def serve(
     host: str = "127.0.0.1",
     port: int = 8000,
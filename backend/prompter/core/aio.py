@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from .index import Signature
+from .models import Prompt, PromptCreate, PromptListItem, PromptUpdate, Revision, SearchHit, TemplateVariables
+from .store import PromptStore
+
+T = TypeVar("T")
+
+
+class StoreBusyError(RuntimeError):
+    """Raised when the I/O queue is full and a call is refused."""
+
+
+class IOExecutor:
+    """Dedicated thread pool for blocking filesystem work.
+
+    Keeping store I/O off the event loop's default pool means a slow disk
+    (e.g. NFS) can only exhaust these threads, not the ones serving unrelated
+    routes. max_queue bounds how many calls may wait for a free thread;
+    0 means unbounded.
+    """
+
+    def __init__(self, max_workers: int = 8, max_queue: int = 0) -> None:
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _dequeue(self, dequeued: threading.Event) -> None:
+        # A worker picking the call up and the caller being cancelled can
+        # race; only the first of them takes the call off the queue count.
+        with self._lock:
+            if not dequeued.is_set():
+                dequeued.set()
+                self._queued -= 1
+
+    def _call(self, dequeued: threading.Event, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        self._dequeue(dequeued)
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                self._rejected += 1
+                raise StoreBusyError("I/O queue is full")
+            self._queued += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prompter-io")
+            executor = self._executor
+        dequeued = threading.Event()
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so stage timings reach its request.
+        call = functools.partial(contextvars.copy_context().run, self._call, dequeued, fn, *args, **kwargs)
+        try:
+            return await loop.run_in_executor(executor, call)
+        except asyncio.CancelledError:
+            # A call cancelled while still queued may never reach _call.
+            self._dequeue(dequeued)
+            raise
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncPromptStore:
+    """Async facade over PromptStore; every call runs on an IOExecutor."""
+
+    def __init__(self, store: PromptStore, io: IOExecutor) -> None:
+        self.store = store
+        self.io = io
+
+    @property
+    def directory(self):
+        return self.store.directory
+
+    async def list_prompts(self) -> list[PromptListItem]:
+        return await self.io.run(self.store.list_prompts)
+
+    async def query(self, **filters) -> tuple[list[PromptListItem], int, str | None]:
+        return await self.io.run(self.store.query, **filters)
+
+    async def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        return await self.io.run(self.store.search, query, limit)
+
+    async def signature(self, id_: str) -> Signature:
+        return await self.io.run(self.store.signature, id_)
+
+    async def get_prompt(self, id_: str) -> Prompt:
+        return await self.io.run(self.store.get_prompt, id_)
+
+    async def create_prompt(self, data: PromptCreate) -> Prompt:
+        return await self.io.run(self.store.create_prompt, data)
+
+    async def update_prompt(self, id_: str, data: PromptUpdate) -> Prompt:
+        return await self.io.run(self.store.update_prompt, id_, data)
+
+    async def delete_prompt(self, id_: str) -> None:
+        await self.io.run(self.store.delete_prompt, id_)
+
+    async def export_prompt(self, id_: str, fmt: str) -> str:
+        return await self.io.run(self.store.export_prompt, id_, fmt)
+
+    async def revisions(self, id_: str) -> list[Revision]:
+        return await self.io.run(self.store.revisions, id_)
+
+    async def get_revision(self, id_: str, rev: int) -> Prompt:
+        return await self.io.run(self.store.get_revision, id_, rev)
+
+    async def template_variables(self, id_: str) -> TemplateVariables:
+        return await self.io.run(self.store.template_variables, id_)
+
+    async def dependency_digest(self, prompt: Prompt) -> str:
+        return await self.io.run(self.store.dependency_digest, prompt)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import io
+import json
+import zlib
+from typing import IO, Iterable, Iterator
+
+from .models import BulkResult, Prompt
+from .store import PromptStore
+
+# A {"prompter_pack": PACK_VERSION} header line, then one prompt per line.
+PACK_VERSION = 1
+
+COMPRESSIONS = ("gzip", "zstd", "none")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Compressed bytes are handed on roughly this often.
+_CHUNK = 256 * 1024
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('zstd archives need the zstandard package: pip install -e ".[zstd]"') from None
+    return zstandard
+
+
+def _compressor(compression: str):
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    if compression == "zstd":
+        return _zstandard().ZstdCompressor().compressobj()
+    if compression == "none":
+        return None
+    raise ValueError(f"Unknown compression {compression!r}; expected one of {', '.join(COMPRESSIONS)}")
+
+
+def iter_pack(prompts: Iterable[Prompt], compression: str = "gzip") -> Iterator[bytes]:
+    """Yield an archive of prompts chunk by chunk, never holding it whole.
+
+    An unknown or unavailable compression raises here, before anything is read.
+    """
+    return _iter_pack(prompts, _compressor(compression))
+
+
+def _iter_pack(prompts: Iterable[Prompt], compressor) -> Iterator[bytes]:
+    buffer = bytearray(json.dumps({"prompter_pack": PACK_VERSION}).encode() + b"\n")
+    for prompt in prompts:
+        buffer += prompt.model_dump_json().encode() + b"\n"
+        if len(buffer) >= _CHUNK:
+            out = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+            buffer.clear()
+            if out:
+                yield out
+    out = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+    if out:
+        yield out
+
+
+def pack(store: PromptStore, fileobj: IO[bytes], compression: str = "gzip") -> int:
+    """Write every prompt in store to fileobj; returns the number packed."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for prompt in store.iter_prompts():
+            count += 1
+            yield prompt
+
+    for chunk in iter_pack(counted(), compression):
+        fileobj.write(chunk)
+    return count
+
+
+def _decompressed(fileobj: IO[bytes]) -> IO[bytes]:
+    reader = io.BufferedReader(fileobj) if not hasattr(fileobj, "peek") else fileobj
+    magic = reader.peek(4)[:4]
+    if magic.startswith(_GZIP_MAGIC):
+        import gzip
+
+        return gzip.GzipFile(fileobj=reader, mode="rb")
+    if magic == _ZSTD_MAGIC:
+        return _zstandard().ZstdDecompressor().stream_reader(reader)
+    return reader
+
+
+def read_pack(fileobj: IO[bytes], errors: list[str]) -> Iterator[Prompt]:
+    """Prompts from an archive (compression is detected). Lines that don't
+    parse are described in errors and skipped."""
+    lines = io.TextIOWrapper(_decompressed(fileobj), encoding="utf-8")
+    header = lines.readline()
+    try:
+        version = json.loads(header).get("prompter_pack")
+    except (ValueError, AttributeError):
+        version = None
+    if version != PACK_VERSION:
+        raise ValueError("Not a prompter archive (missing or unsupported header)")
+    for lineno, line in enumerate(lines, start=2):
+        if not line.strip():
+            continue
+        try:
+            yield Prompt.model_validate_json(line)
+        except ValueError as e:
+            errors.append(f"line {lineno}: {str(e).splitlines()[0]}")
+
+
+def unpack(
+    store: PromptStore,
+    fileobj: IO[bytes],
+    overwrite: bool = False,
+    batch_size: int = 500,
+) -> BulkResult:
+    """Load an archive into store through PromptStore.bulk_create."""
+    errors: list[str] = []
+    result = store.bulk_create(read_pack(fileobj, errors), overwrite=overwrite, batch_size=batch_size)
+    result.errors[:0] = errors
+    return result
@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, ClassVar, Iterator, NamedTuple
+
+from .fileio import atomic_rename, atomic_write, fsync_dir
+from .index import Signature, file_signature
+from .metadata import parse_document, read_document, read_metadata
+
+SQLITE_FILENAME = "prompts.db"
+
+BACKENDS = ("markdown", "sqlite", "memory")
+
+
+class DocumentStat(NamedTuple):
+    signature: Signature
+    # Seconds since the epoch; used when the frontmatter has no timestamps.
+    created: float
+    modified: float
+
+
+class StorageBackend(ABC):
+    """Where a PromptStore keeps its prompts.
+
+    A backend stores each prompt's document (frontmatter and body, exactly
+    as PromptStore serialized it) under its id. Documents come back
+    byte-for-byte as written, which is what makes moving a library between
+    backends lossless. Each document also has a signature that changes
+    whenever it is rewritten; the store's caches and listing index are
+    validated against it, as they are against stat() for files.
+    """
+
+    kind: ClassVar[str]
+    # Documents are files a PromptWatcher can follow.
+    watchable: ClassVar[bool] = False
+    # Outlives the process; the store keeps its index, shared cache and
+    # history next to it only if so.
+    persistent: ClassVar[bool] = True
+
+    @abstractmethod
+    def initialized(self) -> bool:
+        """Whether the library exists yet (init() has run)."""
+        ...
+
+    @abstractmethod
+    def init(self) -> None:
+        ...
+
+    @abstractmethod
+    def stat(self, id_: str) -> DocumentStat:
+        """Raises FileNotFoundError for an unknown id, as every read does."""
+        ...
+
+    def exists(self, id_: str) -> bool:
+        try:
+            self.stat(id_)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @abstractmethod
+    def read(self, id_: str) -> str:
+        ...
+
+    def read_document(self, id_: str) -> tuple[dict[str, Any], str]:
+        return parse_document(self.read(id_))
+
+    def read_metadata(self, id_: str) -> dict[str, Any]:
+        return self.read_document(id_)[0]
+
+    @abstractmethod
+    def write(
+        self, id_: str, text: str, fsync: str | None = None, times: tuple[float, float] | None = None,
+    ) -> None:
+        """Create or replace a document atomically. fsync overrides the
+        backend's policy for this write; times (created, modified) backdate
+        it, for migrations."""
+        ...
+
+    @abstractmethod
+    def rename(self, old: str, new: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, id_: str) -> None:
+        ...
+
+    @abstractmethod
+    def scan(self) -> dict[str, Signature]:
+        """Every document's id and signature."""
+        ...
+
+    def sync(self) -> None:
+        """Make a batch of writes made with a weaker fsync durable."""
+
+    def close(self) -> None:
+        pass
+
+
+class MarkdownBackend(StorageBackend):
+    """One ``<id>.md`` file per prompt in the directory, the default."""
+
+    kind = "markdown"
+    watchable = True
+
+    def __init__(self, directory: str | Path, fsync: str = "off") -> None:
+        self.directory = Path(directory)
+        self.fsync = fsync
+
+    def _file(self, id_: str) -> Path:
+        return self.directory / f"{id_}.md"
+
+    def initialized(self) -> bool:
+        return self.directory.exists()
+
+    def init(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def stat(self, id_: str) -> DocumentStat:
+        st = self._file(id_).stat()
+        return DocumentStat(file_signature(st), st.st_ctime, st.st_mtime)
+
+    def exists(self, id_: str) -> bool:
+        return self._file(id_).exists()
+
+    def read(self, id_: str) -> str:
+        return self._file(id_).read_text(encoding="utf-8")
+
+    def read_document(self, id_: str) -> tuple[dict[str, Any], str]:
+        return read_document(self._file(id_))
+
+    def read_metadata(self, id_: str) -> dict[str, Any]:
+        # Stops at the closing ---; the body is never read.
+        return read_metadata(self._file(id_))
+
+    def write(
+        self, id_: str, text: str, fsync: str | None = None, times: tuple[float, float] | None = None,
+    ) -> None:
+        path = self._file(id_)
+        atomic_write(path, text, self.fsync if fsync is None else fsync)
+        if times is not None:
+            # ctime can't be set; the modification time is what listings show.
+            os.utime(path, (times[1], times[1]))
+
+    def rename(self, old: str, new: str) -> None:
+        atomic_rename(self._file(old), self._file(new), self.fsync)
+
+    def delete(self, id_: str) -> None:
+        self._file(id_).unlink()
+
+    def scan(self) -> dict[str, Signature]:
+        found = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.name.endswith(".md"):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    found[entry.name[:-3]] = file_signature(entry.stat())
+                except FileNotFoundError:
+                    continue
+        return found
+
+    def sync(self) -> None:
+        if self.fsync == "full":
+            fsync_dir(self.directory)
+
+
+_SQLITE_SCHEMA_VERSION = 1
+
+_SQLITE_SCHEMA = (
+    # text is the document verbatim; name, tool, category and prompt_tags
+    # mirror its frontmatter so other tools can query the library in SQL.
+    """
+    CREATE TABLE IF NOT EXISTS prompts (
+        id         TEXT PRIMARY KEY,
+        text       TEXT NOT NULL,
+        name       TEXT NOT NULL,
+        tool       TEXT NOT NULL,
+        category   TEXT NOT NULL,
+        created_ns INTEGER NOT NULL,
+        mtime_ns   INTEGER NOT NULL,
+        size       INTEGER NOT NULL,
+        version    INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS prompt_tags (
+        tag TEXT NOT NULL,
+        id  TEXT NOT NULL,
+        PRIMARY KEY (tag, id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS prompts_tool ON prompts (tool)",
+    "CREATE INDEX IF NOT EXISTS prompts_category ON prompts (category)",
+    "CREATE INDEX IF NOT EXISTS prompt_tags_id ON prompt_tags (id)",
+)
+
+
+class SQLiteBackend(StorageBackend):
+    """Every prompt as a row of ``prompts.db`` in the directory.
+
+    WAL mode lets readers in any number of processes run alongside a
+    writer, and a listing is one query instead of a directory scan.
+    Signatures are (mtime_ns, size, version), version counting the row's
+    rewrites, so they change on every write just like a file's stat.
+    """
+
+    kind = "sqlite"
+
+    def __init__(self, directory: str | Path, fsync: str = "off") -> None:
+        self.directory = Path(directory)
+        self.path = self.directory / SQLITE_FILENAME
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit; writes open their own IMMEDIATE transactions.
+        conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # These rows are the prompts themselves, so they follow the store's
+        # fsync policy like history does.
+        conn.execute(f"PRAGMA synchronous = {'FULL' if self.fsync == 'full' else 'NORMAL'}")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, _SQLITE_SCHEMA_VERSION):
+            conn.close()
+            raise RuntimeError(f"{self.path} has unsupported schema version {version}")
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in _SQLITE_SCHEMA:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {_SQLITE_SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+        return conn
+
+    @contextmanager
+    def _db(self, create: bool = False) -> Iterator[sqlite3.Connection | None]:
+        """The connection under the lock; None if the database doesn't
+        exist yet and create is False (reads shouldn't create it)."""
+        with self._lock:
+            if self._conn is None:
+                if not create and not self.path.exists():
+                    yield None
+                    return
+                self._conn = self._connect()
+            yield self._conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        with self._db(create=True) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def initialized(self) -> bool:
+        return self.path.exists()
+
+    def init(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._db(create=True):
+            pass
+
+    def stat(self, id_: str) -> DocumentStat:
+        with self._db() as conn:
+            row = conn and conn.execute(
+                "SELECT mtime_ns, size, version, created_ns FROM prompts WHERE id = ?", (id_,)
+            ).fetchone()
+        if not row:
+            raise FileNotFoundError(id_)
+        mtime_ns, size, version, created_ns = row
+        return DocumentStat((mtime_ns, size, version), created_ns / 1e9, mtime_ns / 1e9)
+
+    def read(self, id_: str) -> str:
+        with self._db() as conn:
+            row = conn and conn.execute("SELECT text FROM prompts WHERE id = ?", (id_,)).fetchone()
+        if not row:
+            raise FileNotFoundError(id_)
+        return row[0]
+
+    def write(
+        self, id_: str, text: str, fsync: str | None = None, times: tuple[float, float] | None = None,
+    ) -> None:
+        meta, _ = parse_document(text)
+        if times is not None:
+            created_ns, mtime_ns = (int(t * 1e9) for t in times)
+        else:
+            created_ns = mtime_ns = time.time_ns()
+        tags = {str(tag) for tag in meta.get("tags") or () if tag is not None}
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO prompts (id, text, name, tool, category, created_ns, mtime_ns, size, version)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)"
+                " ON CONFLICT(id) DO UPDATE SET text = excluded.text, name = excluded.name,"
+                " tool = excluded.tool, category = excluded.category, mtime_ns = excluded.mtime_ns,"
+                " size = excluded.size, version = version + 1",
+                (
+                    id_, text, str(meta.get("name", id_)), str(meta.get("tool", "generic")),
+                    str(meta.get("category", "")), created_ns, mtime_ns, len(text.encode()),
+                ),
+            )
+            conn.execute("DELETE FROM prompt_tags WHERE id = ?", (id_,))
+            conn.executemany("INSERT INTO prompt_tags (tag, id) VALUES (?, ?)", ((tag, id_) for tag in tags))
+
+    def rename(self, old: str, new: str) -> None:
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM prompts WHERE id = ?", (new,)).fetchone():
+                raise FileExistsError(new)
+            cursor = conn.execute(
+                "UPDATE prompts SET id = ?, version = version + 1 WHERE id = ?", (new, old)
+            )
+            if cursor.rowcount == 0:
+                raise FileNotFoundError(old)
+            conn.execute("UPDATE prompt_tags SET id = ? WHERE id = ?", (new, old))
+
+    def delete(self, id_: str) -> None:
+        with self._write() as conn:
+            if conn.execute("DELETE FROM prompts WHERE id = ?", (id_,)).rowcount == 0:
+                raise FileNotFoundError(id_)
+            conn.execute("DELETE FROM prompt_tags WHERE id = ?", (id_,))
+
+    def scan(self) -> dict[str, Signature]:
+        with self._db() as conn:
+            if conn is None:
+                return {}
+            rows = conn.execute("SELECT id, mtime_ns, size, version FROM prompts").fetchall()
+        return {id_: (mtime_ns, size, version) for id_, mtime_ns, size, version in rows}
+
+
+class MemoryBackend(StorageBackend):
+    """Documents in a dict, gone with the process. For tests and benchmarks;
+    a store on it keeps its index in memory and records no history."""
+
+    kind = "memory"
+    persistent = False
+
+    def __init__(self) -> None:
+        self._docs: dict[str, tuple[str, DocumentStat]] = {}
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def initialized(self) -> bool:
+        return True
+
+    def init(self) -> None:
+        pass
+
+    def _get(self, id_: str) -> tuple[str, DocumentStat]:
+        with self._lock:
+            try:
+                return self._docs[id_]
+            except KeyError:
+                raise FileNotFoundError(id_) from None
+
+    def stat(self, id_: str) -> DocumentStat:
+        return self._get(id_)[1]
+
+    def read(self, id_: str) -> str:
+        return self._get(id_)[0]
+
+    def write(
+        self, id_: str, text: str, fsync: str | None = None, times: tuple[float, float] | None = None,
+    ) -> None:
+        now = time.time()
+        with self._lock:
+            self._version += 1
+            old = self._docs.get(id_)
+            created, modified = times or (old[1].created if old else now, now)
+            sig = (int(modified * 1e9), len(text.encode()), self._version)
+            self._docs[id_] = (text, DocumentStat(sig, created, modified))
+
+    def rename(self, old: str, new: str) -> None:
+        with self._lock:
+            if new in self._docs:
+                raise FileExistsError(new)
+            try:
+                text, stat = self._docs.pop(old)
+            except KeyError:
+                raise FileNotFoundError(old) from None
+            self._version += 1
+            self._docs[new] = (text, stat._replace(signature=(*stat.signature[:2], self._version)))
+
+    def delete(self, id_: str) -> None:
+        with self._lock:
+            if self._docs.pop(id_, None) is None:
+                raise FileNotFoundError(id_)
+
+    def scan(self) -> dict[str, Signature]:
+        with self._lock:
+            return {id_: stat.signature for id_, (_, stat) in self._docs.items()}
+
+
+def backend_kind(value: str | None = None) -> str:
+    """Resolve PROMPTER_BACKEND (default markdown) unless value is given."""
+    kind = (value if value is not None else os.environ.get("PROMPTER_BACKEND", "markdown")).strip().lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Invalid storage backend {kind!r}; expected one of {', '.join(BACKENDS)}")
+    return kind
+
+
+def open_backend(kind: str | None, directory: str | Path, fsync: str = "off") -> StorageBackend:
+    kind = backend_kind(kind)
+    if kind == "sqlite":
+        return SQLiteBackend(directory, fsync)
+    if kind == "memory":
+        return MemoryBackend()
+    return MarkdownBackend(directory, fsync)
+
+
+def migrate(
+    source: StorageBackend,
+    target: StorageBackend,
+    overwrite: bool = False,
+    move: bool = False,
+) -> tuple[list[str], list[str]]:
+    """Copy every document from source to target, keeping ids, text and
+    timestamps. Returns (copied, skipped); documents target already has are
+    skipped unless overwrite. Each copy is read back and compared, so a
+    mismatch raises instead of leaving a silently altered library. With
+    move, copied documents are then deleted from source."""
+    copied, skipped = [], []
+    if not source.initialized():
+        return copied, skipped
+    target.init()
+    for id_ in sorted(source.scan()):
+        if not overwrite and target.exists(id_):
+            skipped.append(id_)
+            continue
+        try:
+            stat = source.stat(id_)
+            text = source.read(id_)
+        except FileNotFoundError:
+            continue
+        target.write(id_, text, times=(stat.created, stat.modified))
+        if target.read(id_) != text:
+            raise RuntimeError(f"Migrated copy of {id_!r} differs from the original")
+        copied.append(id_)
+    target.sync()
+    if move:
+        for id_ in copied:
+            source.delete(id_)
+        source.sync()
+    return copied, skipped
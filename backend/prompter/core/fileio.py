@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOCK_DIRNAME = ".prompter-locks"
+
+FSYNC_POLICIES = ("off", "file", "full")
+
+
+def fsync_policy(value: str | None = None) -> str:
+    """Normalise PROMPTER_FSYNC: off (default), file, or full (file + directory)."""
+    policy = (value if value is not None else os.environ.get("PROMPTER_FSYNC", "off")).strip().lower()
+    if policy not in FSYNC_POLICIES:
+        raise ValueError(f"Invalid fsync policy {policy!r}; expected one of {', '.join(FSYNC_POLICIES)}")
+    return policy
+
+
+def fsync_dir(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # directories can't be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _create_temp(path: Path) -> tuple[int, Path]:
+    """Open a new dotfile next to path for writing. It is created with mode
+    0o666 for the kernel to narrow by the umask, as a plain open() would."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp = path.with_name(f".{path.name}.{os.urandom(6).hex()}.tmp")
+        try:
+            return os.open(tmp, flags, 0o666), tmp
+        except FileExistsError:
+            continue
+
+
+@contextmanager
+def atomic_writer(path: str | Path, fsync: str = "off") -> Iterator[IO[bytes]]:
+    """Binary file that replaces path only if the block completes.
+
+    The temp file is a dotfile in the same directory, which listings ignore.
+    A replaced file keeps its mode; a new one gets the umask's default.
+    """
+    path = Path(path)
+    fd, tmp = _create_temp(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            try:
+                os.chmod(tmp, path.stat().st_mode & 0o7777)
+            except FileNotFoundError:
+                pass
+            yield f
+            if fsync != "off":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    if fsync == "full":
+        fsync_dir(path.parent)
+
+
+def atomic_write(path: Path, data: str, fsync: str = "off") -> None:
+    """Replace path with data so readers see either the old or the new file."""
+    with atomic_writer(path, fsync) as f:
+        f.write(data.encode("utf-8"))
+
+
+def atomic_rename(src: Path, dst: Path, fsync: str = "off") -> None:
+    os.replace(src, dst)
+    if fsync == "full":
+        fsync_dir(dst.parent)
+
+
+class KeyedLocks:
+    """Per-key exclusive locks shared by threads and processes.
+
+    Each key gets its own lock file under ``<directory>/.prompter-locks`` held
+    with ``fcntl.flock``, so writers to different prompts never wait on each
+    other. flock locks belong to the open file description, which makes them
+    exclusive between threads of one process too. Without fcntl (Windows), or
+    with no directory, the locks only cover the current process.
+
+    Lock files are empty and are never removed: unlinking one while another
+    process waits on it would let two writers hold "the same" lock. That
+    leaves one empty file per prompt id ever written; the whole directory
+    can be deleted safely whenever no prompter process is running.
+    """
+
+    def __init__(self, directory: Path | None) -> None:
+        self.directory = directory / LOCK_DIRNAME if directory is not None else None
+        # Created on first use rather than here, so that opening a store
+        # doesn't create its directory.
+        self._created = False
+        self._local: dict[str, threading.Lock] = {}
+        self._local_guard = threading.Lock()
+
+    def _local_lock(self, key: str) -> threading.Lock:
+        with self._local_guard:
+            return self._local.setdefault(key, threading.Lock())
+
+    @contextmanager
+    def _hold(self, key: str) -> Iterator[None]:
+        if fcntl is None or self.directory is None:
+            with self._local_lock(key):
+                yield
+            return
+        path = self.directory / f"{key}.lock"
+        if not self._created:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._created = True
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            # The lock directory was removed (see above); recreate it.
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the flock
+
+    @contextmanager
+    def hold(self, *keys: str) -> Iterator[None]:
+        """Lock every key, in sorted order so renames can't deadlock."""
+        with ExitStack() as stack:
+            for key in sorted(set(keys)):
+                stack.enter_context(self._hold(key))
+            yield
+
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Iterable
+
+
+class CycleError(ValueError):
+    """Saving a prompt would make it include, extend or import itself."""
+
+    def __init__(self, path: list[str]) -> None:
+        self.path = path
+        super().__init__(f"Template cycle: {' -> '.join(path)}")
+
+
+class DependencyGraph:
+    """Which prompts include, extend or import which other prompts.
+
+    Edges are learned as prompts are saved or rendered, so the graph covers
+    the part of the library this process has seen. It answers two questions:
+    what depends on a prompt that just changed, and would a new set of
+    references close a cycle.
+    """
+
+    def __init__(self) -> None:
+        self._refs: dict[str, frozenset[str]] = {}
+        self._users: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, name: str, refs: Iterable[str]) -> None:
+        refs = frozenset(refs)
+        with self._lock:
+            for old in self._refs.get(name, ()):
+                self._users.get(old, set()).discard(name)
+            self._refs[name] = refs
+            for ref in refs:
+                self._users.setdefault(ref, set()).add(name)
+
+    def forget(self, name: str) -> None:
+        """Drop name's own references (its content changed or is gone);
+        what is known about prompts referencing it is kept."""
+        with self._lock:
+            for old in self._refs.pop(name, ()):
+                self._users.get(old, set()).discard(name)
+
+    def dependents(self, names: Iterable[str]) -> set[str]:
+        """Everything that references any of names, directly or not."""
+        with self._lock:
+            seen: set[str] = set()
+            stack = list(names)
+            while stack:
+                for user in self._users.get(stack.pop(), ()):
+                    if user not in seen:
+                        seen.add(user)
+                        stack.append(user)
+            return seen
+
+    @staticmethod
+    def find_cycle(
+        name: str,
+        refs: Iterable[str],
+        references_of: Callable[[str], Iterable[str]],
+    ) -> list[str] | None:
+        """The path back to name if it referenced refs, else None.
+
+        references_of supplies the references of every other prompt reached.
+        """
+        stack: list[tuple[str, list[str]]] = [(ref, [name, ref]) for ref in sorted(refs)]
+        seen: set[str] = set()
+        while stack:
+            current, path = stack.pop()
+            if current == name:
+                return path
+            if current in seen:
+                continue
+            seen.add(current)
+            for ref in sorted(references_of(current)):
+                stack.append((ref, path + [ref]))
+        return None
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .models import Revision
+
+HISTORY_FILENAME = ".prompter-history.db"
+
+_SCHEMA_VERSION = 1
+
+_SCHEMA = (
+    # Content-addressed: one row per distinct file text, however many
+    # revisions (or prompts) share it.
+    """
+    CREATE TABLE IF NOT EXISTS objects (
+        hash TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        data BLOB NOT NULL
+    ) WITHOUT ROWID
+    """,
+    # hash is NULL for a deletion.
+    """
+    CREATE TABLE IF NOT EXISTS revisions (
+        id       TEXT NOT NULL,
+        rev      INTEGER NOT NULL,
+        hash     TEXT,
+        action   TEXT NOT NULL,
+        saved_at TEXT NOT NULL,
+        PRIMARY KEY (id, rev)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+def history_enabled(value: bool | None = None) -> bool:
+    """Resolve PROMPTER_HISTORY (default on) unless value is given."""
+    if value is not None:
+        return value
+    return os.environ.get("PROMPTER_HISTORY", "1").strip().lower() not in ("0", "false", "no", "")
+
+
+class History:
+    """Every saved version of every prompt, in a SQLite sidecar.
+
+    File texts are stored once per distinct content, zlib-compressed and keyed
+    by SHA-256; revisions point at them by hash. Both tables are keyed for
+    direct lookup, so listing one prompt's history or fetching any revision
+    never scans anything else.
+    """
+
+    def __init__(self, path: str | Path, fsync: str = "off") -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Autocommit; writes open their own IMMEDIATE transactions.
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False, isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # Unlike the caches, history can't be rebuilt, so it follows the
+        # store's fsync policy: NORMAL loses at most the last commits on power
+        # loss, FULL loses nothing.
+        self._conn.execute(f"PRAGMA synchronous = {'FULL' if fsync == 'full' else 'NORMAL'}")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        with self._write():
+            if version == 0:
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            elif version != _SCHEMA_VERSION:
+                raise RuntimeError(f"{self.path} has unsupported history version {version}")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        # IMMEDIATE takes the write lock up front, so revision numbers read
+        # inside the transaction can't be handed out twice across processes.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _latest(self, id_: str) -> tuple[int, str | None]:
+        row = self._conn.execute(
+            "SELECT rev, hash FROM revisions WHERE id = ? ORDER BY rev DESC LIMIT 1", (id_,)
+        ).fetchone()
+        return row if row else (0, None)
+
+    def record(self, entries: Iterable[tuple[str, str | None, str]]) -> None:
+        """Add a revision per (id, text, action); text None records a deletion.
+
+        An entry whose text matches the prompt's latest revision is skipped,
+        so re-reporting a known version (the watcher seeing our own write, for
+        one) never adds a revision.
+        """
+        entries = list(entries)
+        if not entries:
+            return
+        # Hash and compress before taking the write lock.
+        prepared = []
+        for id_, text, action in entries:
+            if text is None:
+                prepared.append((id_, None, action, None))
+                continue
+            data = text.encode()
+            prepared.append((id_, hashlib.sha256(data).hexdigest(), action, data))
+        saved_at = datetime.now(timezone.utc).isoformat()
+        with self._write():
+            for id_, hash_, action, data in prepared:
+                rev, latest = self._latest(id_)
+                if hash_ == latest and (hash_ is not None or rev):
+                    continue
+                if data is not None:
+                    exists = self._conn.execute(
+                        "SELECT 1 FROM objects WHERE hash = ?", (hash_,)
+                    ).fetchone()
+                    if exists is None:
+                        self._conn.execute(
+                            "INSERT INTO objects (hash, size, data) VALUES (?, ?, ?)",
+                            (hash_, len(data), zlib.compress(data)),
+                        )
+                self._conn.execute(
+                    "INSERT INTO revisions (id, rev, hash, action, saved_at) VALUES (?, ?, ?, ?, ?)",
+                    (id_, rev + 1, hash_, action, saved_at),
+                )
+
+    def rename(self, old: str, new: str) -> None:
+        """Carry old's revisions over to new, after any new already had."""
+        with self._write():
+            offset, _ = self._latest(new)
+            self._conn.execute(
+                "UPDATE revisions SET id = ?, rev = rev + ? WHERE id = ?", (new, offset, old)
+            )
+
+    @staticmethod
+    def _revision(id_: str, row) -> Revision:
+        # Rows were written by record(); skip validating each of them.
+        rev, hash_, action, saved_at, size = row
+        return Revision.model_construct(
+            id=id_, rev=rev, hash=hash_, action=action,
+            saved_at=datetime.fromisoformat(saved_at), size=size or 0,
+        )
+
+    def revisions(self, id_: str) -> list[Revision]:
+        """id's revisions, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.rev, r.hash, r.action, r.saved_at, o.size FROM revisions r"
+                " LEFT JOIN objects o ON o.hash = r.hash WHERE r.id = ? ORDER BY r.rev",
+                (id_,),
+            ).fetchall()
+        return [self._revision(id_, row) for row in rows]
+
+    def get(self, id_: str, rev: int) -> tuple[Revision, str | None] | None:
+        """A revision and its file text (None for a deletion). Negative revs
+        count back from the latest, so -1 is the current one."""
+        with self._lock:
+            if rev < 0:
+                latest, _ = self._latest(id_)
+                rev = latest + 1 + rev
+            row = self._conn.execute(
+                "SELECT r.rev, r.hash, r.action, r.saved_at, o.size, o.data FROM revisions r"
+                " LEFT JOIN objects o ON o.hash = r.hash WHERE r.id = ? AND r.rev = ?",
+                (id_, rev),
+            ).fetchone()
+        if row is None:
+            return None
+        data = row[5]
+        return self._revision(id_, row[:5]), zlib.decompress(data).decode() if data is not None else None
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from .models import Prompt, PromptListItem, SearchHit, TemplateVariables
+
+INDEX_FILENAME = ".prompter-index.db"
+
+# Bump when the table layout changes; older index files are rebuilt from scratch.
+_SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    docid       INTEGER PRIMARY KEY,
+    filename    TEXT NOT NULL UNIQUE,
+    mtime_ns    INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    inode       INTEGER NOT NULL,
+    id          TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    description TEXT NOT NULL,
+    tags        TEXT NOT NULL,
+    tool        TEXT NOT NULL,
+    category    TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    -- TemplateVariables JSON, filled in when the prompt is saved or first
+    -- rendered; NULL until then.
+    template_vars TEXT
+)
+"""
+
+_ID_INDEX = "CREATE INDEX IF NOT EXISTS entries_id ON entries (id)"
+
+# Full-text index over the same documents; rowid matches entries.docid.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+    name, description, tags, content, tokenize = 'unicode61'
+)
+"""
+
+# bm25() column weights: name, description, tags, content.
+_BM25_WEIGHTS = (10.0, 4.0, 4.0, 1.0)
+
+Signature = tuple[int, int, int]
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def file_signature(st) -> Signature:
+    """Identity of a file's current contents as far as the index cares."""
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class PromptIndex:
+    """SQLite sidecar holding the listing metadata of every prompt file.
+
+    Rows are keyed by filename and carry the stat signature they were built
+    from, so callers only need to re-parse files whose signature changed.
+    """
+
+    def __init__(self, path: str | Path | None) -> None:
+        self.path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.fts = False
+        self._conn = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        target = str(self.path) if self.path is not None else ":memory:"
+        try:
+            conn = sqlite3.connect(target, timeout=30, check_same_thread=False)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != _SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS entries")
+                conn.execute("DROP TABLE IF EXISTS search")
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.execute(_SCHEMA)
+            conn.execute(_ID_INDEX)
+            try:
+                conn.execute(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5; listing still works, search does not.
+                self.fts = False
+            conn.commit()
+        except sqlite3.Error:
+            # Read-only or otherwise unusable directory: keep the index in memory.
+            if self.path is None:
+                raise
+            self.path = None
+            return self._connect()
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def generation(self) -> tuple[int, int]:
+        """Changes whenever the indexed rows may have changed, whether through
+        this connection or another process writing the same file."""
+        with self._lock:
+            return self._writes, self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def signatures(self) -> dict[str, Signature]:
+        with self._lock:
+            rows = self._conn.execute("SELECT filename, mtime_ns, size, inode FROM entries")
+            return {name: (mtime, size, ino) for name, mtime, size, ino in rows}
+
+    def put_many(
+        self,
+        rows: list[tuple[str, Signature, Prompt]],
+        template_vars: dict[str, TemplateVariables] | None = None,
+    ) -> None:
+        """Upsert rows; template_vars (by filename) stores their variable
+        analysis, and rows without one have any previous analysis cleared."""
+        if not rows:
+            return
+        template_vars = template_vars or {}
+        with self._lock, self._conn:
+            self._writes += 1
+            for filename, sig, p in rows:
+                tags = json.dumps(p.tags)
+                analysis = template_vars.get(filename)
+                self._conn.execute(
+                    "INSERT INTO entries (filename, mtime_ns, size, inode, id, name, description,"
+                    " tags, tool, category, updated_at, template_vars)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(filename) DO UPDATE SET mtime_ns = excluded.mtime_ns,"
+                    " size = excluded.size, inode = excluded.inode, id = excluded.id,"
+                    " name = excluded.name, description = excluded.description,"
+                    " tags = excluded.tags, tool = excluded.tool, category = excluded.category,"
+                    " updated_at = excluded.updated_at, template_vars = excluded.template_vars",
+                    (
+                        filename, *sig, p.id, p.name, p.description, tags,
+                        p.tool, p.category, p.updated_at.isoformat(),
+                        analysis.model_dump_json() if analysis is not None else None,
+                    ),
+                )
+                if self.fts:
+                    (docid,) = self._conn.execute(
+                        "SELECT docid FROM entries WHERE filename = ?", (filename,)
+                    ).fetchone()
+                    self._conn.execute("DELETE FROM search WHERE rowid = ?", (docid,))
+                    self._conn.execute(
+                        "INSERT INTO search (rowid, name, description, tags, content) VALUES (?, ?, ?, ?, ?)",
+                        (docid, p.name, p.description, " ".join(map(str, p.tags)), p.content),
+                    )
+
+    def put(
+        self,
+        filename: str,
+        sig: Signature,
+        prompt: Prompt,
+        template_vars: TemplateVariables | None = None,
+    ) -> None:
+        self.put_many([(filename, sig, prompt)], {filename: template_vars} if template_vars is not None else None)
+
+    def template_vars(self, filename: str, sig: Signature) -> TemplateVariables | None:
+        """The stored variable analysis, if the row is current for sig."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size, inode, template_vars FROM entries WHERE filename = ?",
+                (filename,),
+            ).fetchone()
+        if row is None or row[3] is None or tuple(row[:3]) != sig:
+            return None
+        return TemplateVariables.model_validate_json(row[3])
+
+    def remove_many(self, filenames) -> None:
+        filenames = list(filenames)
+        if not filenames:
+            return
+        with self._lock, self._conn:
+            self._writes += 1
+            for filename in filenames:
+                row = self._conn.execute(
+                    "SELECT docid FROM entries WHERE filename = ?", (filename,)
+                ).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute("DELETE FROM entries WHERE docid = ?", row)
+                if self.fts:
+                    self._conn.execute("DELETE FROM search WHERE rowid = ?", row)
+
+    def remove(self, filename: str) -> None:
+        self.remove_many([filename])
+
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        """Rank documents matching every word of query with BM25.
+
+        The last word also matches as a prefix, so partial input finds hits.
+        """
+        if not self.fts:
+            raise RuntimeError("Full-text search requires SQLite built with FTS5")
+        words = _WORD.findall(query)
+        if not words:
+            return []
+        match = " ".join(f'"{w}"' for w in words) + "*"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT e.id, e.name, e.description, e.tags, e.tool, e.category,"
+                f" bm25(search, {', '.join(map(str, _BM25_WEIGHTS))}) AS rank,"
+                " snippet(search, -1, '[', ']', '...', 12)"
+                " FROM search JOIN entries e ON e.docid = search.rowid"
+                " WHERE search MATCH ? ORDER BY rank LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [
+            SearchHit(
+                id=id_, name=name, description=description, tags=json.loads(tags),
+                tool=tool, category=category, score=-rank, snippet=snippet,
+            )
+            for id_, name, description, tags, tool, category, rank, snippet in rows
+        ]
+
+    @staticmethod
+    def _item(row) -> PromptListItem:
+        # Rows were validated on the way in; skip re-validating thousands of them.
+        id_, name, description, tags, tool, category, updated_at = row
+        return PromptListItem.model_construct(
+            id=id_, name=name, description=description, tags=json.loads(tags),
+            tool=tool, category=category, updated_at=datetime.fromisoformat(updated_at),
+        )
+
+    def items(self) -> list[PromptListItem]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, description, tags, tool, category, updated_at"
+                " FROM entries ORDER BY id"
+            ).fetchall()
+        return [self._item(row) for row in rows]
+
+    def iter_items(self, batch_size: int = 500) -> Iterator[PromptListItem]:
+        """Like items(), but reads batch_size rows at a time. Each batch is its
+        own query (keyed on the last id seen), so no lock or statement is held
+        while the caller consumes them."""
+        after = None
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, name, description, tags, tool, category, updated_at FROM entries"
+                    + (" WHERE id > ?" if after is not None else "")
+                    + " ORDER BY id LIMIT ?",
+                    (after, batch_size) if after is not None else (batch_size,),
+                ).fetchall()
+            for row in rows:
+                yield self._item(row)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
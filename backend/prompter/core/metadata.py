@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Any
+
+# Prompter's own frontmatter is parsed here; anything beyond that subset goes
+# to PyYAML. Results match python-frontmatter's.
+
+# Same delimiter rule as python-frontmatter's YAMLHandler.
+_BOUNDARY = re.compile(r"^-{3,}\s*$", re.MULTILINE)
+_BOUNDARY_LINE = re.compile(r"-{3,}\s*")
+
+_KEY = re.compile(r"([A-Za-z_][\w-]*):(?: +(.*?))? *")
+_ITEM = re.compile(r" *-(?: +(.*?))? *")
+_SINGLE_QUOTED = re.compile(r"'((?:[^']|'')*)'")
+_DOUBLE_QUOTED = re.compile(r'"([^"\\]*)"')
+
+# Characters with special meaning at the start of a YAML scalar.
+_INDICATORS = set("-?:,[]{}#&*!|>'\"%@`")
+
+# Plain words YAML 1.1 resolves to booleans or null rather than strings.
+_NOT_STRINGS = {"yes", "no", "true", "false", "on", "off", "null"}
+
+
+class _Unsupported(Exception):
+    """The block uses YAML beyond the subset handled here."""
+
+
+def _scalar(value: str) -> Any:
+    if not value:
+        return None
+    if value == "[]":
+        return []
+    if value[0] == "'":
+        m = _SINGLE_QUOTED.fullmatch(value)
+        if m:
+            return m.group(1).replace("''", "'")
+        raise _Unsupported
+    if value[0] == '"':
+        m = _DOUBLE_QUOTED.fullmatch(value)
+        if m:
+            return m.group(1)
+        raise _Unsupported
+    if value[0] == "[" and value[-1] == "]":
+        inner = value[1:-1]
+        if any(c in inner for c in "[]{}'\"#"):
+            raise _Unsupported
+        items = [item.strip() for item in inner.split(",")]
+        return [_plain(item) for item in items]
+    return _plain(value)
+
+
+def _plain(value: str, continuation: bool = False) -> str:
+    # Only plain scalars that can't resolve to anything but a string: those
+    # starting with a letter, minus the YAML 1.1 boolean/null words, with no
+    # comment or nested "key: value" inside.
+    if (
+        not value
+        or not (continuation or value[0].isalpha() or value[0] == "_")
+        or value.lower() in _NOT_STRINGS
+        or ": " in value
+        or " #" in value
+        or value.endswith(":")
+    ):
+        raise _Unsupported
+    return value
+
+
+def _parse_simple(block: str) -> dict[str, Any]:
+    if "\t" in block:
+        raise _Unsupported  # YAML is picky about tabs; let it decide
+    data: dict[str, Any] = {}
+    key = None
+    items: list | None = None  # block list being filled by "- item" lines
+    indent = -1
+    folding = False  # key's value is a plain scalar that may continue
+    for line in block.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            # A blank line inside a folded scalar means a newline; leave that
+            # (and comments) to YAML.
+            folding = False
+            continue
+        m = _ITEM.fullmatch(line) if stripped[0] == "-" else None
+        if m is not None:
+            item_indent = len(line) - len(line.lstrip(" "))
+            if items is None or (indent >= 0 and item_indent != indent):
+                raise _Unsupported
+            indent = item_indent
+            items.append(_scalar(m.group(1) or ""))
+            data[key] = items
+            continue
+        if line[0] == " ":
+            # yaml.dump wraps long plain scalars onto indented lines, which
+            # fold back together with single spaces.
+            if not folding or stripped[0] in _INDICATORS:
+                raise _Unsupported
+            data[key] += " " + _plain(stripped, continuation=True)
+            continue
+        m = _KEY.fullmatch(line)
+        if m is None or m.group(1).lower() in _NOT_STRINGS:
+            raise _Unsupported
+        key, value = m.group(1), m.group(2) or ""
+        # An empty value is null unless "- item" lines follow.
+        data[key] = _scalar(value)
+        items = [] if not value else None
+        indent = -1
+        folding = isinstance(data[key], str) and value[0] not in "'\""
+    return data
+
+
+def _yaml_load(block: str) -> Any:
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(block, Loader=loader)
+
+
+def load_metadata(block: str) -> dict[str, Any]:
+    """Parse a frontmatter block (without the --- lines) into a dict."""
+    try:
+        return _parse_simple(block)
+    except _Unsupported:
+        data = _yaml_load(block)
+        return data if isinstance(data, dict) else {}
+
+
+def parse_document(text: str) -> tuple[dict[str, Any], str]:
+    """Split a prompt file into (metadata, content) like frontmatter.loads."""
+    if not _BOUNDARY.match(text):
+        import frontmatter
+
+        post = frontmatter.loads(text)
+        return dict(post.metadata), post.content
+    text = text.strip()
+    parts = _BOUNDARY.split(text, 2)
+    if len(parts) < 3:
+        return {}, text
+    return load_metadata(parts[1]), parts[2].strip()
+
+
+def read_document(path: str | Path) -> tuple[dict[str, Any], str]:
+    with open(path, encoding="utf-8") as f:
+        return parse_document(f.read())
+
+
+def read_metadata(path: str | Path) -> dict[str, Any]:
+    """Frontmatter of a file, reading only up to the closing ---.
+
+    Lines are decoded one at a time, so the body is never even decoded.
+    """
+    with open(path, "rb") as f:
+        first = f.readline().decode("utf-8")
+        if not _BOUNDARY_LINE.fullmatch(first.rstrip("\n")):
+            return read_document(path)[0]
+        lines = []
+        for raw in f:
+            line = raw.decode("utf-8")
+            if _BOUNDARY_LINE.fullmatch(line.rstrip("\n")):
+                return load_metadata("".join(lines))
+            lines.append(line)
+    return {}  # never closed: python-frontmatter treats it all as content
@@ -29,6 +29,48 @@ class PromptListItem(BaseModel):
     updated_at: datetime
 
 
+class SearchHit(BaseModel):
+    id: str
+    name: str
+    description: str = ""
+    tags: list[str] = Field(default_factory=list)
+    tool: str = "generic"
+    category: str = ""
+    score: float
+    snippet: str = ""
+
+
+class BulkResult(BaseModel):
+    created: list[str] = Field(default_factory=list)
+    overwritten: list[str] = Field(default_factory=list)
+    conflicts: list[str] = Field(default_factory=list)
+    errors: list[str] = Field(default_factory=list)
+
+
+class ExportResult(BaseModel):
+    # Paths of output files, relative to the export's root.
+    written: list[str] = Field(default_factory=list)
+    unchanged: int = 0
+    removed: list[str] = Field(default_factory=list)
+    errors: list[str] = Field(default_factory=list)
+
+
+class Revision(BaseModel):
+    id: str
+    rev: int
+    hash: Optional[str] = None  # None for a deletion
+    action: str
+    size: int = 0
+    saved_at: datetime
+
+
+class TemplateVariables(BaseModel):
+    # Every variable the template reads, and the subset it reads
+    # unconditionally (outside if/for bodies, defaults and `is defined`).
+    found: list[str] = Field(default_factory=list)
+    required: list[str] = Field(default_factory=list)
+
+
 class PromptCreate(BaseModel):
     name: str
     description: str = ""
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import base64
+import bisect
+from typing import Iterable
+
+from .models import PromptListItem
+
+
+def encode_cursor(id_: str) -> str:
+    return base64.urlsafe_b64encode(id_.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode()
+    except ValueError:
+        raise ValueError("Invalid cursor") from None
+
+
+class ListingIndex:
+    """In-memory inverted indexes over a prompt listing.
+
+    Items are kept sorted by id, which is also the pagination order, so a
+    cursor is simply the last id of the previous page.
+    """
+
+    def __init__(self, items: Iterable[PromptListItem]) -> None:
+        self.items = sorted(items, key=lambda i: i.id)
+        self.ids = [i.id for i in self.items]
+        self.by_tag: dict[str, set[int]] = {}
+        self.by_tool: dict[str, set[int]] = {}
+        self.by_category: dict[str, set[int]] = {}
+        for pos, item in enumerate(self.items):
+            for tag in item.tags:
+                self.by_tag.setdefault(str(tag).lower(), set()).add(pos)
+            self.by_tool.setdefault(item.tool.lower(), set()).add(pos)
+            if item.category:
+                self.by_category.setdefault(item.category.lower(), set()).add(pos)
+        self._names = sorted((item.name.lower(), pos) for pos, item in enumerate(self.items))
+
+    def _prefixed(self, prefix: str) -> set[int]:
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._names, (prefix,))
+        found = set()
+        for name, pos in self._names[start:]:
+            if not name.startswith(prefix):
+                break
+            found.add(pos)
+        return found
+
+    def query(
+        self,
+        tag: str | None = None,
+        tool: str | None = None,
+        category: str | None = None,
+        tag_contains: str | None = None,
+        q: str | None = None,
+        prefix: str | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> tuple[list[PromptListItem], int, str | None]:
+        """Return (page, total matches, next cursor or None)."""
+        candidates: set[int] | None = None
+        for table, value in ((self.by_tag, tag), (self.by_tool, tool), (self.by_category, category)):
+            if value:
+                hits = table.get(value.lower(), set())
+                candidates = hits if candidates is None else candidates & hits
+        if tag_contains:
+            # Distinct tags are few next to prompts, so scanning them is cheap.
+            needle = tag_contains.lower()
+            hits = set().union(*(positions for t, positions in self.by_tag.items() if needle in t))
+            candidates = hits if candidates is None else candidates & hits
+        if prefix:
+            hits = self._prefixed(prefix)
+            candidates = hits if candidates is None else candidates & hits
+        positions = range(len(self.items)) if candidates is None else sorted(candidates)
+        if q:
+            needle = q.lower()
+            positions = [
+                pos for pos in positions
+                if needle in self.items[pos].name.lower() or needle in self.items[pos].description.lower()
+            ]
+        positions = list(positions)
+        total = len(positions)
+        if cursor:
+            after = bisect.bisect_right(self.ids, decode_cursor(cursor))
+            positions = positions[bisect.bisect_left(positions, after):]
+        if limit is None or len(positions) <= limit:
+            return [self.items[pos] for pos in positions], total, None
+        page = [self.items[pos] for pos in positions[:limit]]
+        return page, total, encode_cursor(page[-1].id)
@@ -1,15 +1,385 @@
 from __future__ import annotations
 
-from jinja2 import BaseLoader, StrictUndefined
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+from jinja2 import BaseLoader, Environment, StrictUndefined, Template, TemplateError, TemplateNotFound, meta, nodes
 from jinja2.sandbox import SandboxedEnvironment
 
+from .cache import LRUCache
+from .metrics import timed
+from .models import TemplateVariables
+
+if TYPE_CHECKING:
+    from .store import PromptStore
+
 
-def render_prompt(content: str, variables: dict[str, str]) -> str:
-    env = SandboxedEnvironment(
-        loader=BaseLoader(),
+def prompt_environment(loader: BaseLoader | None = None) -> SandboxedEnvironment:
+    return SandboxedEnvironment(
+        loader=loader or BaseLoader(),
         variable_start_string="{{",
         variable_end_string="}}",
         undefined=StrictUndefined,
     )
-    template = env.from_string(content)
+
+
+# For content rendered on its own; {% include %} and friends need a store's
+# environment (PromptStore.environment) to find other prompts.
+_env = prompt_environment()
+
+
+class PromptLoader(BaseLoader):
+    """Resolves include/extends/import names through a PromptStore: "name"
+    is a prompt in the store, "templates/name" a bundled template.
+
+    Jinja keeps loaded fragments compiled and asks uptodate() before each
+    reuse, which compares the fragment file's stat signature. Both read the
+    store, so async callers must compile and render templates from this
+    loader's environment on the I/O pool, not on the event loop.
+    """
+
+    def __init__(self, store: PromptStore) -> None:
+        self.store = store
+
+    def get_source(self, environment: Environment, template: str) -> tuple[str, str, Callable[[], bool]]:
+        try:
+            content, uptodate = self.store.fragment(template)
+        except (FileNotFoundError, ValueError):
+            raise TemplateNotFound(template) from None
+        return content, template, uptodate
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class TemplateCache(LRUCache[tuple[int, str], Template]):
+    """Bounded LRU of compiled templates keyed by the hash of their source.
+
+    Callers may also tag an entry with a key (typically a prompt id) so the
+    entry can be dropped as soon as the prompt is edited or deleted.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        super().__init__(maxsize)
+        self._keys: dict[str, tuple[int, str]] = {}
+
+    def get_or_compile(self, content: str, key: str | None = None, env: Environment | None = None) -> Template:
+        """The compiled template for content, compiling it on a miss."""
+        env = env or _env
+        # Compiled templates belong to the environment that compiled them. A
+        # cached template keeps its environment alive, so the id stays unique.
+        digest = (id(env), content_hash(content))
+        template = self.get(digest)
+        if template is None:
+            template = env.from_string(content)
+            self.put(digest, template)
+        if key is not None and self.maxsize > 0:
+            with self._lock:
+                self._keys[key] = digest
+                if len(self._keys) > 2 * max(self.maxsize, 1):
+                    # Forget keys whose templates have been evicted.
+                    self._keys = {k: d for k, d in self._keys.items() if d in self._data}
+        return template
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            digest = self._keys.pop(key, None)
+            if digest is not None:
+                self._data.pop(digest, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._keys.clear()
+            self.hits = self.misses = 0
+
+
+template_cache = TemplateCache(int(os.environ.get("PROMPTER_TEMPLATE_CACHE_SIZE", "256")))
+
+
+@timed("render")
+def render_prompt(
+    content: str,
+    variables: dict[str, str],
+    key: str | None = None,
+    env: Environment | None = None,
+) -> str:
+    template = template_cache.get_or_compile(content, key, env)
     return template.render(**variables)
+
+
+# Only content with one of these tags can reference another template, and
+# most prompts have none, so the rest skip parsing.
+_REFERENCE_TAG = re.compile(r"\{%[-+]?\s*(?:include|extends|import|from)\b")
+
+_references: LRUCache[str, tuple[str, ...]] = LRUCache(1024)
+
+
+def template_references(content: str) -> tuple[str, ...]:
+    """Names of the templates content includes, extends or imports.
+
+    Names computed at render time can't be known here and are left out.
+    """
+    if not _REFERENCE_TAG.search(content):
+        return ()
+    digest = content_hash(content)
+    refs = _references.get(digest)
+    if refs is None:
+        try:
+            found = meta.find_referenced_templates(_env.parse(content))
+            refs = tuple(sorted({name for name in found if name is not None}))
+        except TemplateError:
+            refs = ()
+        _references.put(digest, refs)
+    return refs
+
+
+# ---------------------------------------------------------------------------
+# Static analysis: which variables a template needs, without rendering it
+# ---------------------------------------------------------------------------
+
+# Child fields that may never be evaluated: branch bodies, loop bodies,
+# short-circuited operands and macro bodies.
+_CONDITIONAL_FIELDS: dict[type, tuple[str, ...]] = {
+    nodes.If: ("body", "elif_", "else_"),
+    nodes.For: ("body", "else_", "test"),
+    nodes.CondExpr: ("expr1", "expr2"),
+    nodes.And: ("right",),
+    nodes.Or: ("right",),
+    nodes.Macro: ("args", "defaults", "body"),
+    nodes.CallBlock: ("args", "defaults", "body"),
+}
+
+# Filters and tests that accept an undefined operand.
+_LENIENT_FILTERS = {"default", "d"}
+_LENIENT_TESTS = {"defined", "undefined"}
+
+
+def _unconditional_names(node: nodes.Node, out: set[str]) -> None:
+    if isinstance(node, nodes.Name):
+        if node.ctx == "load":
+            out.add(node.name)
+        return
+    skip = _CONDITIONAL_FIELDS.get(type(node), ())
+    if isinstance(node, nodes.Filter) and node.name in _LENIENT_FILTERS:
+        skip = ("node",)
+    elif isinstance(node, nodes.Test) and node.name in _LENIENT_TESTS:
+        skip = ("node",)
+    for field in node.fields:
+        if field in skip:
+            continue
+        value = getattr(node, field)
+        for child in value if isinstance(value, list) else (value,):
+            if isinstance(child, nodes.Node):
+                _unconditional_names(child, out)
+
+
+def analyze_variables(content: str) -> TemplateVariables:
+    """Variables a template reads, from its AST.
+
+    Rendering with StrictUndefined fails whenever a required variable is
+    missing, so callers can reject such requests without rendering. A
+    template that doesn't parse requires nothing here; rendering it reports
+    the syntax error.
+    """
+    try:
+        ast = _env.parse(content)
+    except TemplateError:
+        return TemplateVariables()
+    found = meta.find_undeclared_variables(ast)
+    unconditional: set[str] = set()
+    _unconditional_names(ast, unconditional)
+    return TemplateVariables(found=sorted(found), required=sorted(found & unconditional))
+
+
+def missing_variables(analysis: TemplateVariables, variables: dict) -> list[str]:
+    return [name for name in analysis.required if name not in variables]
+
+
+# ---------------------------------------------------------------------------
+# Output cache: finished renders and exports, keyed by what they depend on
+# ---------------------------------------------------------------------------
+
+def output_key(
+    content: str,
+    kind: str,
+    variables: dict[str, str] | None = None,
+    dependencies: str = "",
+) -> str:
+    """Digest of everything an output depends on: the prompt body, what was
+    done to it ("render", or "export:<resolved format>"), the variables and,
+    for templates that include others, a digest of those
+    (PromptStore.dependency_digest).
+
+    Outputs depend on nothing else, so the key doubles as an ETag and an
+    edited prompt or fragment simply stops matching its old entries.
+    """
+    canonical = json.dumps(variables or {}, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{kind}\0{canonical}\0{dependencies}\0{content}".encode()).hexdigest()
+
+
+class OutputCache(LRUCache[str, str]):
+    """LRU of rendered and exported outputs keyed by output_key().
+
+    Outputs longer than max_entry characters are returned but not kept, so a
+    few huge renders can't crowd out the common ones. Entries may be tagged
+    with a prompt id, so invalidate() can drop a prompt's outputs as soon as
+    it (or a fragment it includes) changes instead of waiting for eviction.
+    """
+
+    def __init__(self, maxsize: int = 1024, max_entry: int = 256 * 1024) -> None:
+        super().__init__(maxsize)
+        self.max_entry = max_entry
+        # Conditional requests answered without touching the cache at all.
+        self.not_modified = 0
+        self._tags: dict[str, set[str]] = {}
+
+    def put(self, key: str, value: str, tag: str | None = None) -> None:
+        if len(value) > self.max_entry:
+            return
+        super().put(key, value)
+        if tag is not None and self.maxsize > 0:
+            with self._lock:
+                self._tags.setdefault(tag, set()).add(key)
+                if len(self._tags) > 2 * max(self.maxsize, 1):
+                    # Forget tags whose entries have all been evicted.
+                    self._tags = {
+                        t: live for t, keys in self._tags.items() if (live := keys & self._data.keys())
+                    }
+
+    def invalidate(self, tag: str) -> None:
+        with self._lock:
+            for key in self._tags.pop(tag, ()):
+                self._data.pop(key, None)
+
+    def get_or_compute(self, key: str, compute: Callable[[], str], tag: str | None = None) -> str:
+        output = self.get(key)
+        if output is None:
+            output = compute()
+            self.put(key, output, tag)
+        return output
+
+    def count_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def info(self) -> dict[str, int | float]:
+        info = super().info()
+        lookups = info["hits"] + info["misses"]
+        info["hit_rate"] = round(info["hits"] / lookups, 4) if lookups else 0.0
+        info["not_modified"] = self.not_modified
+        return info
+
+
+output_cache = OutputCache(int(os.environ.get("PROMPTER_OUTPUT_CACHE_SIZE", "1024")))
+
+
+# ---------------------------------------------------------------------------
+# Batch rendering: one template, many NDJSON rows of variables
+# ---------------------------------------------------------------------------
+
+def render_row(template: Template, index: int, line: str | bytes, required: Iterable[str] = ()) -> dict:
+    """Render one NDJSON row. Failures are reported in the result, never raised.
+
+    Rows lacking any of the required variables (see analyze_variables) are
+    rejected without rendering.
+    """
+    try:
+        variables = json.loads(line)
+    except ValueError as e:
+        return {"index": index, "error": f"Invalid JSON: {e}"}
+    if not isinstance(variables, dict):
+        return {"index": index, "error": "Row must be a JSON object of variables"}
+    missing = [name for name in required if name not in variables]
+    if missing:
+        return {"index": index, "error": f"Missing variables: {', '.join(missing)}"}
+    try:
+        return {"index": index, "rendered": template.render(**variables)}
+    except (TemplateError, TypeError, ValueError) as e:
+        return {"index": index, "error": str(e)}
+    except RecursionError:
+        # An include cycle written to the files behind the store's back.
+        return {"index": index, "error": "Template references nest too deeply"}
+
+
+def _rows(lines: Iterable[str | bytes]) -> Iterator[str | bytes]:
+    for line in lines:
+        if line.strip():
+            yield line
+
+
+def render_batch(
+    content: str,
+    lines: Iterable[str | bytes],
+    key: str | None = None,
+    env: Environment | None = None,
+) -> Iterator[dict]:
+    """Compile and analyze once, then render every non-blank NDJSON line in order."""
+    template = template_cache.get_or_compile(content, key, env)
+    required = analyze_variables(content).required
+    for index, line in enumerate(_rows(lines)):
+        yield render_row(template, index, line, required)
+
+
+_worker_envs: dict[str, Environment] = {}
+
+
+def _render_chunk(
+    content: str,
+    required: list[str],
+    directory: str | None,
+    start: int,
+    lines: list[str | bytes],
+) -> list[dict]:
+    env = None
+    if directory is not None:
+        env = _worker_envs.get(directory)
+        if env is None:
+            from .store import PromptStore
+
+            env = _worker_envs[directory] = PromptStore(directory).environment()
+    template = template_cache.get_or_compile(content, env=env)
+    return [render_row(template, start + i, line, required) for i, line in enumerate(lines)]
+
+
+def render_batch_parallel(
+    content: str,
+    lines: Iterable[str | bytes],
+    workers: int,
+    chunk_size: int = 256,
+    directory: str | None = None,
+) -> Iterator[dict]:
+    """Like render_batch, but spreads chunks of rows over a process pool.
+
+    Results are yielded in input order and only a few chunks per worker are
+    in flight at a time, so arbitrarily long inputs stream through. Workers
+    resolve includes from the prompts in directory, if given.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    def chunks() -> Iterator[tuple[int, list[str | bytes]]]:
+        chunk: list[str | bytes] = []
+        start = 0
+        for line in _rows(lines):
+            chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield start, chunk
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield start, chunk
+
+    required = analyze_variables(content).required
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for start, chunk in chunks():
+            pending.append(pool.submit(_render_chunk, content, required, directory, start, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
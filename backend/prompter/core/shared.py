@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .index import Signature
+from .models import Prompt
+
+SHARED_CACHE_FILENAME = ".prompter-cache.db"
+
+_SCHEMA_VERSION = 1
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS generations (
+        filename TEXT PRIMARY KEY,
+        gen      INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS prompts (
+        filename TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL,
+        size     INTEGER NOT NULL,
+        inode    INTEGER NOT NULL,
+        gen      INTEGER NOT NULL,
+        data     TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS exports (
+        filename TEXT NOT NULL,
+        fmt      TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size     INTEGER NOT NULL,
+        inode    INTEGER NOT NULL,
+        gen      INTEGER NOT NULL,
+        output   TEXT NOT NULL,
+        PRIMARY KEY (filename, fmt)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS generations_gen ON generations (gen)",
+)
+
+
+class SharedCache:
+    """Parsed prompts and exports shared by every process serving a directory.
+
+    Backed by a SQLite file in WAL mode, so uvicorn workers on one host read
+    each other's work instead of re-parsing files, without blocking writers.
+    Entries carry the stat signature they were built from. Every write bumps
+    a per-file generation; ``changed()`` reports files bumped by anyone since
+    the last call, which lets a process drop its own in-memory copies even
+    when it is not re-statting files (see PromptStore.trust_cache).
+
+    Entries are also stamped with the generation their writer read before
+    parsing, and only count while it is still current, so a slow reader can't
+    publish a copy that a concurrent write has already made stale.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Autocommit; writes open their own IMMEDIATE transactions.
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False, isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # WAL with synchronous=NORMAL stays consistent after a crash and this
+        # is a cache: losing the last few entries on power loss is harmless.
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        with self._write():
+            if version != _SCHEMA_VERSION:
+                for table in ("generations", "prompts", "exports"):
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        self._seen = self._current_generation()
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        # IMMEDIATE takes the write lock up front, so generation numbers read
+        # inside the transaction can't be handed out twice across processes.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _current_generation(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(gen), 0) FROM generations").fetchone()[0]
+
+    def generation(self, filename: str) -> int:
+        """Current generation of one file; read it before parsing the file."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT gen FROM generations WHERE filename = ?", (filename,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, filenames: Iterable[str]) -> None:
+        """Record that files changed and drop everything cached for them."""
+        filenames = list(filenames)
+        if not filenames:
+            return
+        with self._write():
+            gen = self._current_generation() + 1
+            for filename in filenames:
+                self._conn.execute(
+                    "INSERT INTO generations (filename, gen) VALUES (?, ?)"
+                    " ON CONFLICT(filename) DO UPDATE SET gen = excluded.gen",
+                    (filename, gen),
+                )
+                self._conn.execute("DELETE FROM prompts WHERE filename = ?", (filename,))
+                self._conn.execute("DELETE FROM exports WHERE filename = ?", (filename,))
+
+    def changed(self) -> set[str]:
+        """Files bumped by any process since the previous call."""
+        with self._lock:
+            # data_version only moves when another connection commits, and
+            # reading it costs no I/O, so the common case is one pragma.
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return set()
+            self._data_version = data_version
+            rows = self._conn.execute(
+                "SELECT filename, gen FROM generations WHERE gen > ?", (self._seen,)
+            ).fetchall()
+            if rows:
+                self._seen = max(gen for _, gen in rows)
+            return {filename for filename, _ in rows}
+
+    def get_prompt(self, filename: str, sig: Signature) -> Prompt | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT p.mtime_ns, p.size, p.inode, p.data FROM prompts p"
+                " LEFT JOIN generations g ON g.filename = p.filename"
+                " WHERE p.filename = ? AND p.gen = COALESCE(g.gen, 0)",
+                (filename,),
+            ).fetchone()
+        if row is None or tuple(row[:3]) != sig:
+            return None
+        return Prompt.model_validate_json(row[3])
+
+    def put_prompt(self, filename: str, sig: Signature, gen: int, prompt: Prompt) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompts (filename, mtime_ns, size, inode, gen, data)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, *sig, gen, prompt.model_dump_json()),
+            )
+
+    def get_export(self, filename: str, fmt: str, sig: Signature) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT e.mtime_ns, e.size, e.inode, e.output FROM exports e"
+                " LEFT JOIN generations g ON g.filename = e.filename"
+                " WHERE e.filename = ? AND e.fmt = ? AND e.gen = COALESCE(g.gen, 0)",
+                (filename, fmt),
+            ).fetchone()
+        if row is None or tuple(row[:3]) != sig:
+            return None
+        return row[3]
+
+    def put_export(self, filename: str, fmt: str, sig: Signature, gen: int, output: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exports (filename, fmt, mtime_ns, size, inode, gen, output)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (filename, fmt, *sig, gen, output),
+            )
+
+    def clear(self) -> None:
+        with self._write():
+            self._conn.execute("DELETE FROM prompts")
+            self._conn.execute("DELETE FROM exports")
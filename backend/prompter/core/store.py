@@ -1,21 +1,75 @@
 from __future__ import annotations
 
-import os
 import re
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
 
+import hashlib
 import json
 import shutil
+import sqlite3
+import sys
+import threading
 
-import frontmatter
+from .backends import DocumentStat, StorageBackend, open_backend
+from .cache import LRUCache
+from .fileio import KeyedLocks, fsync_policy
+from .graph import CycleError, DependencyGraph
+from .history import HISTORY_FILENAME, History, history_enabled
+from .index import INDEX_FILENAME, PromptIndex, Signature, file_signature
+from .metadata import parse_document
+from .metrics import timed
+from .models import (
+    BulkResult, Prompt, PromptCreate, PromptListItem, PromptUpdate, Revision, SearchHit, TemplateVariables,
+)
+from .query import ListingIndex
+from .shared import SHARED_CACHE_FILENAME, SharedCache
 
-from .models import Prompt, PromptCreate, PromptListItem, PromptUpdate
+if TYPE_CHECKING:
+    from jinja2 import Environment
 
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
 DATA_DIR = Path(__file__).parent.parent / "data"
 
 
+# Prefix of include/extends/import names that refer to bundled templates.
+TEMPLATE_PREFIX = "templates/"
+
+
+def _invalidate_template(key: str) -> None:
+    # Only a process that has rendered something has compiled templates or
+    # outputs to drop; avoid importing jinja2 just to find that out.
+    renderer = sys.modules.get(f"{__package__}.renderer")
+    if renderer is not None:
+        renderer.template_cache.invalidate(key)
+        renderer.output_cache.invalidate(key)
+
+
+def _references(content: str) -> list[str]:
+    """What content includes, extends or imports, as canonical names."""
+    from .renderer import template_references
+
+    return [_reference_name(name) for name in template_references(content)]
+
+
+def _reference_name(name: str) -> str:
+    # "Safety Preamble" and "safety-preamble" load the same file, so the
+    # dependency graph must know them by one name.
+    try:
+        if name.startswith(TEMPLATE_PREFIX):
+            return TEMPLATE_PREFIX + _sanitize_filename(name[len(TEMPLATE_PREFIX):])
+        return _sanitize_filename(name)
+    except ValueError:
+        return name
+
+
+def _analyze(content: str) -> TemplateVariables:
+    from .renderer import analyze_variables
+
+    return analyze_variables(content)
+
+
 def _sanitize_filename(name: str) -> str:
     safe = re.sub(r"[^\w\-]", "-", name.strip().lower())
     safe = re.sub(r"-+", "-", safe).strip("-")
@@ -25,11 +79,126 @@ def _sanitize_filename(name: str) -> str:
 
 
 class PromptStore:
-    def __init__(self, directory: str | Path) -> None:
+    def __init__(
+        self,
+        directory: str | Path,
+        index: bool = True,
+        cache_size: int = 0,
+        fsync: str | None = None,
+        shared: bool = False,
+        history: bool | None = None,
+        backend: str | StorageBackend | None = None,
+    ) -> None:
         self.directory = Path(directory).resolve()
+        # Writes replace files atomically; fsync (default: $PROMPTER_FSYNC or
+        # "off") decides whether they also survive power loss.
+        self.fsync = fsync_policy(fsync)
+        # Where prompts live (see core.backends); default: $PROMPTER_BACKEND
+        # or one markdown file per prompt. The index, shared cache, history
+        # and locks stay in the directory whichever backend holds the prompts.
+        if not isinstance(backend, StorageBackend):
+            backend = open_backend(backend, self.directory, self.fsync)
+        self.backend = backend
+        persistent = backend.persistent
+        self.locks = KeyedLocks(self.directory if persistent else None)
+        self._use_index = index and persistent
+        self._index_db: PromptIndex | None = None
+        self._lock = threading.Lock()
+        # Parsed prompts keyed by path, each tagged with the stat signature it
+        # was read from. Long-lived stores (the API) enable this.
+        self.cache: LRUCache[Path, tuple[Signature, Prompt]] = LRUCache(cache_size)
+        # Set while a watcher (see core.watcher) keeps the cache and index in
+        # step with the disk; lookups then skip the per-request stat.
+        self.trust_cache = False
+        self._synced = False
+        self._listing: tuple[tuple[int, int], ListingIndex] | None = None
+        # Cross-process tier for parsed prompts and exports (see core.shared);
+        # the API turns it on so uvicorn workers share their parsing work.
+        self._use_shared = shared and persistent
+        self._shared: SharedCache | None = None
+        # Every save is kept as a revision (see core.history); default:
+        # $PROMPTER_HISTORY or on.
+        self._use_history = history_enabled(history) and persistent
+        self._history_db: History | None = None
+        # Prompts referencing other prompts (see core.graph); used to drop
+        # the cached renders of everything that includes a changed prompt.
+        self.graph = DependencyGraph()
+        self._env: Environment | None = None
+        self._bundled: TemplateStore | None = None
 
     def init(self) -> None:
-        self.directory.mkdir(parents=True, exist_ok=True)
+        self.backend.init()
+
+    def _index(self) -> PromptIndex:
+        with self._lock:
+            if self._index_db is None:
+                path = self.directory / INDEX_FILENAME if self._use_index else None
+                self._index_db = PromptIndex(path)
+            return self._index_db
+
+    def _shared_cache(self) -> SharedCache | None:
+        if not self._use_shared:
+            return None
+        with self._lock:
+            if self._shared is None:
+                if not self.directory.exists():
+                    return None
+                try:
+                    self._shared = SharedCache(self.directory / SHARED_CACHE_FILENAME)
+                except sqlite3.Error:
+                    # Read-only directory and the like: per-process caching only.
+                    self._use_shared = False
+                    return None
+            return self._shared
+
+    def _history(self) -> History | None:
+        if not self._use_history:
+            return None
+        with self._lock:
+            if self._history_db is None:
+                if not self.directory.exists():
+                    return None
+                try:
+                    self._history_db = History(self.directory / HISTORY_FILENAME, self.fsync)
+                except sqlite3.Error:
+                    # Read-only directory: prompts still load, nothing is recorded.
+                    self._use_history = False
+                    return None
+            return self._history_db
+
+    def _record(self, entries: Iterable[tuple[str, str | None, str]]) -> None:
+        history = self._history()
+        if history is not None:
+            history.record(entries)
+
+    def _changed(self, paths: Iterable[Path]) -> None:
+        """Tell other processes sharing the cache that these files changed."""
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.bump(path.name for path in paths)
+
+    def _drop_changed_elsewhere(self, shared: SharedCache) -> None:
+        changed = shared.changed()
+        for name in changed:
+            self.cache.pop(self.directory / name)
+        self._invalidate(Path(name).stem for name in changed)
+
+    def _invalidate(self, ids: Iterable[str]) -> None:
+        """Drop compiled templates and cached outputs of prompts that changed
+        and of everything known to include, extend or import them."""
+        ids = set(ids)
+        if not ids:
+            return
+        for id_ in ids | self.graph.dependents(ids):
+            _invalidate_template(id_)
+        for id_ in ids:
+            self.graph.forget(id_)
+
+    def _index_put(self, path: Path, prompt: Prompt, template_vars: TemplateVariables | None = None) -> None:
+        self._index().put(path.name, self.backend.stat(path.stem).signature, prompt, template_vars)
+
+    def _index_remove(self, path: Path) -> None:
+        self._index().remove(path.name)
 
     def _path(self, id_: str) -> Path:
         safe = _sanitize_filename(id_)
@@ -38,26 +207,65 @@ class PromptStore:
             raise ValueError("Invalid prompt id")
         return path
 
+    @timed("load")
     def _load(self, path: Path) -> Prompt:
-        post = frontmatter.load(str(path))
-        meta = dict(post.metadata)
-        stem = path.stem
-        stat = path.stat()
+        shared = self._shared_cache()
+        if self.trust_cache:
+            if shared is not None:
+                # Writes by other workers reach us here rather than waiting
+                # for our own watcher to notice them.
+                self._drop_changed_elsewhere(shared)
+            cached = self.cache.get(path)
+            if cached is not None:
+                return cached[1].model_copy(deep=True)
+        stat = self.backend.stat(path.stem)
+        if self.cache.maxsize <= 0 and shared is None:
+            return self._parse(path, stat)
+        sig = stat.signature
+        cached = self.cache.get(path)
+        if cached is not None and cached[0] == sig:
+            return cached[1].model_copy(deep=True)
+        prompt = shared.get_prompt(path.name, sig) if shared is not None else None
+        if prompt is None:
+            gen = shared.generation(path.name) if shared is not None else 0
+            prompt = self._parse(path, stat)
+            if shared is not None:
+                shared.put_prompt(path.name, sig, gen, prompt)
+        if self.cache.maxsize > 0:
+            self.cache.put(path, (sig, prompt.model_copy(deep=True)))
+        return prompt
+
+    def _parse(self, path: Path, stat: DocumentStat, body: bool = True) -> Prompt:
+        """Read a prompt; with body False, only its frontmatter is read."""
+        if body:
+            meta, content = self.backend.read_document(path.stem)
+        else:
+            meta, content = self.backend.read_metadata(path.stem), ""
+        return self._build(
+            path.stem, meta, content,
+            datetime.fromtimestamp(stat.created, tz=timezone.utc),
+            datetime.fromtimestamp(stat.modified, tz=timezone.utc),
+        )
+
+    @staticmethod
+    def _build(stem: str, meta: dict, content: str, created: datetime, updated: datetime) -> Prompt:
         return Prompt(
             id=stem,
             name=meta.get("name", stem),
             description=meta.get("description", ""),
-            content=post.content,
+            content=content,
             tags=meta.get("tags", []),
             tool=meta.get("tool", "generic"),
             variables=meta.get("variables", []),
             category=meta.get("category", ""),
-            created_at=meta.get("created_at", datetime.fromtimestamp(stat.st_ctime, tz=timezone.utc)),
-            updated_at=meta.get("updated_at", datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)),
+            created_at=meta.get("created_at", created),
+            updated_at=meta.get("updated_at", updated),
         )
 
-    def _save(self, prompt: Prompt) -> Path:
-        path = self._path(prompt.id)
+    @staticmethod
+    def _serialize(prompt: Prompt) -> str:
+        import frontmatter
+
         meta = dict(
             name=prompt.name,
             description=prompt.description,
@@ -70,27 +278,194 @@ class PromptStore:
         if prompt.category:
             meta["category"] = prompt.category
         post = frontmatter.Post(prompt.content, **meta)
-        path.write_text(frontmatter.dumps(post) + "\n")
+        return frontmatter.dumps(post) + "\n"
+
+    @timed("save")
+    def _save(self, prompt: Prompt, action: str) -> Path:
+        path = self._path(prompt.id)
+        text = self._serialize(prompt)
+        self.backend.write(prompt.id, text)
+        self.cache.pop(path)
+        self._changed([path])
+        self._index_put(path, prompt, _analyze(prompt.content))
+        self._record([(prompt.id, text, action)])
+        self._invalidate([prompt.id])
+        self.graph.set(prompt.id, _references(prompt.content))
         return path
 
+    def _scan(self) -> dict[str, tuple[Path, Signature]]:
+        """One pass over the backend: filename -> (path, signature).
+
+        Whatever the backend, prompts are keyed by the path their markdown
+        file would have, so caches, the index and the watcher share one key.
+        """
+        return {
+            f"{id_}.md": (self.directory / f"{id_}.md", sig)
+            for id_, sig in self.backend.scan().items()
+        }
+
+    def _sync(self) -> PromptIndex | None:
+        """Bring the listing index up to date with the directory."""
+        if self.trust_cache and self._synced:
+            return self._index()
+        if not self.backend.initialized():
+            return None
+        index = self._index()
+        known = index.signatures()
+        found = self._scan()
+        stale = []
+        for name, (path, sig) in found.items():
+            if known.get(name) == sig:
+                continue
+            try:
+                # Without full-text search the index never needs the body.
+                stale.append((name, sig, self._parse(path, self.backend.stat(path.stem), body=index.fts)))
+            except FileNotFoundError:
+                continue
+        index.put_many(stale)
+        index.remove_many(known.keys() - found.keys())
+        self._synced = True
+        return index
+
+    def iter_prompts(self) -> Iterator[Prompt]:
+        """Every prompt in the store, in id order, read one at a time."""
+        if not self.backend.initialized():
+            return
+        for _, (path, _) in sorted(self._scan().items()):
+            try:
+                yield self._load(path)
+            except FileNotFoundError:
+                continue
+
     def list_prompts(self) -> list[PromptListItem]:
-        if not self.directory.exists():
+        index = self._sync()
+        if index is None:
+            return []
+        return index.items()
+
+    def iter_list_prompts(self, batch_size: int = 500) -> Iterator[PromptListItem]:
+        """list_prompts() as a generator that reads the index a batch at a
+        time, for callers that stream the listing out."""
+        index = self._sync()
+        if index is None:
+            return
+        yield from index.iter_items(batch_size)
+
+    def query(self, **filters) -> tuple[list[PromptListItem], int, str | None]:
+        """Filter and paginate the listing; see ListingIndex.query for filters.
+
+        The inverted indexes are rebuilt only when the listing has changed.
+        """
+        index = self._sync()
+        if index is None:
+            return [], 0, None
+        generation = index.generation()
+        with self._lock:
+            cached = self._listing
+        if cached is None or cached[0] != generation:
+            cached = (generation, ListingIndex(index.items()))
+            with self._lock:
+                self._listing = cached
+        return cached[1].query(**filters)
+
+    def search(self, query: str, limit: int = 20) -> list[SearchHit]:
+        """Full-text search over name, description, tags and content."""
+        index = self._sync()
+        if index is None:
             return []
-        items = []
-        for f in sorted(self.directory.glob("*.md")):
-            p = self._load(f)
-            items.append(PromptListItem(
-                id=p.id, name=p.name, description=p.description,
-                tags=p.tags, tool=p.tool, category=p.category,
-                updated_at=p.updated_at,
-            ))
-        return items
+        return index.search(query, limit)
+
+    def refresh(self, paths: Iterable[Path] | None = None) -> None:
+        """Re-read prompt files that changed on disk behind the store's back.
+
+        With no paths, drops every cached prompt and rescans the directory.
+        """
+        if paths is None:
+            self.cache.clear()
+            self.graph = DependencyGraph()
+            shared = self._shared_cache()
+            if shared is not None:
+                shared.clear()
+            self._synced = False
+            self._sync()
+            return
+        # If a file fails to parse, leave the index marked stale so the next
+        # listing rescans instead of trusting it.
+        synced, self._synced = self._synced, False
+        paths = list(paths)
+        self._changed(paths)
+        self._invalidate(path.stem for path in paths)
+        for path in paths:
+            self.cache.pop(path)
+            try:
+                stat = self.backend.stat(path.stem)
+                sig = stat.signature
+                # A file we wrote ourselves (seen again by the watcher) keeps
+                # the variable analysis stored with it.
+                index = self._index()
+                index.put(path.name, sig, self._parse(path, stat), index.template_vars(path.name, sig))
+            except FileNotFoundError:
+                self._index_remove(path)
+        self._record_external(paths)
+        self._synced = synced
+
+    def resync(self) -> None:
+        """Catch up with edits made while nothing was watching the directory.
+
+        Unlike refresh(), only this process's caches are touched: cached
+        prompts whose files changed are dropped and the index reparses just
+        those. The shared cache matches entries against file signatures, so
+        other workers' entries stay valid and are left alone.
+        """
+        self._synced = False
+        index = self._sync()
+        if index is None:
+            return
+        current = index.signatures()
+        stale = [path for path, (sig, _) in self.cache.items() if current.get(path.name) != sig]
+        for path in stale:
+            self.cache.pop(path)
+        self._invalidate(path.stem for path in stale)
+
+    def _record_external(self, paths: list[Path]) -> None:
+        # Edits made straight to the files become revisions too. Our own
+        # writes come back through here when a watcher is running; they
+        # match the latest revision and are skipped.
+        if self._history() is None:
+            return
+        entries = []
+        for path in paths:
+            try:
+                entries.append((path.stem, self.backend.read(path.stem), "edit"))
+            except FileNotFoundError:
+                entries.append((path.stem, None, "delete"))
+            except (OSError, UnicodeDecodeError):
+                continue
+        self._record(entries)
+
+    def signature(self, id_: str) -> Signature:
+        """Signature of a prompt's file (or backend row): cheap to get, and it
+        changes whenever the prompt is rewritten."""
+        try:
+            return self.backend.stat(self._path(id_).stem).signature
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt not found: {id_}") from None
+
+    def fingerprint(self) -> str:
+        """Digest of every prompt file's name and signature; changes when
+        any file is added, removed or rewritten."""
+        digest = hashlib.sha256()
+        if self.backend.initialized():
+            for name, (_, sig) in sorted(self._scan().items()):
+                digest.update(f"{name}\0{sig}\n".encode())
+        return digest.hexdigest()
 
     def get_prompt(self, id_: str) -> Prompt:
         path = self._path(id_)
-        if not path.exists():
-            raise FileNotFoundError(f"Prompt not found: {id_}")
-        return self._load(path)
+        try:
+            return self._load(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt not found: {id_}") from None
 
     def create_prompt(self, data: PromptCreate) -> Prompt:
         now = datetime.now(timezone.utc)
@@ -107,58 +482,326 @@ class PromptStore:
             updated_at=now,
         )
         path = self._path(prompt.id)
-        if path.exists():
-            raise FileExistsError(f"Prompt already exists: {prompt.id}")
-        self._save(prompt)
+        with self.locks.hold(prompt.id):
+            if self.backend.exists(path.stem):
+                raise FileExistsError(f"Prompt already exists: {prompt.id}")
+            self._check_cycle(prompt.id, prompt.content)
+            self._save(prompt, "create")
         return prompt
 
+    def bulk_create(
+        self,
+        prompts: Iterable[Prompt],
+        overwrite: bool = False,
+        batch_size: int = 500,
+    ) -> BulkResult:
+        """Write many prompts, keeping their ids and timestamps.
+
+        Existing prompts are reported as conflicts, or replaced with
+        overwrite. The index and shared cache are updated once per batch
+        rather than once per file, and a "full" fsync policy syncs the
+        directory once per batch too.
+        """
+        self.init()
+        result = BulkResult()
+        batch: list[Prompt] = []
+        for prompt in prompts:
+            batch.append(prompt)
+            if len(batch) >= batch_size:
+                self._write_batch(batch, overwrite, result)
+                batch = []
+        if batch:
+            self._write_batch(batch, overwrite, result)
+        return result
+
+    def _write_batch(self, batch: list[Prompt], overwrite: bool, result: BulkResult) -> None:
+        per_file = "file" if self.fsync == "full" else self.fsync
+        written: list[tuple[Path, Prompt]] = []
+        revisions: list[tuple[str, str, str]] = []
+        for prompt in batch:
+            try:
+                prompt.id = _sanitize_filename(prompt.id or prompt.name)
+                path = self._path(prompt.id)
+            except ValueError as e:
+                result.errors.append(f"{prompt.name!r}: {e}")
+                continue
+            with self.locks.hold(prompt.id):
+                exists = self.backend.exists(prompt.id)
+                if exists and not overwrite:
+                    result.conflicts.append(prompt.id)
+                    continue
+                try:
+                    self._check_cycle(prompt.id, prompt.content)
+                except CycleError as e:
+                    result.errors.append(f"{prompt.id!r}: {e}")
+                    continue
+                text = self._serialize(prompt)
+                self.backend.write(prompt.id, text, per_file)
+            (result.overwritten if exists else result.created).append(prompt.id)
+            revisions.append((prompt.id, text, "update" if exists else "create"))
+            written.append((path, prompt))
+        if not written:
+            return
+        self._invalidate(prompt.id for _, prompt in written)
+        for _, prompt in written:
+            self.graph.set(prompt.id, _references(prompt.content))
+        self.backend.sync()
+        for path, _ in written:
+            self.cache.pop(path)
+        self._changed(path for path, _ in written)
+        rows = []
+        for path, prompt in written:
+            try:
+                rows.append((path.name, self.backend.stat(prompt.id).signature, prompt))
+            except FileNotFoundError:
+                continue
+        # Variable analysis is left to first use (see template_variables):
+        # parsing every template would dominate the cost of a large import.
+        self._index().put_many(rows)
+        self._record(revisions)
+
     def update_prompt(self, id_: str, data: PromptUpdate) -> Prompt:
-        prompt = self.get_prompt(id_)
         updates = data.model_dump(exclude_none=True)
-        for k, v in updates.items():
-            setattr(prompt, k, v)
-        prompt.updated_at = datetime.now(timezone.utc)
-        if "name" in updates:
-            new_id = _sanitize_filename(updates["name"])
-            if new_id != id_:
-                old_path = self._path(id_)
-                prompt.id = new_id
-                self._save(prompt)
-                old_path.unlink()
+        id_ = _sanitize_filename(id_)
+        new_id = _sanitize_filename(updates["name"]) if "name" in updates else id_
+        # Hold both ids for a rename so no other writer can recreate either
+        # file midway; the read happens under the lock so concurrent updates
+        # apply in turn rather than overwriting each other.
+        with self.locks.hold(id_, new_id):
+            prompt = self.get_prompt(id_)
+            for k, v in updates.items():
+                setattr(prompt, k, v)
+            prompt.updated_at = datetime.now(timezone.utc)
+            self._check_cycle(new_id, prompt.content)
+            if new_id == id_:
+                self._save(prompt, "update")
                 return prompt
-        self._save(prompt)
-        return prompt
+            old_path = self._path(id_)
+            if self.backend.exists(new_id):
+                raise FileExistsError(f"Prompt already exists: {new_id}")
+            # Move first, then rewrite in place: a crash in between leaves a
+            # single file under the new name, never two copies.
+            self.backend.rename(id_, new_id)
+            self.cache.pop(old_path)
+            self._changed([old_path])
+            self._index_remove(old_path)
+            self._invalidate([id_])
+            history = self._history()
+            if history is not None:
+                history.rename(id_, new_id)
+            prompt.id = new_id
+            self._save(prompt, "rename")
+            return prompt
 
     def delete_prompt(self, id_: str) -> None:
         path = self._path(id_)
-        if not path.exists():
-            raise FileNotFoundError(f"Prompt not found: {id_}")
-        path.unlink()
+        with self.locks.hold(path.stem):
+            try:
+                self.backend.delete(path.stem)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Prompt not found: {id_}") from None
+            self.cache.pop(path)
+            self._changed([path])
+            self._index_remove(path)
+            self._record([(path.stem, None, "delete")])
+        self._invalidate([path.stem])
+
+    def template_variables(self, id_: str) -> TemplateVariables:
+        """Variables the prompt's template reads (see renderer.analyze_variables).
+
+        Saves store the analysis in the index; files changed outside the
+        store are analyzed on first request, then served from there.
+        """
+        path = self._path(id_)
+        try:
+            sig = self.backend.stat(path.stem).signature
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt not found: {id_}") from None
+        index = self._index()
+        analysis = index.template_vars(path.name, sig)
+        if analysis is None:
+            prompt = self.get_prompt(id_)
+            analysis = _analyze(prompt.content)
+            # Only keep it if the file is still the version that was read.
+            if self.backend.stat(path.stem).signature == sig:
+                index.put(path.name, sig, prompt, analysis)
+        return analysis
+
+    # -- Composition: {% include %}, {% extends %} and {% import %} --
+
+    def environment(self) -> Environment:
+        """Jinja environment whose templates can reference this store's
+        prompts by id and bundled templates as "templates/<id>"."""
+        with self._lock:
+            if self._env is None:
+                from .renderer import PromptLoader, prompt_environment
+
+                self._env = prompt_environment(PromptLoader(self))
+            return self._env
+
+    def fragment(self, name: str) -> tuple[str, Callable[[], bool]]:
+        """Template source for a referenced name, and a check that the file
+        it came from is unchanged."""
+        store, id_ = self, name
+        if name.startswith(TEMPLATE_PREFIX):
+            with self._lock:
+                if self._bundled is None:
+                    self._bundled = TemplateStore()
+            store, id_ = self._bundled._loader, name[len(TEMPLATE_PREFIX):]
+        path = store._path(id_)
+        sig = store.backend.stat(path.stem).signature
+        content = store._load(path).content
+
+        def uptodate() -> bool:
+            try:
+                return store.backend.stat(path.stem).signature == sig
+            except OSError:
+                return False
+
+        return content, uptodate
+
+    def _fragment_references(self, name: str) -> list[str]:
+        try:
+            content, _ = self.fragment(name)
+        except (FileNotFoundError, ValueError):
+            return []
+        refs = _references(content)
+        self.graph.set(name, refs)
+        return refs
+
+    def _check_cycle(self, id_: str, content: str) -> None:
+        """Refuse content that would make id_ reference itself, however
+        indirectly. References are read from the files, not the graph, so
+        edits made outside the store count too."""
+        refs = _references(content)
+        if refs:
+            path = DependencyGraph.find_cycle(id_, refs, self._fragment_references)
+            if path is not None:
+                raise CycleError(path)
+
+    def dependency_digest(self, prompt: Prompt) -> str:
+        """Digest of the current source of every template prompt reaches
+        through references, or "" if it has none. Part of the output cache
+        key, so renders are never served after a fragment changes."""
+        from .renderer import content_hash
+
+        refs = _references(prompt.content)
+        self.graph.set(prompt.id, refs)
+        if not refs:
+            return ""
+        parts = []
+        seen = {prompt.id}
+        stack = list(refs)
+        while stack:
+            name = stack.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            try:
+                content, _ = self.fragment(name)
+            except (FileNotFoundError, ValueError):
+                parts.append(f"{name}\0-")
+                continue
+            parts.append(f"{name}\0{content_hash(content)}")
+            name_refs = _references(content)
+            self.graph.set(name, name_refs)
+            stack.extend(name_refs)
+        return hashlib.sha256("\n".join(sorted(parts)).encode()).hexdigest()
+
+    def revisions(self, id_: str) -> list[Revision]:
+        """Saved revisions of a prompt, oldest first. Deleted prompts keep
+        their history."""
+        history = self._history()
+        revisions = history.revisions(_sanitize_filename(id_)) if history is not None else []
+        if not revisions:
+            raise FileNotFoundError(f"No history for prompt: {id_}")
+        return revisions
+
+    def revision_text(self, id_: str, rev: int) -> tuple[Revision, str]:
+        """A revision and the file text saved with it ("" for a deletion);
+        negative revs count back from the latest."""
+        history = self._history()
+        found = history.get(_sanitize_filename(id_), rev) if history is not None else None
+        if found is None:
+            raise FileNotFoundError(f"No revision {rev} of prompt: {id_}")
+        revision, text = found
+        return revision, text or ""
+
+    def get_revision(self, id_: str, rev: int) -> Prompt:
+        """The prompt as it was saved in revision rev."""
+        revision, text = self.revision_text(id_, rev)
+        if revision.hash is None:
+            raise FileNotFoundError(f"Revision {revision.rev} of {id_} is a deletion")
+        meta, content = parse_document(text)
+        return self._build(revision.id, meta, content, revision.saved_at, revision.saved_at)
+
+    def diff(self, id_: str, old: int = -2, new: int = -1) -> str:
+        """Unified diff between two revisions' file texts."""
+        import difflib
+
+        a, a_text = self.revision_text(id_, old)
+        b, b_text = self.revision_text(id_, new)
+        return "".join(difflib.unified_diff(
+            a_text.splitlines(keepends=True),
+            b_text.splitlines(keepends=True),
+            fromfile=f"{a.id}@{a.rev}",
+            tofile=f"{b.id}@{b.rev}",
+        ))
+
+    def export_prompt(self, id_: str, fmt: str) -> str:
+        """Export a prompt (see tools.exporters), reusing exports other
+        processes already produced when the shared cache is on."""
+        from ..tools.exporters import FORMATS, resolve_format
+
+        resolved = resolve_format(fmt, self.directory)
+        shared = self._shared_cache()
+        if shared is None:
+            return FORMATS[resolved](self.get_prompt(id_))
+        path = self._path(id_)
+        try:
+            sig = self.backend.stat(path.stem).signature
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Prompt not found: {id_}") from None
+        output = shared.get_export(path.name, resolved, sig)
+        if output is None:
+            gen = shared.generation(path.name)
+            output = FORMATS[resolved](self.get_prompt(id_))
+            shared.put_export(path.name, resolved, sig, gen, output)
+        return output
 
 
 class TemplateStore:
-    def __init__(self, directory: Path = TEMPLATES_DIR) -> None:
+    def __init__(
+        self,
+        directory: Path = TEMPLATES_DIR,
+        cache_size: int = 0,
+        backend: str | StorageBackend = "markdown",
+    ) -> None:
         self.directory = directory
-        self._loader = PromptStore(directory)
+        # Bundled templates may live in a read-only install; keep their index in memory.
+        self._loader = PromptStore(
+            directory, index=False, cache_size=cache_size, history=False, backend=backend,
+        )
 
     def list_templates(self) -> list[PromptListItem]:
-        if not self.directory.exists():
+        if not self._loader.backend.initialized():
             return []
-        items = []
-        for f in sorted(self.directory.glob("*.md")):
-            p = self._loader._load(f)
-            items.append(PromptListItem(
-                id=p.id, name=p.name, description=p.description,
-                tags=p.tags, tool=p.tool, category=p.category,
-                updated_at=p.updated_at,
-            ))
-        return items
+        return self._loader.list_prompts()
+
+    def fingerprint(self) -> str:
+        return self._loader.fingerprint()
+
+    def iter_templates(self) -> Iterator[PromptListItem]:
+        if not self._loader.backend.initialized():
+            return iter(())
+        return self._loader.iter_list_prompts()
 
     def get_template(self, id_: str) -> Prompt:
         path = self._loader._path(id_)
-        if not path.exists():
-            raise FileNotFoundError(f"Template not found: {id_}")
-        return self._loader._load(path)
+        try:
+            return self._loader._load(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Template not found: {id_}") from None
 
     def clone_template(self, template_id: str, new_name: str, target_store: PromptStore) -> Prompt:
         template = self.get_template(template_id)
@@ -175,6 +818,14 @@ class TemplateStore:
         return target_store.create_prompt(data)
 
 
+def data_file_signature(name: str) -> Signature | None:
+    """Stat signature of a bundled data file (hints.json, scaffolds.json)."""
+    try:
+        return file_signature((DATA_DIR / name).stat())
+    except FileNotFoundError:
+        return None
+
+
 def load_hints() -> list[dict]:
     path = DATA_DIR / "hints.json"
     if not path.exists():
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import Callable
+
+from ..tools.exporters import invalidate_config
+from .index import file_signature
+from .store import PromptStore
+
+log = logging.getLogger(__name__)
+
+_CONFIG_FILENAME = "providers.yaml"
+
+
+class PromptWatcher:
+    """Background thread that keeps a PromptStore's caches in step with the disk.
+
+    Uses inotify (via the optional ``watchfiles`` package) when available and
+    falls back to polling the directory. Changes are debounced, so a burst
+    such as a ``git checkout`` touching thousands of files is applied as one
+    refresh; bursts larger than ``bulk_threshold`` trigger a full rescan.
+    While running, the store trusts its cache and skips per-request stats.
+    on_change, if given, is called with each batch's changed paths once the
+    store has been refreshed, for batches touching prompts or providers.yaml.
+    """
+
+    def __init__(
+        self,
+        store: PromptStore,
+        debounce_ms: int = 500,
+        poll_interval: float = 2.0,
+        bulk_threshold: int = 256,
+        force_polling: bool = False,
+        on_change: Callable[[set[Path]], None] | None = None,
+    ) -> None:
+        self.store = store
+        self.debounce_ms = debounce_ms
+        self.poll_interval = poll_interval
+        self.bulk_threshold = bulk_threshold
+        self.force_polling = force_polling
+        self.on_change = on_change
+        self.batches = 0
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="prompter-watcher", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self) -> None:
+        self.store.trust_cache = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        try:
+            import watchfiles
+        except ImportError:
+            watchfiles = None
+        try:
+            if watchfiles is not None and not self.force_polling:
+                self._watch_events(watchfiles)
+            else:
+                self._watch_polling()
+        except Exception:
+            log.exception("Prompt watcher stopped; falling back to stat-validated caching")
+            self.store.trust_cache = False
+            self._ready.set()
+
+    def _begin(self) -> None:
+        # Anything that changed before the watch was established is caught by
+        # this rescan; from here on, events keep the cache current. It stays
+        # local: every worker starts a watcher, and a full refresh() would
+        # empty the shared cache once per worker.
+        try:
+            self.store.resync()
+        except Exception:
+            log.exception("Initial prompt rescan failed")
+        self.store.trust_cache = True
+        self._ready.set()
+
+    def _watch_events(self, watchfiles) -> None:
+        self.store.directory.mkdir(parents=True, exist_ok=True)
+        events = watchfiles.watch(
+            self.store.directory,
+            debounce=self.debounce_ms,
+            stop_event=self._stop,
+            recursive=False,
+            yield_on_timeout=True,
+            rust_timeout=1000,
+        )
+        for i, changes in enumerate(events):
+            if i == 0:
+                # The first (possibly empty) batch arrives once the watch is live.
+                self._begin()
+            if changes:
+                self.apply({Path(path) for _, path in changes})
+
+    def _snapshot(self) -> dict[str, tuple]:
+        if not self.store.directory.exists():
+            return {}
+        snap = {name: sig for name, (_, sig) in self.store._scan().items()}
+        try:
+            snap[_CONFIG_FILENAME] = file_signature((self.store.directory / _CONFIG_FILENAME).stat())
+        except FileNotFoundError:
+            pass
+        return snap
+
+    def _watch_polling(self) -> None:
+        previous = self._snapshot()
+        self._begin()
+        pending: set[str] = set()
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            changed = {
+                name for name in previous.keys() | current.keys()
+                if previous.get(name) != current.get(name)
+            }
+            previous = current
+            if changed:
+                # Still changing: keep collecting until a quiet round.
+                pending |= changed
+                continue
+            if pending:
+                self.apply({self.store.directory / name for name in pending})
+                pending = set()
+
+    def apply(self, changed: set[Path]) -> None:
+        """Refresh the store for one debounced batch of changed paths."""
+        self.batches += 1
+        directory = self.store.directory
+        config = any(p.name == _CONFIG_FILENAME for p in changed)
+        if config:
+            invalidate_config(directory)
+        prompts = {
+            p for p in changed
+            if p.suffix == ".md" and not p.name.startswith(".") and p.parent == directory
+        }
+        if prompts:
+            try:
+                if len(prompts) > self.bulk_threshold:
+                    self.store.refresh()
+                else:
+                    self.store.refresh(prompts)
+            except Exception:
+                log.exception("Failed to refresh %d changed prompt(s)", len(prompts))
+        if self.on_change is not None and (prompts or config):
+            try:
+                self.on_change(changed)
+            except Exception:
+                log.exception("Change callback failed")
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import stat
+import tempfile
+from pathlib import Path
+from typing import Any
+
+# The client half only uses the standard library, so forwarding stays cheap.
+# Protocol: one JSON request line per connection, one JSON reply line.
+_RECV_CHUNK = 64 * 1024
+
+
+class DaemonError(RuntimeError):
+    """The daemon ran the command and it failed."""
+
+
+def socket_path() -> Path:
+    configured = os.environ.get("PROMPTER_DAEMON_SOCKET")
+    if configured:
+        return Path(configured)
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / f"prompter-{uid}.sock"
+    # The temp directory is shared with every local user, so the socket goes
+    # in a private directory inside it (created 0700 by the daemon).
+    return Path(tempfile.gettempdir()) / f"prompter-{uid}" / "daemon.sock"
+
+
+def _owned(st: os.stat_result) -> bool:
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+
+def _private_dir(directory: Path) -> bool:
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and _owned(st) and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def is_trusted(path: Path) -> bool:
+    """Whether path is a socket this user's daemon could have made: owned by
+    us, in a directory nobody else can write to. Anything else may be another
+    local user's impostor serving forged output, so clients never talk to it."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and _owned(st) and _private_dir(path.parent)
+
+
+def _request(path: Path, payload: dict[str, Any], timeout: float = 30.0) -> dict[str, Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path))
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(_RECV_CHUNK)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b"\n"):
+                break
+    return json.loads(b"".join(chunks))
+
+
+def forward(command: str, **args: Any) -> str | None:
+    """Run command on the daemon if one is listening; None means run it locally."""
+    if not hasattr(socket, "AF_UNIX") or os.environ.get("PROMPTER_NO_DAEMON"):
+        return None
+    path = socket_path()
+    if not is_trusted(path):
+        return None
+    try:
+        reply = _request(path, {"command": command, "args": args})
+    except (OSError, ValueError):
+        # Stale socket or a daemon that died mid-request: fall back to local.
+        return None
+    if reply.get("ok"):
+        return reply["output"]
+    if reply.get("kind") == "not_found":
+        raise FileNotFoundError(reply["error"])
+    raise DaemonError(reply["error"])
+
+
+def is_running(path: Path | None = None) -> bool:
+    path = path or socket_path()
+    if not is_trusted(path):
+        return False
+    try:
+        return _request(path, {"command": "ping", "args": {}}, timeout=2.0).get("output") == "pong"
+    except (OSError, ValueError):
+        return False
+
+
+def stop(path: Path | None = None) -> bool:
+    path = path or socket_path()
+    if not is_trusted(path):
+        return False
+    try:
+        _request(path, {"command": "shutdown", "args": {}}, timeout=2.0)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+def make_server(path: Path, cache_size: int = 4096):
+    """Bind the daemon's socket; call serve_forever() on the result."""
+    import socketserver
+    import threading
+
+    from .core.renderer import output_cache, output_key, render_prompt
+    from .core.store import PromptStore
+    from .tools.exporters import FORMATS, resolve_format
+
+    stores: dict[tuple[str, str | None], PromptStore] = {}
+    stores_lock = threading.Lock()
+
+    def store_for(args: dict[str, Any]) -> PromptStore:
+        key = (args["directory"], args.get("backend"))
+        with stores_lock:
+            store = stores.get(key)
+            if store is None:
+                store = stores[key] = PromptStore(key[0], cache_size=cache_size, backend=key[1])
+            return store
+
+    def dispatch(command: str, args: dict[str, Any]) -> str:
+        if command == "ping":
+            return "pong"
+        if command == "shutdown":
+            return "bye"
+        if command == "render":
+            store = store_for(args)
+            prompt = store.get_prompt(args["name"])
+            variables = args.get("variables", {})
+            return output_cache.get_or_compute(
+                output_key(prompt.content, "render", variables, store.dependency_digest(prompt)),
+                lambda: render_prompt(prompt.content, variables, key=prompt.id, env=store.environment()),
+                tag=prompt.id,
+            )
+        if command == "export":
+            store = store_for(args)
+            prompt = store.get_prompt(args["name"])
+            resolved = resolve_format(args["fmt"], store.directory)
+            return output_cache.get_or_compute(
+                output_key(prompt.content, f"export:{resolved}"),
+                lambda: FORMATS[resolved](prompt),
+                tag=prompt.id,
+            )
+        raise ValueError(f"Unknown command: {command}")
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            command = None
+            try:
+                request = json.loads(self.rfile.readline())
+                command = request["command"]
+                reply = {"ok": True, "output": dispatch(command, request.get("args", {}))}
+            except FileNotFoundError as e:
+                reply = {"ok": False, "kind": "not_found", "error": str(e)}
+            except Exception as e:
+                reply = {"ok": False, "kind": type(e).__name__, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+            if command == "shutdown":
+                # Reply first: the process may exit as soon as serve_forever returns.
+                self.server.shutdown()
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def server_close(self) -> None:
+            super().server_close()
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not _private_dir(path.parent):
+        raise RuntimeError(f"{path.parent} must be a directory owned by you that no one else can write to")
+    if os.path.lexists(path):
+        if is_running(path):
+            raise RuntimeError(f"A prompter daemon is already listening on {path}")
+        path.unlink()
+    # Only the owner may talk to the daemon: it reads whatever directory it is
+    # asked to. The private parent directory already keeps others out while
+    # the socket briefly has the default mode.
+    server = Server(str(path), Handler)
+    try:
+        os.chmod(path, 0o600)
+    except OSError:
+        server.server_close()
+        raise
+    return server
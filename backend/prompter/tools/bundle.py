@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import re
+from collections import deque
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+
+import yaml
+
+from ..core.fileio import atomic_write
+from ..core.models import ExportResult, Prompt
+from ..core.store import PromptStore
+from .exporters import DEFAULT_FORMAT, FORMATS, load_config
+
+# Per output: its prompt, format, and hashes of input and output, so a re-export
+# skips what is unchanged and removes outputs of deleted prompts.
+MANIFEST_FILENAME = "manifest.json"
+# Prompt ids never contain dots, so this can't collide with a built prompt.
+BUILD_MANIFEST_FILENAME = ".prompter-build.json"
+MANIFEST_VERSION = 1
+
+EXTENSIONS = {"messages": ".json", "markdown": ".md", "text": ".txt"}
+
+ARCHIVES = {".zip": "zip", ".tar": "tar", ".tgz": "tar.gz", ".tar.gz": "tar.gz"}
+
+# Archive members get a fixed timestamp so unchanged libraries produce
+# byte-identical archives.
+_EPOCH = (1980, 1, 1, 0, 0, 0)
+_EPOCH_TS = 315532800
+
+_TARGET_NAME = re.compile(r"[a-z0-9_][a-z0-9_.-]*")
+
+# (id, signature) pairs handed to a worker at a time.
+_CHUNK = 256
+
+
+def resolve_targets(names: Iterable[str], directory: str | Path | None = None) -> dict[str, str]:
+    """Map each requested format or provider name to its format, reading
+    providers.yaml once. Names become directory names, so they are checked."""
+    providers = _providers(directory)
+    targets: dict[str, str] = {}
+    for name in names:
+        name = name.strip().lower()
+        if not name:
+            continue
+        if not _TARGET_NAME.fullmatch(name):
+            raise ValueError(f"Invalid format or provider name: {name!r}")
+        targets[name] = _tool_format(name, providers)
+    if not targets:
+        raise ValueError("No formats given")
+    return targets
+
+
+def archive_kind(path: str | Path) -> str | None:
+    """zip, tar or tar.gz for an archive file name; None for a directory."""
+    name = str(path).lower()
+    for suffix, kind in sorted(ARCHIVES.items(), key=lambda item: -len(item[0])):
+        if name.endswith(suffix):
+            return kind
+    return None
+
+
+def input_hash(prompt: Prompt | str, fmt: str) -> str:
+    """Hash of everything an export of prompt (or its JSON) in fmt is made from."""
+    source = prompt if isinstance(prompt, str) else prompt.model_dump_json()
+    return hashlib.sha256(f"{fmt}\0{source}".encode()).hexdigest()
+
+
+def read_manifest(root: Path, filename: str = MANIFEST_FILENAME) -> dict[str, dict]:
+    """Files recorded by the export in root, or {} if there is none."""
+    try:
+        data = json.loads((root / filename).read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("prompter_export") != MANIFEST_VERSION:
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def _manifest(targets: dict[str, str] | None, files: dict[str, dict]) -> str:
+    # One line per file keeps the manifest diffable; json.dumps with indent
+    # would be just as readable but falls back to the slow pure-Python encoder.
+    lines = ",\n".join(
+        f"  {json.dumps(path)}: {json.dumps(files[path], sort_keys=True)}" for path in sorted(files)
+    )
+    return (
+        f'{{"prompter_export": {MANIFEST_VERSION}, "targets": {json.dumps(targets, sort_keys=True)},'
+        f' "files": {{\n{lines}\n}}}}\n'
+    )
+
+
+def _relpath(target: str, id_: str, fmt: str) -> str:
+    return f"{target}/{id_}{EXTENSIONS.get(fmt, '.txt')}"
+
+
+def _providers(directory: str | Path | None) -> dict[str, str]:
+    try:
+        return load_config(directory)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid providers.yaml: {e}") from None
+
+
+def _tool_format(tool: str, providers: dict[str, str]) -> str:
+    # resolve_format() against a registry fetched once per export.
+    if tool in FORMATS:
+        return tool
+    return providers.get(tool.lower().strip(), DEFAULT_FORMAT)
+
+
+def _planned(
+    targets: dict[str, str] | None, providers: dict[str, str], id_: str, tool: str,
+) -> dict[str, str]:
+    """relpath -> format for every output of one prompt. Without targets,
+    that is one output in the format of the prompt's tool."""
+    if targets is None:
+        fmt = _tool_format(tool, providers)
+        return {f"{id_}{EXTENSIONS.get(fmt, '.txt')}": fmt}
+    return {_relpath(target, id_, fmt): fmt for target, fmt in targets.items()}
+
+
+def _write(path: Path, data: bytes) -> None:
+    """Replace path with data atomically. Leaner than fileio.atomic_write,
+    which matters over tens of thousands of files: the temp name needs no
+    random part (one process writes a given output) and modes aren't kept."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+# -- Exporting --
+
+_worker_stores: dict[tuple[str, str], PromptStore] = {}
+
+
+def _worker_store(directory: str, backend: str) -> PromptStore:
+    store = _worker_stores.get((directory, backend))
+    if store is None:
+        store = _worker_stores[(directory, backend)] = PromptStore(
+            directory, index=False, history=False, backend=backend,
+        )
+    return store
+
+
+def _export_chunk(
+    store: PromptStore | tuple[str, str],
+    targets: dict[str, str] | None,
+    providers: dict[str, str],
+    root: str | None,
+    chunk: list[tuple[str, list[int]]],
+    previous: dict[str, str],
+) -> tuple[list[tuple[str, dict, bool, bytes | None]], list[str]]:
+    """Export a chunk of prompts to every target.
+
+    With a root directory, outputs are written there (unless previous shows
+    the same input already produced them) and not returned; without one,
+    they are returned for the caller to archive. Runs in worker processes,
+    which get (directory, backend) instead of a store.
+    """
+    if isinstance(store, tuple):
+        store = _worker_store(*store)
+    rows: list[tuple[str, dict, bool, bytes | None]] = []
+    errors: list[str] = []
+    for id_, signature in chunk:
+        try:
+            prompt = store.get_prompt(id_)
+        except FileNotFoundError:
+            continue  # deleted since the scan
+        except (ValueError, yaml.YAMLError) as e:
+            # One malformed prompt is reported, not allowed to sink the rest.
+            errors.append(f"{id_}: {e}")
+            continue
+        source = prompt.model_dump_json()
+        outputs: dict[str, bytes] = {}
+        for relpath, fmt in _planned(targets, providers, id_, prompt.tool).items():
+            digest = input_hash(source, fmt)
+            if fmt not in outputs:
+                outputs[fmt] = FORMATS[fmt](prompt).encode()
+            data = outputs[fmt]
+            entry = {
+                "id": id_, "tool": prompt.tool, "format": fmt, "signature": signature,
+                "input": digest, "sha256": hashlib.sha256(data).hexdigest(),
+            }
+            if root is None:
+                rows.append((relpath, entry, True, data))
+                continue
+            path = Path(root) / relpath
+            if previous.get(relpath) == digest and path.exists():
+                rows.append((relpath, entry, False, None))
+                continue
+            _write(path, data)
+            rows.append((relpath, entry, True, None))
+    return rows, errors
+
+
+def _results(
+    store: PromptStore,
+    targets: dict[str, str] | None,
+    providers: dict[str, str],
+    root: Path | None,
+    todo: list[tuple[str, list[int]]],
+    previous: dict[str, dict[str, str]],
+    workers: int,
+) -> Iterator[tuple[list[tuple[str, dict, bool, bytes | None]], list[str]]]:
+    """Export todo in chunks, in order; previous maps ids to the input
+    hashes their files were last written from."""
+    chunks = [todo[i:i + _CHUNK] for i in range(0, len(todo), _CHUNK)]
+    root_arg = str(root) if root is not None else None
+
+    def previous_for(chunk):
+        found: dict[str, str] = {}
+        for id_, _ in chunk:
+            found.update(previous.get(id_, ()))
+        return found
+
+    # A memory backend only exists in this process.
+    if workers <= 1 or len(chunks) <= 1 or not store.backend.persistent:
+        for chunk in chunks:
+            yield _export_chunk(store, targets, providers, root_arg, chunk, previous_for(chunk))
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    spec = (str(store.directory), store.backend.kind)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for chunk in chunks:
+            pending.append(
+                pool.submit(_export_chunk, spec, targets, providers, root_arg, chunk, previous_for(chunk)),
+            )
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _sources(store: PromptStore) -> list[tuple[str, list[int]]]:
+    if not store.backend.initialized():
+        return []
+    return [(id_, list(sig)) for id_, sig in sorted(store.backend.scan().items())]
+
+
+def export_directory(
+    store: PromptStore,
+    targets: dict[str, str],
+    root: str | Path,
+    workers: int = 1,
+    force: bool = False,
+) -> ExportResult:
+    """Bring the export tree in root up to date with store (see module docstring)."""
+    return _sync_directory(store, targets, {}, Path(root), MANIFEST_FILENAME, workers, force)
+
+
+def build_directory(
+    store: PromptStore,
+    root: str | Path,
+    workers: int = 1,
+    force: bool = False,
+) -> ExportResult:
+    """Bring root up to date with one export per prompt, in the format of
+    its tool under the current providers.yaml."""
+    root = Path(root)
+    if root.resolve() == Path(store.directory).resolve():
+        # Markdown exports are named <id>.md, just like the prompts themselves.
+        raise ValueError(f"Refusing to build into the prompts directory {store.directory}")
+    providers = _providers(store.directory)
+    return _sync_directory(store, None, providers, root, BUILD_MANIFEST_FILENAME, workers, force)
+
+
+def _present(root: Path, targets: dict[str, str] | None) -> set[str]:
+    # One listing per directory instead of a stat per output.
+    dirs = [""] if targets is None else [f"{target}/" for target in targets]
+    found = set()
+    for prefix in dirs:
+        try:
+            found.update(prefix + name for name in os.listdir(root / prefix))
+        except FileNotFoundError:
+            pass
+    return found
+
+
+def _sync_directory(
+    store: PromptStore,
+    targets: dict[str, str] | None,
+    providers: dict[str, str],
+    root: Path,
+    manifest_name: str,
+    workers: int,
+    force: bool,
+) -> ExportResult:
+    root.mkdir(parents=True, exist_ok=True)
+    for target in targets or ():
+        (root / target).mkdir(exist_ok=True)
+    old = read_manifest(root, manifest_name)
+    by_id: dict[str, dict[str, dict]] = {}
+    for relpath, entry in old.items():
+        by_id.setdefault(entry.get("id"), {})[relpath] = entry
+    present = _present(root, targets)
+    result = ExportResult()
+    files: dict[str, dict] = {}
+    todo: list[tuple[str, list[int]]] = []
+    for id_, signature in _sources(store):
+        entries = by_id.get(id_)
+        if entries and not force:
+            tool = next(iter(entries.values())).get("tool", "")
+            if (
+                all(entry.get("signature") == signature for entry in entries.values())
+                and _planned(targets, providers, id_, tool)
+                == {relpath: entry.get("format") for relpath, entry in entries.items()}
+                and present.issuperset(entries)
+            ):
+                files.update(entries)
+                result.unchanged += len(entries)
+                continue
+        todo.append((id_, signature))
+    previous = {} if force else {
+        id_: {relpath: entry.get("input") for relpath, entry in entries.items()}
+        for id_, entries in by_id.items()
+    }
+    for rows, errors in _results(store, targets, providers, root, todo, previous, workers):
+        result.errors.extend(errors)
+        for relpath, entry, written, _ in rows:
+            files[relpath] = entry
+            if written:
+                result.written.append(relpath)
+            else:
+                result.unchanged += 1
+    for relpath in sorted(old.keys() - files.keys()):
+        # Only ever delete files inside root that an earlier export wrote.
+        if Path(relpath).is_absolute() or ".." in Path(relpath).parts:
+            continue
+        (root / relpath).unlink(missing_ok=True)
+        result.removed.append(relpath)
+    atomic_write(root / manifest_name, _manifest(targets, files))
+    return result
+
+
+class _ArchiveWriter:
+    def __init__(self, fileobj: IO[bytes], kind: str) -> None:
+        self.kind = kind
+        self._gzip = None
+        if kind == "zip":
+            import zipfile
+
+            self._zip = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED)
+            return
+        import tarfile
+
+        if kind == "tar.gz":
+            import gzip
+
+            fileobj = self._gzip = gzip.GzipFile(fileobj=fileobj, mode="wb", mtime=0)
+        self._tar = tarfile.open(fileobj=fileobj, mode="w", format=tarfile.PAX_FORMAT)
+
+    def add(self, name: str, data: bytes) -> None:
+        if self.kind == "zip":
+            import zipfile
+
+            info = zipfile.ZipInfo(name, date_time=_EPOCH)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self._zip.writestr(info, data)
+            return
+        import tarfile
+
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime, info.mode = len(data), _EPOCH_TS, 0o644
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        if self.kind == "zip":
+            self._zip.close()
+            return
+        self._tar.close()
+        if self._gzip is not None:
+            self._gzip.close()
+
+
+def export_archive(
+    store: PromptStore,
+    targets: dict[str, str],
+    fileobj: IO[bytes],
+    kind: str = "tar.gz",
+    workers: int = 1,
+) -> ExportResult:
+    """Write every prompt in every target format, plus the manifest, as one
+    zip, tar or tar.gz archive to fileobj. Members are streamed in as they
+    are exported; the archive is byte-identical for an unchanged library."""
+    if kind not in ARCHIVES.values():
+        raise ValueError(f"Unknown archive type {kind!r}; expected zip, tar or tar.gz")
+    result = ExportResult()
+    files: dict[str, dict] = {}
+    writer = _ArchiveWriter(fileobj, kind)
+    try:
+        for rows, errors in _results(store, targets, {}, None, _sources(store), {}, workers):
+            result.errors.extend(errors)
+            for relpath, entry, _, data in rows:
+                # Signatures are local to this library; consumers go by hashes.
+                files[relpath] = {k: v for k, v in entry.items() if k != "signature"}
+                writer.add(relpath, data)
+                result.written.append(relpath)
+        writer.add(MANIFEST_FILENAME, _manifest(targets, files).encode())
+    finally:
+        writer.close()
+    return result
@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 import json
+import threading
 from pathlib import Path
 from typing import Callable
 
-import yaml
-
+from ..core.metrics import timed
 from ..core.models import Prompt
 
 
@@ -100,15 +100,17 @@ providers:
 """
 
 
-def load_config(directory: str | Path | None) -> dict[str, str]:
-    """Load providers.yaml from the given directory and merge with built-ins.
-    User entries override built-in entries."""
+# Merged registries keyed by config path, with the (mtime, size) they were
+# parsed from. A changed file is reparsed on the next lookup, so edits still
+# take effect without a restart.
+_config_cache: dict[Path, tuple[tuple[int, int], dict[str, str]]] = {}
+_config_lock = threading.Lock()
+
+
+def _parse_config(config_path: Path) -> dict[str, str]:
+    import yaml
+
     merged = dict(BUILTIN_PROVIDERS)
-    if directory is None:
-        return merged
-    config_path = Path(directory) / _CONFIG_FILENAME
-    if not config_path.exists():
-        return merged
     with open(config_path) as f:
         data = yaml.safe_load(f)
     if not isinstance(data, dict):
@@ -121,6 +123,41 @@ def load_config(directory: str | Path | None) -> dict[str, str]:
     return merged
 
 
+def _registry(directory: str | Path | None) -> dict[str, str]:
+    """The merged registry for a directory. Shared between callers; never mutate it."""
+    if directory is None:
+        return BUILTIN_PROVIDERS
+    config_path = Path(directory).absolute() / _CONFIG_FILENAME
+    try:
+        st = config_path.stat()
+    except FileNotFoundError:
+        return BUILTIN_PROVIDERS
+    signature = (st.st_mtime_ns, st.st_size)
+    with _config_lock:
+        cached = _config_cache.get(config_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    merged = _parse_config(config_path)
+    with _config_lock:
+        _config_cache[config_path] = (signature, merged)
+    return merged
+
+
+def invalidate_config(directory: str | Path | None = None) -> None:
+    """Drop the cached registry for a directory, or for every directory."""
+    with _config_lock:
+        if directory is None:
+            _config_cache.clear()
+        else:
+            _config_cache.pop(Path(directory).absolute() / _CONFIG_FILENAME, None)
+
+
+def load_config(directory: str | Path | None) -> dict[str, str]:
+    """Load providers.yaml from the given directory and merge with built-ins.
+    User entries override built-in entries."""
+    return dict(_registry(directory))
+
+
 def init_config(directory: str | Path) -> Path:
     """Create a default providers.yaml if one doesn't exist. Returns the path."""
     config_path = Path(directory) / _CONFIG_FILENAME
@@ -133,25 +170,28 @@ def init_config(directory: str | Path) -> Path:
 # Public API
 # ---------------------------------------------------------------------------
 
+def resolve_format(fmt: str, directory: str | Path | None = None) -> str:
+    """Resolve a format or provider name to one of FORMATS, using the cached
+    registry for directory."""
+    if fmt in FORMATS:
+        return fmt
+    # Unknown provider → default to messages (OpenAI-compatible)
+    return _registry(directory).get(fmt.lower().strip(), DEFAULT_FORMAT)
+
+
 def get_format_for_provider(provider: str, directory: str | Path | None = None) -> str:
-    providers = load_config(directory)
+    providers = _registry(directory)
     return providers.get(provider.lower().strip(), DEFAULT_FORMAT)
 
 
 def list_providers(directory: str | Path | None = None) -> list[dict[str, str]]:
-    providers = load_config(directory)
+    providers = _registry(directory)
     return [{"provider": p, "format": f} for p, f in sorted(providers.items())]
 
 
+@timed("export")
 def export_prompt(prompt: Prompt, fmt: str, directory: str | Path | None = None) -> str:
     """Export a prompt using an explicit format name (messages, markdown, text)
     or a provider name (openai, groq, ollama, claude, etc.).
     Reads providers.yaml from directory if provided."""
-    if fmt in FORMATS:
-        return FORMATS[fmt](prompt)
-    providers = load_config(directory)
-    resolved = providers.get(fmt.lower().strip())
-    if resolved:
-        return FORMATS[resolved](prompt)
-    # Unknown provider → default to messages (OpenAI-compatible)
-    return FORMATS[DEFAULT_FORMAT](prompt)
+    return FORMATS[resolve_format(fmt, directory)](prompt)
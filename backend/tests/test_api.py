@@ -0,0 +1,421 @@
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from prompter import api
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    (tmp_path / "prompts").mkdir()
+    monkeypatch.setattr(api, "DEFAULT_DIR", str(tmp_path / "prompts"))
+    c = TestClient(api.app)
+    res = c.post("/prompts", json={
+        "name": "greet",
+        "content": "Hello {{name}}!",
+        "variables": ["name"],
+    })
+    assert res.status_code == 201
+    return c
+
+
+def test_render(client):
+    res = client.post("/prompts/greet/render", json={"variables": {"name": "World"}})
+    assert res.json() == {"rendered": "Hello World!"}
+
+
+def test_render_and_export_etags(client):
+    body = {"variables": {"name": "World"}}
+    res = client.post("/prompts/greet/render", json=body)
+    etag = res.headers["ETag"]
+    before = client.get("/stats").json()["outputs"]
+    res = client.post("/prompts/greet/render", json=body, headers={"If-None-Match": etag})
+    assert res.status_code == 304 and res.headers["ETag"] == etag
+    res = client.post("/prompts/greet/render", json={"variables": {"name": "Ada"}}, headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["ETag"] != etag
+    assert client.post("/prompts/greet/render", json=body).json() == {"rendered": "Hello World!"}
+    after = client.get("/stats").json()["outputs"]
+    assert after["not_modified"] == before["not_modified"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+    res = client.post("/prompts/greet/export", params={"fmt": "openai"})
+    assert json.loads(res.json()["exported"])[0]["role"] == "system"
+    etag = res.headers["ETag"]
+    # Providers resolving to the same format share an entry.
+    res = client.post("/prompts/greet/export", params={"fmt": "groq"}, headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    client.put("/prompts/greet", json={"content": "Hi {{name}}!"})
+    res = client.post("/prompts/greet/export", params={"fmt": "openai"}, headers={"If-None-Match": etag})
+    assert res.status_code == 200 and "Hi {{name}}!" in res.json()["exported"]
+
+
+def test_render_ignores_wildcard_if_none_match(client):
+    res = client.post("/prompts/greet/render", json={"variables": {}}, headers={"If-None-Match": "*"})
+    assert res.status_code == 400
+    res = client.post("/prompts/greet/render", json={"variables": {"name": "Ada"}}, headers={"If-None-Match": "*"})
+    assert res.status_code == 200 and res.json() == {"rendered": "Hello Ada!"}
+    assert client.get("/prompts/greet", headers={"If-None-Match": "*"}).status_code == 304
+
+
+def test_render_and_export_run_off_the_event_loop(client, monkeypatch):
+    threads = []
+
+    def render(content, variables, key=None, env=None):
+        threads.append(threading.current_thread().name)
+        return "rendered"
+
+    def export(id_, fmt):
+        threads.append(threading.current_thread().name)
+        return "exported"
+
+    monkeypatch.setattr(api, "render_prompt", render)
+    monkeypatch.setattr(api._store().store, "export_prompt", export)
+    api.output_cache.clear()
+    assert client.post("/prompts/greet/render", json={"variables": {"name": "Ada"}}).json() == {"rendered": "rendered"}
+    assert client.post("/prompts/greet/export", params={"fmt": "text"}).json()["exported"] == "exported"
+    assert len(threads) == 2 and all(name.startswith("prompter-io") for name in threads)
+
+
+def test_exports_are_shared_between_workers(client, monkeypatch):
+    from prompter.core.store import PromptStore
+    from prompter.tools import exporters
+
+    def fail(prompt):
+        pytest.fail("exported again")
+
+    other = PromptStore(api.DEFAULT_DIR, shared=True)
+    exported = other.export_prompt("greet", "openai")
+    api.output_cache.clear()
+    with monkeypatch.context() as m:
+        m.setitem(exporters.FORMATS, "messages", fail)
+        assert client.post("/prompts/greet/export", params={"fmt": "openai"}).json()["exported"] == exported
+
+    markdown = client.post("/prompts/greet/export", params={"fmt": "claude"}).json()["exported"]
+    monkeypatch.setitem(exporters.FORMATS, "markdown", fail)
+    assert other.export_prompt("greet", "claude") == markdown
+
+
+def test_render_rejects_missing_variables_before_rendering(client, monkeypatch):
+    client.put("/prompts/greet", json={"content": "{% if formal %}Dear {{title}} {% endif %}{{name}} {{ x | default('') }}"})
+    monkeypatch.setattr(api, "render_prompt", lambda *a, **k: pytest.fail("rendered"))
+    res = client.post("/prompts/greet/render", json={"variables": {}})
+    assert res.status_code == 400
+    assert res.json()["detail"] == "Missing variables: formal, name"
+
+
+def test_render_template_errors_are_400(client):
+    client.put("/prompts/greet", json={"content": "{{ a.b }}"})
+    assert client.post("/prompts/greet/render", json={"variables": {"a": "x"}}).status_code == 400
+
+
+def test_get_prompt_conditional(client, monkeypatch):
+    res = client.get("/prompts/greet")
+    etag, last_modified = res.headers["ETag"], res.headers["Last-Modified"]
+    assert res.headers["Cache-Control"] == "no-cache"
+    with monkeypatch.context() as m:
+        m.setattr(api._store().store, "get_prompt", lambda id_: pytest.fail("parsed"))
+        res = client.get("/prompts/greet", headers={"If-None-Match": etag})
+    assert res.status_code == 304 and res.headers["ETag"] == etag
+    assert client.get("/prompts/greet", headers={"If-Modified-Since": last_modified}).status_code == 304
+    client.put("/prompts/greet", json={"content": "changed"})
+    res = client.get("/prompts/greet", headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.headers["ETag"] != etag
+    assert client.get("/prompts/missing", headers={"If-None-Match": etag}).status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/templates", "/hints", "/scaffold/openai"])
+def test_read_endpoints_revalidate(client, path):
+    res = client.get(path)
+    assert res.status_code == 200 and "Cache-Control" in res.headers
+    res = client.get(path, headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_code == 304 and res.content == b""
+
+
+def test_static_data_differs_per_scaffold(client):
+    assert client.get("/scaffold/openai").headers["ETag"] != client.get("/scaffold/claude").headers["ETag"]
+    assert client.get("/hints").headers["Cache-Control"].startswith("public")
+
+
+def test_static_data_is_served_from_memory(client, monkeypatch):
+    hints = client.get("/hints").json()
+    scaffold = client.get("/scaffold/openai").json()
+    monkeypatch.setattr(api, "load_hints", lambda: pytest.fail("read hints.json again"))
+    monkeypatch.setattr(api, "load_scaffold", lambda provider: pytest.fail("read scaffolds.json again"))
+    assert client.get("/hints").json() == hints
+    assert client.get("/scaffold/openai").json() == scaffold
+
+
+def test_render_batch_streams_rows_and_errors(client):
+    body = "\n".join([
+        json.dumps({"name": "Ada"}),
+        "",
+        "not json",
+        json.dumps({}),
+        json.dumps({"name": "Bob"}),
+    ])
+    res = client.post(
+        "/prompts/greet/render/batch",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert [r["index"] for r in rows] == [0, 1, 2, 3]
+    assert rows[0]["rendered"] == "Hello Ada!"
+    assert "error" in rows[1]
+    assert rows[2]["error"] == "Missing variables: name"
+    assert rows[3]["rendered"] == "Hello Bob!"
+
+
+def test_render_batch_leaves_other_requests_served(client, monkeypatch):
+    gate, started = threading.Event(), threading.Event()
+    real = api.render_row
+
+    def slow_row(*args, **kwargs):
+        started.set()
+        gate.wait(10)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(api, "render_row", slow_row)
+    results = {}
+    # One client, so both requests share an event loop.
+    with TestClient(api.app) as c:
+        batch = threading.Thread(
+            target=lambda: results.update(batch=c.post("/prompts/greet/render/batch", content='{"name": "Ada"}\n')),
+        )
+        batch.start()
+        assert started.wait(5)
+        other = threading.Thread(target=lambda: results.update(other=c.get("/prompts/greet")))
+        other.start()
+        other.join(5)
+        served_during_batch = not other.is_alive()
+        gate.set()
+        batch.join(10)
+        other.join(10)
+    assert served_during_batch and results["other"].status_code == 200
+    assert json.loads(results["batch"].text) == {"index": 0, "rendered": "Hello Ada!"}
+
+
+def test_render_batch_reports_template_errors(client):
+    client.put("/prompts/greet", json={"content": "Hello {{ name "})
+    assert client.post("/prompts/greet/render", json={"variables": {"name": "Ada"}}).status_code == 400
+    assert client.post("/prompts/greet/render/batch", content='{"name": "Ada"}\n').status_code == 400
+
+    client.post("/prompts", json={"name": "footer", "content": "-- {{name}}"})
+    client.put("/prompts/greet", json={"content": 'Hello {{name}}! {% include "footer" %}'})
+    # A cycle the store never saw: the include is edited into the file directly.
+    footer = api._store().store.directory / "footer.md"
+    footer.write_text(footer.read_text().replace("-- {{name}}", '{% include "greet" %}'))
+    res = client.post("/prompts/greet/render/batch", content='{"name": "Ada"}\n{"name": "Bob"}\n')
+    assert res.status_code == 200
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert [row["error"] for row in rows] == ["Template references nest too deeply"] * 2
+
+
+def test_render_batch_not_found(client):
+    res = client.post("/prompts/missing/render/batch", content="{}")
+    assert res.status_code == 404
+
+
+def test_stats_reports_io_and_template_cache(client):
+    client.post("/prompts/greet/render", json={"variables": {"name": "World"}})
+    stats = client.get("/stats").json()
+    assert stats["io"]["completed"] >= 1
+    assert stats["io"]["running"] == 0
+    assert "hits" in stats["templates"]
+
+
+
+def test_metrics_and_server_timing(client):
+    res = client.post("/prompts/greet/render", json={"variables": {"name": "World"}})
+    stages = [part.split(";")[0] for part in res.headers["Server-Timing"].split(", ")]
+    assert stages == ["load", "render", "total"]
+    client.get("/prompts/missing")
+    res = client.get("/metrics")
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = res.text
+    assert 'prompter_http_requests_total{route="/prompts/{prompt_id}/render",method="POST",status="200"}' in text
+    assert 'prompter_http_requests_total{route="/prompts/{prompt_id}",method="GET",status="404"}' in text
+    assert 'prompter_stage_duration_seconds_count{stage="render"}' in text
+    assert 'prompter_cache_misses_total{cache="outputs"}' in text
+    assert "# TYPE prompter_http_request_duration_seconds histogram" in text
+
+
+def test_list_prompts_filters_and_paginates(client):
+    for name in ("a1", "a2", "b1"):
+        client.post("/prompts", json={"name": name, "tags": ["x"] if name != "b1" else []})
+    res = client.get("/prompts", params={"tag": "x", "limit": 1})
+    assert [p["id"] for p in res.json()] == ["a1"]
+    assert res.headers["X-Total-Count"] == "2"
+    res = client.get("/prompts", params={"tag": "x", "limit": 1, "cursor": res.headers["X-Next-Cursor"]})
+    assert [p["id"] for p in res.json()] == ["a2"]
+    assert "X-Next-Cursor" not in res.headers
+    assert client.get("/prompts", params={"cursor": "!!"}).status_code == 400
+
+
+def test_list_prompts_matches_partial_tags(client):
+    client.post("/prompts", json={"name": "reviewer", "tags": ["Code-Review"]})
+    client.post("/prompts", json={"name": "writer", "tags": ["writing"]})
+    # What the UI's "Filter by tag..." box sends as the user types.
+    assert [p["id"] for p in client.get("/prompts", params={"tag_contains": "rev"}).json()] == ["reviewer"]
+    assert client.get("/prompts", params={"tag": "rev"}).json() == []
+
+
+def test_search(client):
+    res = client.get("/search", params={"q": "hello"})
+    assert res.status_code == 200
+    assert [h["id"] for h in res.json()] == ["greet"]
+
+    # "search" is an ordinary prompt id again.
+    client.post("/prompts", json={"name": "Search", "content": "x"})
+    assert client.get("/prompts/search").json()["name"] == "Search"
+
+
+def test_rename_conflict(client):
+    client.post("/prompts", json={"name": "other", "content": "x"})
+    assert client.put("/prompts/greet", json={"name": "other"}).status_code == 409
+
+
+def test_archive_roundtrip(client, tmp_path, monkeypatch):
+    res = client.get("/archive")
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/gzip"
+    archive = res.content
+    (tmp_path / "other").mkdir()
+    monkeypatch.setattr(api, "DEFAULT_DIR", str(tmp_path / "other"))
+    res = client.post("/archive", content=archive)
+    assert res.json()["created"] == ["greet"]
+    assert client.get("/prompts/greet").json()["content"] == "Hello {{name}}!"
+    res = client.post("/archive", content=archive)
+    assert res.json()["conflicts"] == ["greet"]
+    assert client.post("/archive", content=b"nonsense").status_code == 400
+    client.post("/prompts", json={"name": "archive", "content": "x"})
+    assert client.get("/prompts/archive").json()["id"] == "archive"
+
+
+def test_archive_is_packed_on_the_io_pool(client, monkeypatch):
+    threads = []
+    store = api._store().store
+    real = store.iter_prompts
+
+    def iter_prompts():
+        for prompt in real():
+            threads.append(threading.current_thread().name)
+            yield prompt
+
+    monkeypatch.setattr(store, "iter_prompts", iter_prompts)
+    assert client.get("/archive").status_code == 200
+    assert threads and all(name.startswith("prompter-io") for name in threads)
+
+
+def test_list_streams_ndjson(client):
+    for i in range(3):
+        client.post("/prompts", json={"name": f"p{i}", "tags": ["x"] if i else []})
+    res = client.get("/prompts", headers={"Accept": "application/x-ndjson"})
+    assert res.headers["content-type"] == "application/x-ndjson"
+    ids = [json.loads(line)["id"] for line in res.text.splitlines()]
+    assert ids == ["greet", "p0", "p1", "p2"]
+    res = client.get("/prompts", params={"tag": "x", "limit": 1}, headers={"Accept": "application/x-ndjson"})
+    assert [json.loads(line)["id"] for line in res.text.splitlines()] == ["p1"]
+    assert res.headers["X-Total-Count"] == "2"
+    assert "X-Next-Cursor" in res.headers
+
+
+def test_ndjson_streams_are_read_on_the_io_pool(client, monkeypatch):
+    threads = []
+    store = api._store().store
+    real = store.iter_list_prompts
+
+    def iter_list_prompts():
+        for item in real():
+            threads.append(threading.current_thread().name)
+            yield item
+
+    monkeypatch.setattr(store, "iter_list_prompts", iter_list_prompts)
+    res = client.get("/prompts", headers={"Accept": "application/x-ndjson"})
+    assert [json.loads(line)["id"] for line in res.text.splitlines()] == ["greet"]
+    assert threads and all(name.startswith("prompter-io") for name in threads)
+
+
+def test_templates_stream_ndjson(client):
+    listed = client.get("/templates").json()
+    res = client.get("/templates", headers={"Accept": "application/x-ndjson"})
+    assert [json.loads(line)["id"] for line in res.text.splitlines()] == [t["id"] for t in listed]
+
+
+def test_revisions(client):
+    client.put("/prompts/greet", json={"content": "Hi {{name}}!"})
+    revisions = client.get("/prompts/greet/revisions").json()
+    assert [(r["rev"], r["action"]) for r in revisions] == [(1, "create"), (2, "update")]
+    assert client.get("/prompts/greet/revisions/1").json()["content"] == "Hello {{name}}!"
+    assert client.get("/prompts/greet/revisions/9").status_code == 404
+    assert client.get("/prompts/missing/revisions").status_code == 404
+
+
+def test_render_follows_included_prompts(client):
+    client.post("/prompts", json={"name": "footer", "content": "-- {{name}}"})
+    client.put("/prompts/greet", json={"content": 'Hello {{name}}! {% include "footer" %}'})
+    body = {"variables": {"name": "Ada"}}
+    res = client.post("/prompts/greet/render", json=body)
+    assert res.json() == {"rendered": "Hello Ada! -- Ada"}
+    etag = res.headers["ETag"]
+    client.put("/prompts/footer", json={"content": "Bye {{name}}"})
+    res = client.post("/prompts/greet/render", json=body, headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.json() == {"rendered": "Hello Ada! Bye Ada"}
+
+    res = client.put("/prompts/footer", json={"content": '{% include "greet" %}'})
+    assert res.status_code == 400
+    assert res.json()["detail"] == "Template cycle: footer -> greet -> footer"
+
+
+def test_included_prompts_are_read_on_the_io_pool(client, monkeypatch):
+    from prompter.core.store import PromptStore
+
+    client.post("/prompts", json={"name": "footer", "content": "-- {{name}}"})
+    client.put("/prompts/greet", json={"content": 'Hello {{name}}! {% include "footer" %}'})
+    threads = []
+    real = PromptStore.fragment
+
+    def fragment(self, name):
+        threads.append(threading.current_thread().name)
+        content, uptodate = real(self, name)
+
+        def checked():
+            threads.append(threading.current_thread().name)
+            return uptodate()
+
+        return content, checked
+
+    monkeypatch.setattr(PromptStore, "fragment", fragment)
+    api.output_cache.clear()
+    for name in ("Ada", "Bob"):
+        res = client.post("/prompts/greet/render", json={"variables": {"name": name}})
+        assert res.json() == {"rendered": f"Hello {name}! -- {name}"}
+    res = client.post("/prompts/greet/render/batch", content='{"name": "Cy"}\n')
+    assert json.loads(res.text)["rendered"] == "Hello Cy! -- Cy"
+    assert threads and all(name.startswith("prompter-io") for name in threads)
+
+
+def test_export_all_as_archive(client):
+    import io
+    import tarfile
+
+    res = client.post("/export", params={"fmt": "openai,claude"})
+    assert res.status_code == 200 and res.headers["X-Export-Files"] == "2"
+    with tarfile.open(fileobj=io.BytesIO(res.content)) as tar:
+        assert sorted(tar.getnames()) == ["claude/greet.md", "manifest.json", "openai/greet.json"]
+    etag = res.headers["ETag"]
+    assert client.post("/export", params={"fmt": "openai,claude"}, headers={"If-None-Match": etag}).status_code == 304
+    client.put("/prompts/greet", json={"content": "Hi"})
+    assert client.post("/export", params={"fmt": "openai,claude"}, headers={"If-None-Match": etag}).status_code == 200
+    assert client.post("/export", params={"archive": "rar"}).status_code == 400
+
+    # A prompt with broken frontmatter is counted as an error, not a 500.
+    with open(f"{api.DEFAULT_DIR}/broken.md", "w") as f:
+        f.write("---\nname: [unclosed\n---\nbody\n")
+    res = client.post("/export", params={"fmt": "openai"})
+    assert res.status_code == 200
+    assert res.headers["X-Export-Files"] == "1" and res.headers["X-Export-Errors"] == "1"
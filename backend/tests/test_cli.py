@@ -0,0 +1,193 @@
+import json
+import threading
+
+import pytest
+from typer.testing import CliRunner
+
+from prompter import cli, daemon
+from prompter.core.models import PromptCreate, PromptUpdate
+from prompter.core.store import PromptStore
+
+runner = CliRunner()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    s = PromptStore(tmp_path / "prompts")
+    s.init()
+    s.create_prompt(PromptCreate(name="greet", content="Hello {{name}}!"))
+    monkeypatch.setattr(cli, "DEFAULT_DIR", str(s.directory))
+    monkeypatch.setenv("PROMPTER_DAEMON_SOCKET", str(tmp_path / "d.sock"))
+    return s
+
+
+@pytest.fixture
+def warm(store, tmp_path):
+    server = daemon.make_server(tmp_path / "d.sock")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join(timeout=5)
+
+
+def test_render_input_file(store, tmp_path):
+    rows = tmp_path / "rows.jsonl"
+    rows.write_text('{"name": "Ada"}\n{"name": "Bob"}\n')
+    result = runner.invoke(cli.app, ["render", "greet", "--input", str(rows)])
+    assert result.exit_code == 0
+    out = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [r["rendered"] for r in out] == ["Hello Ada!", "Hello Bob!"]
+
+
+def test_render_input_reports_failures(store, tmp_path):
+    rows = tmp_path / "rows.jsonl"
+    rows.write_text('{}\n{"name": "Bob"}\n')
+    result = runner.invoke(cli.app, ["render", "greet", "--input", str(rows)])
+    assert result.exit_code == 1
+    out = [json.loads(line) for line in result.stdout.splitlines()]
+    assert "error" in out[0]
+    assert out[1]["rendered"] == "Hello Bob!"
+
+
+def test_render_and_export_forward_to_daemon(warm, store):
+    assert daemon.is_running()
+    assert daemon.forward("render", directory=str(store.directory), name="greet", variables={"name": "Ada"}) == "Hello Ada!"
+    result = runner.invoke(cli.app, ["render", "greet", "--var", "name=Ada"])
+    assert result.exit_code == 0
+    assert result.stdout.strip() == "Hello Ada!"
+    result = runner.invoke(cli.app, ["export", "greet", "--format", "text"])
+    assert result.exit_code == 0
+    assert "Hello {{name}}!" in result.stdout
+
+
+def test_daemon_errors(warm, store):
+    with pytest.raises(FileNotFoundError):
+        daemon.forward("render", directory=str(store.directory), name="missing", variables={})
+    result = runner.invoke(cli.app, ["render", "greet"])
+    assert result.exit_code == 1
+    assert "UndefinedError" in result.stdout
+
+
+def test_daemon_sees_edits(warm, store):
+    store.update_prompt("greet", PromptUpdate(content="Hi {{name}}."))
+    out = daemon.forward("render", directory=str(store.directory), name="greet", variables={"name": "Bob"})
+    assert out == "Hi Bob."
+
+
+def test_forward_falls_back_without_daemon(store, tmp_path):
+    assert daemon.forward("render", directory=str(store.directory), name="greet") is None
+    (tmp_path / "d.sock").touch()  # stale socket file
+    assert daemon.forward("render", directory=str(store.directory), name="greet") is None
+    result = runner.invoke(cli.app, ["render", "greet", "--var", "name=Ada"])
+    assert result.exit_code == 0
+    assert result.stdout.strip() == "Hello Ada!"
+
+
+def test_daemon_socket_must_be_private(warm, store, tmp_path, monkeypatch):
+    sock = tmp_path / "d.sock"
+    assert daemon.is_trusted(sock)
+    # A socket in a directory others can write to could have been swapped.
+    tmp_path.chmod(0o777)
+    try:
+        assert not daemon.is_running()
+        assert daemon.forward("render", directory=str(store.directory), name="greet", variables={}) is None
+        with pytest.raises(RuntimeError, match="no one else can write"):
+            daemon.make_server(tmp_path / "other.sock")
+    finally:
+        tmp_path.chmod(0o700)
+
+    monkeypatch.delenv("PROMPTER_DAEMON_SOCKET")
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(daemon.tempfile, "gettempdir", lambda: str(tmp_path / "shared"))
+    path = daemon.socket_path()
+    assert path.parent.parent == tmp_path / "shared" and path.parent.name.startswith("prompter-")
+    server = daemon.make_server(path)
+    try:
+        assert path.parent.stat().st_mode & 0o777 == 0o700
+        assert path.stat().st_mode & 0o777 == 0o600
+        assert daemon.is_trusted(path)
+    finally:
+        server.server_close()
+
+
+def test_pack_and_unpack(store, tmp_path, monkeypatch):
+    archive = tmp_path / "lib.jsonl.gz"
+    result = runner.invoke(cli.app, ["pack", str(archive)])
+    assert result.exit_code == 0
+    other = PromptStore(tmp_path / "other")
+    monkeypatch.setattr(cli, "DEFAULT_DIR", str(other.directory))
+    result = runner.invoke(cli.app, ["unpack", str(archive)])
+    assert result.exit_code == 0
+    assert "Created 1" in result.stdout
+    assert other.get_prompt("greet").content == "Hello {{name}}!"
+    result = runner.invoke(cli.app, ["unpack", str(archive)])
+    assert "skipped 1 existing" in result.stdout
+
+
+def test_migrate_between_backends(store, monkeypatch):
+    result = runner.invoke(cli.app, ["migrate", "sqlite", "--remove-source"])
+    assert result.exit_code == 0
+    assert "Copied 1 prompts from markdown to sqlite" in result.stdout
+    assert not list(store.directory.glob("*.md"))
+    monkeypatch.setenv("PROMPTER_BACKEND", "sqlite")
+    monkeypatch.setenv("PROMPTER_NO_DAEMON", "1")
+    result = runner.invoke(cli.app, ["render", "greet", "--var", "name=Ada"])
+    assert result.stdout.strip() == "Hello Ada!"
+    assert [r.action for r in PromptStore(store.directory, backend="sqlite").revisions("greet")] == ["create"]
+    assert runner.invoke(cli.app, ["migrate", "memory"]).exit_code == 1
+
+
+def test_export_all(store, tmp_path):
+    out = tmp_path / "dist"
+    result = runner.invoke(cli.app, ["export", "--all", "--format", "openai,claude", "--out", str(out)])
+    assert result.exit_code == 0
+    assert (out / "claude" / "greet.md").read_text() == "Hello {{name}}!"
+    assert "Wrote 2 files, 0 unchanged, 0 removed" in result.stderr
+    result = runner.invoke(cli.app, ["export", "--all", "--format", "openai,claude", "--out", str(out)])
+    assert "Wrote 0 files, 2 unchanged" in result.stderr
+    result = runner.invoke(cli.app, ["export", "--all", "--format", "text", "--out", str(tmp_path / "lib.zip")])
+    assert result.exit_code == 0 and (tmp_path / "lib.zip").exists()
+    assert runner.invoke(cli.app, ["export", "--all"]).exit_code == 1
+
+    (store.directory / "broken.md").write_text("---\nname: [unclosed\n---\nbody\n")
+    result = runner.invoke(cli.app, ["export", "--all", "--format", "openai", "--out", str(out)])
+    assert result.exit_code == 1
+    assert "Wrote 0 files, 1 unchanged, 1 removed" in result.stderr and "broken:" in result.stderr
+    result = runner.invoke(cli.app, ["build", "--out", str(tmp_path / "built"), "--workers", "1"])
+    assert result.exit_code == 1 and (tmp_path / "built" / "greet.txt").exists()
+
+
+
+def test_build(store, tmp_path):
+    store.create_prompt(PromptCreate(name="notes", content="Notes", tool="claude"))
+    out = tmp_path / "dist"
+    result = runner.invoke(cli.app, ["build", "--out", str(out), "--workers", "1"])
+    assert result.exit_code == 0
+    assert sorted(p.name for p in out.iterdir()) == [".prompter-build.json", "greet.txt", "notes.md"]
+    assert "Wrote 2 files, 0 unchanged, 0 removed" in result.stderr
+    store.delete_prompt("notes")
+    result = runner.invoke(cli.app, ["build", "--out", str(out)])
+    assert "Wrote 0 files, 1 unchanged, 1 removed" in result.stderr
+
+
+def test_build_refuses_the_prompts_directory(store):
+    store.create_prompt(PromptCreate(name="notes", content="Notes", tool="claude"))
+    before = (store.directory / "notes.md").read_text()
+    result = runner.invoke(cli.app, ["build", "--out", str(store.directory / ".." / store.directory.name)])
+    assert result.exit_code == 1
+    assert "Refusing to build into the prompts directory" in result.stdout
+    assert (store.directory / "notes.md").read_text() == before
+
+
+def test_history_and_diff(store):
+    store.update_prompt("greet", PromptUpdate(content="Hi {{name}}!"))
+    result = runner.invoke(cli.app, ["history", "greet"])
+    assert result.exit_code == 0
+    assert "create" in result.stdout and "update" in result.stdout
+    result = runner.invoke(cli.app, ["diff", "greet"])
+    assert "-Hello {{name}}!" in result.stdout and "+Hi {{name}}!" in result.stdout
+    result = runner.invoke(cli.app, ["show", "greet", "--rev", "1"])
+    assert "Hello {{name}}!" in result.stdout
+    assert runner.invoke(cli.app, ["history", "missing"]).exit_code == 1
@@ -1,14 +1,37 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
 import pytest
 
-from prompter.core.models import PromptCreate, PromptUpdate
-from prompter.core.renderer import render_prompt
+from prompter.core.models import Prompt, PromptCreate, PromptUpdate
+from prompter.core.renderer import (
+    OutputCache,
+    TemplateCache,
+    analyze_variables,
+    output_key,
+    render_batch,
+    render_batch_parallel,
+    render_prompt,
+    template_cache,
+)
+from prompter.core import metrics
+from prompter.core.aio import AsyncPromptStore, IOExecutor, StoreBusyError
+from prompter.core.backends import SQLITE_FILENAME, MarkdownBackend, SQLiteBackend, StorageBackend, migrate
+from prompter.core.index import INDEX_FILENAME
 from prompter.core.store import PromptStore
+from prompter.core.watcher import PromptWatcher
 from prompter.tools.exporters import (
     export_prompt,
     get_format_for_provider,
     init_config,
     list_providers,
     load_config,
+    resolve_format,
 )
 
 
@@ -67,12 +90,690 @@ def test_duplicate_create(store, sample_prompt):
         store.create_prompt(PromptCreate(name="test-prompt"))
 
 
+def test_list_builds_index(store, sample_prompt):
+    store.list_prompts()
+    assert (store.directory / INDEX_FILENAME).exists()
+    # A fresh store reads the persisted index instead of re-parsing.
+    assert [i.id for i in PromptStore(store.directory).list_prompts()] == ["test-prompt"]
+
+
+def test_list_picks_up_external_changes(store, sample_prompt):
+    store.list_prompts()
+    path = store.directory / "test-prompt.md"
+    path.write_text(path.read_text().replace("A test prompt", "Edited on disk"))
+    (store.directory / "other.md").write_text("---\nname: other\n---\nBody\n")
+    items = {i.id: i for i in store.list_prompts()}
+    assert items["test-prompt"].description == "Edited on disk"
+    assert "other" in items
+    (store.directory / "other.md").unlink()
+    assert [i.id for i in store.list_prompts()] == ["test-prompt"]
+
+
+def test_list_after_rename(store, sample_prompt):
+    store.list_prompts()
+    store.update_prompt("test-prompt", PromptUpdate(name="renamed"))
+    assert [i.id for i in store.list_prompts()] == ["renamed"]
+
+
+def test_cached_store_serves_parsed_prompts(tmp_path):
+    s = PromptStore(tmp_path / "cached", cache_size=8)
+    s.init()
+    s.create_prompt(PromptCreate(name="p", content="one"))
+    assert s.get_prompt("p").content == "one"
+    assert s.get_prompt("p").content == "one"
+    assert s.cache.info()["hits"] == 1
+    # Callers get copies, so mutating a result cannot poison the cache.
+    s.get_prompt("p").tags.append("mutated")
+    assert s.get_prompt("p").tags == []
+
+
+def test_cached_store_stays_coherent(tmp_path):
+    s = PromptStore(tmp_path / "cached", cache_size=8)
+    s.init()
+    s.create_prompt(PromptCreate(name="p", content="one"))
+    s.get_prompt("p")
+    s.update_prompt("p", PromptUpdate(content="two"))
+    assert s.get_prompt("p").content == "two"
+    path = s.directory / "p.md"
+    path.write_text(path.read_text().replace("two", "three, edited outside"))
+    assert s.get_prompt("p").content == "three, edited outside"
+    s.delete_prompt("p")
+    with pytest.raises(FileNotFoundError):
+        s.get_prompt("p")
+
+
+def test_rename_onto_existing_prompt_is_refused(store, sample_prompt):
+    store.create_prompt(PromptCreate(name="other", content="keep me"))
+    with pytest.raises(FileExistsError):
+        store.update_prompt("test-prompt", PromptUpdate(name="other"))
+    assert store.get_prompt("other").content == "keep me"
+    assert store.get_prompt("test-prompt").content.startswith("Hello")
+
+
+def test_writes_leave_no_temp_files(tmp_path):
+    s = PromptStore(tmp_path / "durable", fsync="full")
+    s.init()
+    s.create_prompt(PromptCreate(name="p", content="one"))
+    s.update_prompt("p", PromptUpdate(name="q", content="two"))
+    assert sorted(f.name for f in s.directory.glob("*.md")) == ["q.md"]
+    assert not list(s.directory.glob(".*.tmp"))
+    assert s.get_prompt("q").content == "two"
+
+
+def test_invalid_fsync_policy(tmp_path):
+    with pytest.raises(ValueError):
+        PromptStore(tmp_path, fsync="sometimes")
+
+
+def test_concurrent_updates_serialize(store, sample_prompt):
+    def worker(n):
+        for i in range(20):
+            store.update_prompt("test-prompt", PromptUpdate(description=f"{n}-{i}", content=f"body {n} {i} " * 50))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    p = store.get_prompt("test-prompt")
+    n, i = p.description.split("-")
+    assert p.content == (f"body {n} {i} " * 50).strip()
+
+
+def test_keyed_locks_exclude_each_other(tmp_path):
+    from prompter.core.fileio import KeyedLocks
+
+    locks = KeyedLocks(tmp_path)
+    counter = tmp_path / "counter"
+    counter.write_text("0")
+
+    def bump():
+        for _ in range(50):
+            with locks.hold("k"):
+                value = int(counter.read_text())
+                counter.write_text(str(value + 1))
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.read_text() == "200"
+
+
+def test_keyed_locks_create_their_directory_once(tmp_path, monkeypatch):
+    from pathlib import Path
+
+    from prompter.core.fileio import KeyedLocks
+
+    locks = KeyedLocks(tmp_path / "lib")
+    assert not (tmp_path / "lib").exists()
+    with locks.hold("a"):
+        pass
+    monkeypatch.setattr(Path, "mkdir", lambda *a, **k: pytest.fail("mkdir on every acquire"))
+    for key in ("b", "a"):
+        with locks.hold(key):
+            pass
+
+
+def test_atomic_write_leaves_umask_alone(tmp_path):
+    import importlib
+
+    from prompter.core import fileio
+
+    old = os.umask(0o027)
+    try:
+        importlib.reload(fileio)
+        assert os.umask(0o027) == 0o027
+        fileio.atomic_write(tmp_path / "new.txt", "x")
+        assert (tmp_path / "new.txt").stat().st_mode & 0o777 == 0o640
+        (tmp_path / "new.txt").chmod(0o600)
+        fileio.atomic_write(tmp_path / "new.txt", "y")
+        assert (tmp_path / "new.txt").stat().st_mode & 0o777 == 0o600
+    finally:
+        os.umask(old)
+    assert [p.name for p in tmp_path.iterdir()] == ["new.txt"]
+
+
 def test_custom_tool_name(store):
     store.create_prompt(PromptCreate(name="custom", tool="my-local-llm"))
     loaded = store.get_prompt("custom")
     assert loaded.tool == "my-local-llm"
 
 
+def test_iter_list_prompts_matches_list(store):
+    for i in range(7):
+        store.create_prompt(PromptCreate(name=f"p{i}"))
+    assert [i.id for i in store.iter_list_prompts(batch_size=3)] == [i.id for i in store.list_prompts()]
+
+
+# -- Frontmatter tests --
+
+@pytest.mark.parametrize("block", [
+    "name: a\ntags:\n- x\n- 'yes'\ntool: generic\nvariables: []\n",
+    "name: 'it''s: quoted'\ndescription: \"double\"\ncategory:\n",
+    "tags: [a, b c]\nname: http://example.com/x\n",
+    "description: a long plain value\n  that yaml.dump wrapped\nname: x\n",
+    "name: yes\ntags:\n  - 1\n  - 2024-01-01\n",
+    "name: a # comment\ndescription: |\n  literal\n",
+    "description: a\n\n  b\nextra:\n  nested: true\n",
+    "",
+])
+def test_metadata_matches_yaml(block):
+    import yaml
+
+    from prompter.core.metadata import load_metadata
+
+    expected = yaml.safe_load(block)
+    assert load_metadata(block) == (expected if isinstance(expected, dict) else {})
+
+
+def test_parse_document_matches_python_frontmatter():
+    import frontmatter
+
+    from prompter.core.metadata import parse_document
+
+    for text in (
+        "---\nname: a\n---\n\nBody\n---\nmore\n",
+        "No frontmatter here\n",
+        "---\nname: a\nnever closed\n",
+        "---\n---\nEmpty block\n",
+    ):
+        post = frontmatter.loads(text)
+        assert parse_document(text) == (dict(post.metadata), post.content)
+
+
+def test_read_metadata_stops_at_closing_fence(tmp_path):
+    from prompter.core.metadata import read_document, read_metadata
+
+    path = tmp_path / "p.md"
+    path.write_bytes(b"---\nname: a\ntags:\n- x\n---\n\xff\xfe not utf-8\n")
+    assert read_metadata(path) == {"name": "a", "tags": ["x"]}
+    with pytest.raises(UnicodeDecodeError):
+        read_document(path)
+
+
+def test_saved_prompts_read_back_identically(store):
+    created = store.create_prompt(PromptCreate(
+        name="Long: one",
+        description="A description long enough that the YAML emitter wraps it across more than one line",
+        tags=["yes", "1", "a b"],
+        content="Body",
+    ))
+    assert store.get_prompt(created.id) == created
+
+
+# -- Query tests --
+
+@pytest.fixture
+def library(store):
+    for name, tags, tool, category in [
+        ("alpha", ["code", "review"], "claude", "code"),
+        ("beta", ["code"], "openai", "code"),
+        ("gamma", ["writing"], "claude", "content"),
+        ("alphabet", [], "generic", ""),
+    ]:
+        store.create_prompt(PromptCreate(
+            name=name, description=f"{name} prompt", tags=tags, tool=tool, category=category,
+        ))
+    return store
+
+
+def test_query_filters(library):
+    def ids(**filters):
+        return [i.id for i in library.query(**filters)[0]]
+
+    assert ids() == ["alpha", "alphabet", "beta", "gamma"]
+    assert ids(tag="CODE") == ["alpha", "beta"]
+    assert ids(tag="code", tool="claude") == ["alpha"]
+    assert ids(category="content") == ["gamma"]
+    assert ids(prefix="alp") == ["alpha", "alphabet"]
+    assert ids(q="BET") == ["alphabet", "beta"]
+    assert ids(tag="missing") == []
+    # Partial tags only match with tag_contains.
+    assert ids(tag="rev") == []
+    assert ids(tag_contains="REV") == ["alpha"]
+    assert ids(tag_contains="i", tool="claude") == ["alpha", "gamma"]
+
+
+def test_query_pagination(library):
+    page, total, cursor = library.query(limit=3)
+    assert [i.id for i in page] == ["alpha", "alphabet", "beta"]
+    assert total == 4
+    page, total, cursor = library.query(limit=3, cursor=cursor)
+    assert [i.id for i in page] == ["gamma"]
+    assert cursor is None
+
+
+def test_query_sees_new_prompts(library):
+    assert library.query(tag="new")[1] == 0
+    library.create_prompt(PromptCreate(name="delta", tags=["new"]))
+    assert [i.id for i in library.query(tag="new")[0]] == ["delta"]
+
+
+# -- Search tests --
+
+def test_search_ranks_and_snippets(store):
+    store.create_prompt(PromptCreate(name="sql-helper", description="Writes queries",
+                                     content="Optimize the PostgreSQL query plan."))
+    store.create_prompt(PromptCreate(name="postgres-tuning", tags=["postgresql"],
+                                     content="General database advice."))
+    store.create_prompt(PromptCreate(name="unrelated", content="Nothing to see."))
+    hits = store.search("postgresql")
+    assert {h.id for h in hits} == {"sql-helper", "postgres-tuning"}
+    snippet = next(h.snippet for h in hits if h.id == "sql-helper")
+    assert "[PostgreSQL]" in snippet
+    # The last word matches as a prefix.
+    assert [h.id for h in store.search("optim")] == ["sql-helper"]
+    assert store.search("   ") == []
+
+
+def test_search_follows_writes(store, sample_prompt):
+    assert [h.id for h in store.search("welcome")] == ["test-prompt"]
+    store.update_prompt("test-prompt", PromptUpdate(content="Goodbye {{name}}"))
+    assert store.search("welcome") == []
+    assert [h.id for h in store.search("goodbye")] == ["test-prompt"]
+    store.delete_prompt("test-prompt")
+    assert store.search("goodbye") == []
+
+
+# -- Async store tests --
+
+def test_async_store_runs_on_io_executor(store, sample_prompt):
+    io = IOExecutor(max_workers=2)
+    astore = AsyncPromptStore(store, io)
+
+    async def main():
+        items = await astore.list_prompts()
+        prompt = await astore.get_prompt("test-prompt")
+        return items, prompt
+
+    items, prompt = asyncio.run(main())
+    io.shutdown()
+    assert [i.id for i in items] == ["test-prompt"]
+    assert prompt.name == "test-prompt"
+    stats = io.stats()
+    assert stats["completed"] == 2
+    assert stats["queued"] == 0
+    assert stats["running"] == 0
+
+
+def test_io_executor_rejects_when_queue_full():
+    io = IOExecutor(max_workers=1, max_queue=1)
+    gate = threading.Event()
+
+    async def main():
+        blocker = asyncio.ensure_future(io.run(gate.wait))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(io.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(StoreBusyError):
+            await io.run(lambda: "rejected")
+        gate.set()
+        return await blocker, await queued
+
+    assert asyncio.run(main()) == (True, "queued")
+    io.shutdown()
+    assert io.stats()["rejected"] == 1
+
+
+def test_io_executor_counts_a_cancelled_call_once():
+    io = IOExecutor(max_workers=1)
+    cancelled = threading.Event()
+    real = io._dequeue
+
+    def dequeue(flag):
+        if threading.current_thread().name.startswith("prompter-io"):
+            cancelled.wait(5)  # the worker has the call but hasn't counted it yet
+        real(flag)
+
+    io._dequeue = dequeue
+
+    async def main():
+        task = asyncio.ensure_future(io.run(lambda: None))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        cancelled.set()
+
+    asyncio.run(main())
+    assert _wait_for(lambda: io.stats()["completed"] == 1)
+    io.shutdown()
+    assert io.stats()["queued"] == 0
+
+
+# -- Shared cache tests --
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two stores on one directory, standing in for two uvicorn workers."""
+    directory = tmp_path / "shared"
+    a = PromptStore(directory, cache_size=8, shared=True)
+    a.init()
+    a.create_prompt(PromptCreate(name="p", content="one"))
+    return a, PromptStore(directory, cache_size=8, shared=True)
+
+
+def _no_parse(*args):
+    raise AssertionError("parsed a prompt the shared cache should have served")
+
+
+def test_shared_cache_skips_reparsing(workers):
+    a, b = workers
+    assert a.get_prompt("p").content == "one"
+    b._parse = _no_parse
+    assert b.get_prompt("p").content == "one"
+
+
+def test_shared_cache_write_invalidates_other_workers(workers):
+    a, b = workers
+    b.trust_cache = True
+    assert b.get_prompt("p").content == "one"
+    a.update_prompt("p", PromptUpdate(content="two"))
+    assert b.get_prompt("p").content == "two"
+    a.delete_prompt("p")
+    with pytest.raises(FileNotFoundError):
+        b.get_prompt("p")
+
+
+def test_shared_cache_serves_exports(workers):
+    a, b = workers
+    first = a.export_prompt("p", "openai")
+    b.get_prompt = _no_parse
+    assert b.export_prompt("p", "openai") == first
+    del b.get_prompt
+    a.update_prompt("p", PromptUpdate(content="two"))
+    assert "two" in b.export_prompt("p", "openai")
+
+
+def test_shared_cache_rejects_stale_entries(tmp_path):
+    from prompter.core.shared import SharedCache
+
+    cache = SharedCache(tmp_path / "cache.db")
+    sig = (1, 2, 3)
+    prompt = PromptStore(tmp_path).create_prompt(PromptCreate(name="x", content="old"))
+    gen = cache.generation("x.md")
+    cache.bump(["x.md"])  # a write lands while the reader is still parsing
+    cache.put_prompt("x.md", sig, gen, prompt)
+    assert cache.get_prompt("x.md", sig) is None
+    cache.put_prompt("x.md", sig, cache.generation("x.md"), prompt)
+    assert cache.get_prompt("x.md", sig).content == "old"
+    assert cache.get_prompt("x.md", (9, 9, 9)) is None
+
+
+# -- Archive tests --
+
+@pytest.mark.parametrize("compression", ["gzip", "none"])
+def test_pack_unpack_roundtrip(store, sample_prompt, tmp_path, compression):
+    import io
+
+    from prompter.core.archive import pack, unpack
+
+    store.create_prompt(PromptCreate(name="second", content="Two", tags=["b"]))
+    buf = io.BytesIO()
+    assert pack(store, buf, compression) == 2
+    target = PromptStore(tmp_path / "target")
+    buf.seek(0)
+    result = unpack(target, buf)
+    assert sorted(result.created) == ["second", "test-prompt"]
+    copied = target.get_prompt("test-prompt")
+    assert copied.content == sample_prompt.content
+    assert copied.created_at == sample_prompt.created_at
+    assert [i.id for i in target.list_prompts()] == ["second", "test-prompt"]
+
+
+def test_unpack_reports_conflicts_and_errors(store, sample_prompt):
+    import io
+
+    from prompter.core.archive import unpack
+
+    lines = [
+        json.dumps({"prompter_pack": 1}),
+        json.dumps({"id": "test-prompt", "name": "test-prompt", "content": "replaced"}),
+        json.dumps({"name": "fresh", "content": "new"}),
+        "{not json",
+    ]
+    body = ("\n".join(lines) + "\n").encode()
+    result = unpack(store, io.BytesIO(body))
+    assert result.created == ["fresh"]
+    assert result.conflicts == ["test-prompt"]
+    assert len(result.errors) == 1 and result.errors[0].startswith("line 4")
+    assert store.get_prompt("test-prompt").content.startswith("Hello")
+    result = unpack(store, io.BytesIO(body), overwrite=True)
+    assert sorted(result.overwritten) == ["fresh", "test-prompt"]
+    assert store.get_prompt("test-prompt").content == "replaced"
+
+
+def test_unpack_rejects_foreign_files(store):
+    import io
+
+    from prompter.core.archive import unpack
+
+    with pytest.raises(ValueError):
+        unpack(store, io.BytesIO(b'{"hello": 1}\n'))
+
+
+# -- History tests --
+
+def test_every_save_is_a_revision(store, sample_prompt):
+    store.update_prompt("test-prompt", PromptUpdate(content="v2"))
+    store.update_prompt("test-prompt", PromptUpdate(name="renamed"))
+    store.delete_prompt("renamed")
+    revisions = store.revisions("renamed")
+    assert [(r.rev, r.action) for r in revisions] == [
+        (1, "create"), (2, "update"), (3, "rename"), (4, "delete"),
+    ]
+    assert revisions[-1].hash is None
+    assert store.get_revision("renamed", 1).content == sample_prompt.content
+    assert store.get_revision("renamed", -2).name == "renamed"
+    with pytest.raises(FileNotFoundError):
+        store.get_revision("renamed", 4)
+    with pytest.raises(FileNotFoundError):
+        store.revisions("test-prompt")
+
+
+def test_history_stores_each_content_once(store):
+    import sqlite3
+
+    from prompter.core.history import HISTORY_FILENAME
+
+    p = store.create_prompt(PromptCreate(name="p", content="same"))
+    store.delete_prompt("p")
+    store.bulk_create([p], overwrite=True)  # identical file text again
+    assert [r.action for r in store.revisions("p")] == ["create", "delete", "create"]
+    db = sqlite3.connect(store.directory / HISTORY_FILENAME)
+    assert db.execute("SELECT COUNT(*) FROM objects").fetchone()[0] == 1
+
+
+def test_history_records_external_edits_once(store, sample_prompt):
+    path = store.directory / "test-prompt.md"
+    path.write_text(path.read_text().replace("Hello", "Hi"))
+    store.refresh([path])
+    store.refresh([path])  # e.g. a watcher reporting the same edit twice
+    assert [r.action for r in store.revisions("test-prompt")] == ["create", "edit"]
+    diff = store.diff("test-prompt")
+    assert "-Hello {{name}}" in diff and "+Hi {{name}}" in diff
+
+
+def test_history_can_be_disabled(tmp_path):
+    s = PromptStore(tmp_path / "p", history=False)
+    s.init()
+    s.create_prompt(PromptCreate(name="p"))
+    with pytest.raises(FileNotFoundError):
+        s.revisions("p")
+    assert not any(f.name.startswith(".prompter-history") for f in s.directory.iterdir())
+
+
+# -- Storage backend tests --
+
+def test_incomplete_backend_fails_on_construction():
+    class ReadOnly(StorageBackend):
+        kind = "read-only"
+
+        def initialized(self):
+            return True
+
+    with pytest.raises(TypeError, match="abstract"):
+        ReadOnly()
+
+
+@pytest.mark.parametrize("backend", ["markdown", "sqlite", "memory"])
+def test_store_works_on_every_backend(tmp_path, backend):
+    s = PromptStore(tmp_path / "prompts", cache_size=8, backend=backend)
+    s.init()
+    s.create_prompt(PromptCreate(name="alpha", content="Hi {{name}}", tags=["x"], tool="openai"))
+    s.create_prompt(PromptCreate(name="beta", content="About rockets", category="space"))
+    assert [p.id for p in s.list_prompts()] == ["alpha", "beta"]
+    assert [h.id for h in s.search("rockets")] == ["beta"]
+    assert s.query(tool="openai")[0][0].id == "alpha"
+    sig = s.signature("alpha")
+    s.update_prompt("alpha", PromptUpdate(content="Hello {{name}}"))
+    assert s.signature("alpha") != sig
+    assert s.get_prompt("alpha").content == "Hello {{name}}"
+    s.update_prompt("alpha", PromptUpdate(name="gamma"))
+    with pytest.raises(FileNotFoundError):
+        s.get_prompt("alpha")
+    assert s.get_prompt("gamma").content == "Hello {{name}}"
+    s.delete_prompt("beta")
+    assert [p.id for p in s.list_prompts()] == ["gamma"]
+    result = s.bulk_create([Prompt(id="delta", name="delta", content="d")])
+    assert result.created == ["delta"]
+    assert render_prompt('{% include "delta" %}!', {}, env=s.environment()) == "d!"
+
+
+def test_sqlite_backend_is_shared_between_stores(tmp_path):
+    a = PromptStore(tmp_path / "prompts", backend="sqlite")
+    b = PromptStore(tmp_path / "prompts", backend="sqlite", cache_size=8)
+    a.create_prompt(PromptCreate(name="p", content="one", tags=["t1", "t2"]))
+    assert b.get_prompt("p").content == "one"
+    a.update_prompt("p", PromptUpdate(content="two"))
+    assert b.get_prompt("p").content == "two"
+    assert not list(a.directory.glob("*.md"))
+    conn = sqlite3.connect(a.directory / SQLITE_FILENAME)
+    assert conn.execute("SELECT tag FROM prompt_tags WHERE id = 'p' ORDER BY tag").fetchall() == [("t1",), ("t2",)]
+    assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert [p.id for p in b.list_prompts()] == ["p"]
+    assert [r.action for r in b.revisions("p")] == ["create", "update"]
+
+
+def test_migrate_is_lossless(tmp_path):
+    directory = tmp_path / "prompts"
+    files = PromptStore(directory)
+    files.init()
+    files.create_prompt(PromptCreate(name="a", content="Hello {{name}}", tags=["x"]))
+    (directory / "hand-written.md").write_text("No frontmatter at all\n")
+    source, target = MarkdownBackend(directory), SQLiteBackend(directory)
+    copied, skipped = migrate(source, target)
+    assert (copied, skipped) == (["a", "hand-written"], [])
+    for id_ in copied:
+        assert target.read(id_) == source.read(id_)
+    # The hand-written file keeps its file time as updated_at.
+    db = PromptStore(directory, backend="sqlite")
+    hand = db.get_prompt("hand-written")
+    assert abs(hand.updated_at.timestamp() - source.stat("hand-written").modified) < 1e-3
+    assert db.get_prompt("a") == files.get_prompt("a")
+    assert migrate(source, target) == ([], ["a", "hand-written"])
+
+    back = tmp_path / "back"
+    copied, _ = migrate(target, MarkdownBackend(back), move=True)
+    assert (back / "a.md").read_text() == (directory / "a.md").read_text()
+    assert target.scan() == {}
+
+
+# -- Watcher tests --
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _watched_store(tmp_path):
+    s = PromptStore(tmp_path / "watched", cache_size=8)
+    s.init()
+    s.create_prompt(PromptCreate(name="p", content="one"))
+    return s
+
+
+def test_watcher_polling_refreshes_cache_and_listing(tmp_path):
+    s = _watched_store(tmp_path)
+    watcher = PromptWatcher(s, poll_interval=0.05, force_polling=True)
+    watcher.start()
+    try:
+        assert s.trust_cache
+        assert s.get_prompt("p").content == "one"
+        path = s.directory / "p.md"
+        path.write_text(path.read_text().replace("one", "edited externally"))
+        (s.directory / "q.md").write_text("---\nname: q\n---\nq\n")
+        assert _wait_for(lambda: s.get_prompt("p").content == "edited externally")
+        assert _wait_for(lambda: [i.id for i in s.list_prompts()] == ["p", "q"])
+    finally:
+        watcher.stop()
+    assert not s.trust_cache
+
+
+def test_watcher_events_refresh_cache(tmp_path):
+    pytest.importorskip("watchfiles")
+    s = _watched_store(tmp_path)
+    watcher = PromptWatcher(s, debounce_ms=50)
+    watcher.start()
+    try:
+        assert s.get_prompt("p").content == "one"
+        path = s.directory / "p.md"
+        path.write_text(path.read_text().replace("one", "edited externally"))
+        assert _wait_for(lambda: s.get_prompt("p").content == "edited externally")
+    finally:
+        watcher.stop()
+
+
+def test_watcher_reports_prompt_and_config_changes(tmp_path):
+    s = _watched_store(tmp_path)
+    batches = []
+    watcher = PromptWatcher(s, poll_interval=0.05, force_polling=True, on_change=batches.append)
+    watcher.start()
+    try:
+        (s.directory / "providers.yaml").write_text("providers: {}\n")
+        assert _wait_for(lambda: batches == [{s.directory / "providers.yaml"}])
+        s.create_prompt(PromptCreate(name="q", content="two"))
+        assert _wait_for(lambda: len(batches) == 2 and s.directory / "q.md" in batches[1])
+    finally:
+        watcher.stop()
+    watcher.apply({s.directory / ".prompter-index.db"})
+    assert len(batches) == 2
+
+
+def test_watcher_start_leaves_shared_cache_alone(workers):
+    a, b = workers
+    a.create_prompt(PromptCreate(name="q", content="two"))
+    assert a.get_prompt("p").content == "one"
+    assert a.get_prompt("q").content == "two"
+    path = a.directory / "q.md"
+    path.write_text(path.read_text().replace("two", "edited before the watch"))
+    watcher = PromptWatcher(a, poll_interval=0.05, force_polling=True)
+    watcher.start()
+    try:
+        assert a.get_prompt("q").content == "edited before the watch"
+    finally:
+        watcher.stop()
+    # Worker b still gets the unchanged prompt from the shared cache.
+    b._parse = _no_parse
+    assert b.get_prompt("p").content == "one"
+
+
+def test_watcher_bulk_change_triggers_single_rescan(tmp_path, monkeypatch):
+    s = _watched_store(tmp_path)
+    calls = []
+    monkeypatch.setattr(s, "refresh", lambda paths=None: calls.append(paths))
+    watcher = PromptWatcher(s, bulk_threshold=10)
+    watcher.apply({s.directory / f"f{i}.md" for i in range(100)})
+    watcher.apply({s.directory / "p.md", s.directory / ".prompter-index.db"})
+    assert calls == [None, {s.directory / "p.md"}]
+
+
 # -- Renderer tests --
 
 def test_render():
@@ -85,6 +786,157 @@ def test_render_missing_var():
         render_prompt("Hello {{name}}!", {})
 
 
+def test_render_reuses_compiled_template():
+    template_cache.clear()
+    render_prompt("Hi {{who}}", {"who": "a"})
+    render_prompt("Hi {{who}}", {"who": "b"})
+    info = template_cache.info()
+    assert info["misses"] == 1
+    assert info["hits"] == 1
+
+
+def test_template_cache_is_bounded():
+    cache = TemplateCache(maxsize=2)
+    for i in range(5):
+        cache.get_or_compile(f"template {i}")
+    assert cache.info()["size"] == 2
+
+
+def test_update_invalidates_compiled_template(store, sample_prompt):
+    template_cache.clear()
+    render_prompt(sample_prompt.content, {"name": "a", "place": "b"}, key=sample_prompt.id)
+    assert template_cache.info()["size"] == 1
+    store.update_prompt("test-prompt", PromptUpdate(content="Bye {{name}}"))
+    assert template_cache.info()["size"] == 0
+    updated = store.get_prompt("test-prompt")
+    assert render_prompt(updated.content, {"name": "a"}, key=updated.id) == "Bye a"
+
+
+def test_render_batch_reports_row_errors():
+    rows = ['{"name": "a"}', "", "{}", "[1]", '{"name": "b"}']
+    results = list(render_batch("Hi {{name}}", rows))
+    assert results[0] == {"index": 0, "rendered": "Hi a"}
+    assert "error" in results[1]
+    assert "error" in results[2]
+    assert results[3] == {"index": 3, "rendered": "Hi b"}
+
+
+def test_render_batch_parallel_keeps_order():
+    rows = [json.dumps({"n": str(i)}) for i in range(50)]
+    results = list(render_batch_parallel("#{{n}}", rows, workers=2, chunk_size=7))
+    assert [r["rendered"] for r in results] == [f"#{i}" for i in range(50)]
+
+
+@pytest.mark.parametrize("content,found,required", [
+    ("Hello {{name}}", ["name"], ["name"]),
+    ("{% if formal %}Dear {{title}}{% endif %}{{name.first}}", ["formal", "name", "title"], ["formal", "name"]),
+    ("{{ a | default('x') }}{% if b is defined %}{{b}}{% endif %}", ["a", "b"], []),
+    ("{% set s = 1 %}{{s}}{% for i in items %}{{i}}{{k}}{% endfor %}", ["items", "k"], ["items"]),
+    ("{{ a if b else c }}{{ d or e }}", ["a", "b", "c", "d", "e"], ["b", "d"]),
+    ("{{ unclosed", [], []),
+])
+def test_analyze_variables(content, found, required):
+    analysis = analyze_variables(content)
+    assert (analysis.found, analysis.required) == (found, required)
+    for name in required:
+        with pytest.raises(Exception):
+            render_prompt(content, {n: "x" for n in found if n != name})
+
+
+def test_store_keeps_variable_analysis(store, sample_prompt, monkeypatch):
+    from prompter.core import renderer
+
+    assert store.template_variables("test-prompt").required == ["name", "place"]
+    monkeypatch.setattr(renderer, "analyze_variables", lambda c: pytest.fail("re-analyzed"))
+    store.refresh([store.directory / "test-prompt.md"])  # e.g. the watcher seeing our write
+    assert store.template_variables("test-prompt").found == ["name", "place"]
+    monkeypatch.undo()
+    # Edited outside the store: analyzed on first request.
+    (store.directory / "test-prompt.md").write_text("---\nname: test-prompt\n---\n{{other}}\n")
+    assert store.template_variables("test-prompt").required == ["other"]
+
+
+def test_output_key_canonicalizes_variables():
+    assert output_key("x", "render", {"a": "1", "b": "2"}) == output_key("x", "render", {"b": "2", "a": "1"})
+    assert output_key("x", "render", {"a": "1"}) != output_key("x", "render", {"a": "2"})
+    assert output_key("x", "export:messages") != output_key("x", "export:text")
+    assert output_key("x", "render") != output_key("y", "render")
+
+
+def test_output_cache_counts_and_skips_huge_outputs():
+    cache = OutputCache(maxsize=2, max_entry=10)
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert cache.get_or_compute("k", lambda: compute("small")) == "small"
+    assert cache.get_or_compute("k", lambda: compute("other")) == "small"
+    cache.get_or_compute("big", lambda: compute("x" * 11))
+    cache.get_or_compute("big", lambda: compute("x" * 11))
+    assert calls == ["small", "x" * 11, "x" * 11]
+    info = cache.info()
+    assert (info["hits"], info["misses"], info["size"]) == (1, 3, 1)
+    assert info["hit_rate"] == 0.25
+
+
+# -- Composition tests --
+
+def test_include_follows_fragment_edits(store):
+    store.create_prompt(PromptCreate(name="Safety Preamble", content="Be safe, {{ user }}."))
+    main = store.create_prompt(PromptCreate(name="main", content='{% include "Safety Preamble" %} Do {{ task }}.'))
+    env = store.environment()
+    assert render_prompt(main.content, {"user": "Ada", "task": "x"}, key=main.id, env=env) == "Be safe, Ada. Do x."
+    digest = store.dependency_digest(main)
+    store.update_prompt("safety-preamble", PromptUpdate(content="Be kind, {{ user }}."))
+    assert render_prompt(main.content, {"user": "Ada", "task": "x"}, key=main.id, env=env) == "Be kind, Ada. Do x."
+    assert store.dependency_digest(main) not in ("", digest)
+    assert store.graph.dependents(["safety-preamble"]) == {"main"}
+
+
+def test_extends_and_imports_bundled_templates(store):
+    store.create_prompt(PromptCreate(name="base", content="[{% block body %}{% endblock %}]"))
+    store.create_prompt(PromptCreate(name="macros", content="{% macro shout(s) %}{{ s | upper }}{% endmacro %}"))
+    child = store.create_prompt(PromptCreate(
+        name="child",
+        content='{% extends "base" %}{% import "macros" as m %}{% block body %}{{ m.shout(word) }}{% endblock %}',
+    ))
+    env = store.environment()
+    assert render_prompt(child.content, {"word": "hi"}, env=env) == "[HI]"
+    assert "a short summary" in env.get_template("templates/summarizer").render(length="short", text="t")
+    with pytest.raises(Exception, match="nope"):
+        render_prompt('{% include "nope" %}', {}, env=env)
+
+
+def test_reference_cycles_are_refused(store):
+    from prompter.core.graph import CycleError
+
+    store.create_prompt(PromptCreate(name="a", content='{% include "b" %}'))
+    store.create_prompt(PromptCreate(name="b", content='{% include "c" %}'))
+    store.create_prompt(PromptCreate(name="c", content="leaf"))
+    with pytest.raises(CycleError, match="c -> a -> b -> c"):
+        store.update_prompt("c", PromptUpdate(content='{% include "a" %}'))
+    with pytest.raises(CycleError):
+        store.create_prompt(PromptCreate(name="self", content='{% extends "self" %}'))
+    result = store.bulk_create([Prompt(id="d", name="d", content='{% include "d" %}')])
+    assert result.errors and not result.created
+    assert store.get_prompt("c").content == "leaf"
+
+
+def test_dependency_graph_dependents():
+    from prompter.core.graph import DependencyGraph
+
+    graph = DependencyGraph()
+    graph.set("a", ["b"])
+    graph.set("b", ["c"])
+    graph.set("x", ["c"])
+    assert graph.dependents(["c"]) == {"a", "b", "x"}
+    graph.forget("b")
+    assert graph.dependents(["c"]) == {"x"}
+    assert DependencyGraph.find_cycle("c", ["a"], {"a": ["b"], "b": ["c"]}.get) == ["c", "a", "b", "c"]
+
+
 # -- Exporter tests --
 
 def test_export_by_format_messages(sample_prompt):
@@ -133,6 +985,154 @@ def test_export_unknown_defaults_to_messages(sample_prompt):
     assert '"role": "system"' in result
 
 
+# -- Bulk export tests --
+
+def _library(store):
+    store.create_prompt(PromptCreate(name="one", content="First"))
+    store.create_prompt(PromptCreate(name="two", content="Second"))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_export_directory_skips_unchanged_prompts(store, tmp_path, monkeypatch, workers):
+    from prompter.tools import bundle
+
+    _library(store)
+    (store.directory / "providers.yaml").write_text("providers:\n  house: markdown\n")
+    targets = bundle.resolve_targets(["openai", "house", "OpenAI"], store.directory)
+    assert targets == {"openai": "messages", "house": "markdown"}
+    out = tmp_path / "dist"
+    result = bundle.export_directory(store, targets, out, workers=workers)
+    assert sorted(result.written) == ["house/one.md", "house/two.md", "openai/one.json", "openai/two.json"]
+    assert json.loads((out / "openai/one.json").read_text())[0]["content"] == "First"
+    manifest = json.loads((out / "manifest.json").read_text())
+    entry = manifest["files"]["house/two.md"]
+    assert entry["id"] == "two" and entry["format"] == "markdown"
+    assert entry["sha256"] == hashlib.sha256(b"Second").hexdigest()
+
+    # Untouched prompts are not even read.
+    monkeypatch.setattr(bundle, "_export_chunk", lambda *a: pytest.fail("re-exported"))
+    assert bundle.export_directory(store, targets, out).unchanged == 4
+    monkeypatch.undo()
+
+    store.update_prompt("one", PromptUpdate(content="Changed"))
+    store.delete_prompt("two")
+    result = bundle.export_directory(store, targets, out, workers=workers)
+    assert sorted(result.written) == ["house/one.md", "openai/one.json"]
+    assert result.removed == ["house/two.md", "openai/two.json"]
+    assert not (out / "house/two.md").exists()
+    assert (out / "house/one.md").read_text() == "Changed"
+
+
+def test_export_archive_is_reproducible(store):
+    import io
+    import tarfile
+    import zipfile
+
+    from prompter.tools import bundle
+
+    _library(store)
+    targets = bundle.resolve_targets(["claude", "text"])
+    first, second = io.BytesIO(), io.BytesIO()
+    bundle.export_archive(store, targets, first, "tar.gz")
+    bundle.export_archive(store, targets, second, "tar.gz")
+    assert first.getvalue() == second.getvalue()
+    first.seek(0)
+    with tarfile.open(fileobj=first) as tar:
+        assert sorted(tar.getnames()) == [
+            "claude/one.md", "claude/two.md", "manifest.json", "text/one.txt", "text/two.txt",
+        ]
+        assert tar.extractfile("text/two.txt").read() == b"Second"
+    zipped = io.BytesIO()
+    bundle.export_archive(store, targets, zipped, "zip")
+    with zipfile.ZipFile(zipped) as z:
+        assert "signature" not in json.loads(z.read("manifest.json"))["files"]["claude/one.md"]
+    with pytest.raises(ValueError):
+        bundle.resolve_targets(["../etc"])
+
+
+def test_build_directory_follows_tool_and_providers_yaml(store, tmp_path, monkeypatch):
+    from prompter.tools import bundle
+
+    store.create_prompt(PromptCreate(name="one", content="First", tool="claude"))
+    store.create_prompt(PromptCreate(name="two", content="Second", tool="house"))
+    store.create_prompt(PromptCreate(name="manifest", content="Third", tool="openai"))
+    out = tmp_path / "dist"
+    result = bundle.build_directory(store, out, workers=2)
+    # Unknown providers export as messages.
+    assert sorted(result.written) == ["manifest.json", "one.md", "two.json"]
+    assert (out / "one.md").read_text() == "First"
+    assert json.loads((out / "manifest.json").read_text())[0]["content"] == "Third"
+    assert json.loads((out / bundle.BUILD_MANIFEST_FILENAME).read_text())["files"]["two.json"]["tool"] == "house"
+
+    # Only the prompt whose format providers.yaml changes is exported again.
+    (store.directory / "providers.yaml").write_text("providers:\n  house: text\n")
+    exported = []
+    real = bundle._export_chunk
+    monkeypatch.setattr(bundle, "_export_chunk", lambda *a: exported.extend(i for i, _ in a[4]) or real(*a))
+    result = bundle.build_directory(store, out)
+    assert exported == ["two"]
+    assert result.written == ["two.txt"] and result.removed == ["two.json"] and result.unchanged == 2
+    assert (out / "two.txt").read_text() == "Second"
+    assert bundle.build_directory(store, out, force=True).written == ["manifest.json", "one.md", "two.txt"]
+    assert not list(out.glob(".*.tmp"))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bulk_export_reports_malformed_prompts(store, tmp_path, workers):
+    from prompter.tools import bundle
+
+    _library(store)
+    (store.directory / "broken.md").write_text("---\nname: [unclosed\n---\nbody\n")
+    result = bundle.build_directory(store, tmp_path / "dist", workers=workers)
+    assert sorted(result.written) == ["one.txt", "two.txt"]
+    assert len(result.errors) == 1 and result.errors[0].startswith("broken: ")
+    (store.directory / "providers.yaml").write_text("providers: [unclosed\n")
+    with pytest.raises(ValueError, match="Invalid providers.yaml"):
+        bundle.build_directory(store, tmp_path / "dist")
+    with pytest.raises(ValueError, match="Invalid providers.yaml"):
+        bundle.resolve_targets(["openai"], store.directory)
+
+
+# -- Metrics tests --
+
+def test_metrics_exposition_format():
+    registry = metrics.Registry()
+    hits = registry.counter("t_hits", "Hits.", ("cache",))
+    seconds = registry.histogram("t_seconds", "Time.", buckets=(0.1, 1.0))
+    hits.inc(cache='a"b')
+    hits.inc(2, cache='a"b')
+    seconds.observe(0.05)
+    seconds.observe(0.5)
+    seconds.observe(7)
+    registry.add_collector(lambda: [("t_size", "gauge", "Size.", [("", {}, 3)])])
+    text = registry.exposition()
+    assert "# TYPE t_hits_total counter\nt_hits_total{cache=\"a\\\"b\"} 3\n" in text
+    assert 't_seconds_bucket{le="0.1"} 1\nt_seconds_bucket{le="1"} 2\nt_seconds_bucket{le="+Inf"} 3\n' in text
+    assert "t_seconds_sum 7.55\nt_seconds_count 3\n" in text
+    assert "# TYPE t_size gauge\nt_size 3\n" in text
+    with pytest.raises(ValueError):
+        registry.counter("t_hits", "Again.")
+
+
+def test_stage_timings_follow_the_request_onto_io_threads(store, sample_prompt):
+    io = IOExecutor(max_workers=1)
+    astore = AsyncPromptStore(store, io)
+    loads = metrics.stage_seconds.count(stage="load")
+
+    async def main():
+        with metrics.measure_request() as timings:
+            prompt = await astore.get_prompt("test-prompt")
+            render_prompt(prompt.content, {"name": "x", "place": "y"})
+        return timings
+
+    timings = asyncio.run(main())
+    io.shutdown()
+    assert [stage for stage, _ in timings] == ["load", "render"]
+    assert metrics.stage_seconds.count(stage="load") == loads + 1
+    header = metrics.server_timing(timings + [("load", 0.001)], 0.01)
+    assert header.startswith("load;dur=") and header.endswith("total;dur=10.000")
+    assert header.count("load") == 1 and "render;dur=" in header
+
 # -- Provider registry tests --
 
 def test_provider_format_mapping():
@@ -215,6 +1215,31 @@ def test_load_config_none_directory():
     assert merged["openai"] == "messages"
 
 
+def test_load_config_is_cached_until_file_changes(tmp_path, monkeypatch):
+    import os
+
+    from prompter.tools import exporters
+
+    config_path = tmp_path / "providers.yaml"
+    config_path.write_text("providers:\n  my-llm: markdown\n")
+    calls = []
+    real_parse = exporters._parse_config
+    monkeypatch.setattr(exporters, "_parse_config", lambda p: calls.append(p) or real_parse(p))
+    assert resolve_format("my-llm", tmp_path) == "markdown"
+    assert get_format_for_provider("my-llm", tmp_path) == "markdown"
+    assert len(calls) == 1
+    config_path.write_text("providers:\n  my-llm: text\n  other: markdown\n")
+    os.utime(config_path, ns=(0, 10**9))
+    assert resolve_format("my-llm", tmp_path) == "text"
+    assert len(calls) == 2
+
+
+def test_resolve_format():
+    assert resolve_format("markdown") == "markdown"
+    assert resolve_format("Claude") == "markdown"
+    assert resolve_format("some-new-provider") == "messages"
+
+
 def test_export_uses_custom_provider(tmp_path, sample_prompt):
     config_path = tmp_path / "providers.yaml"
     config_path.write_text("providers:\n  my-api: markdown\n")
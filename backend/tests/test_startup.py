@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+HEAVY = ("jinja2", "yaml", "frontmatter", "pydantic", "rich", "fastapi", "uvicorn")
+
+# Cumulative import time allowed for prompter.cli (best of several runs).
+# Eager imports cost roughly 300ms on a laptop; typer alone is about 45ms.
+BUDGET_MS = float(os.environ.get("PROMPTER_IMPORT_BUDGET_MS", "150"))
+
+
+def _python(*args: str, env: dict | None = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=BACKEND,
+        capture_output=True,
+        text=True,
+        env={**os.environ, **(env or {})},
+        check=True,
+    )
+
+
+def _loaded(code: str, env: dict | None = None) -> set[str]:
+    out = _python("-c", f"{code}\nimport sys; print(','.join(m for m in {HEAVY!r} if m in sys.modules))", env=env)
+    last = out.stdout.rstrip("\n").rsplit("\n", 1)[-1]
+    return set(filter(None, last.split(",")))
+
+
+def test_cli_import_defers_heavy_dependencies():
+    assert _loaded("import prompter.cli") == set()
+
+
+def test_export_skips_renderer(tmp_path):
+    prompts = tmp_path / "prompts"
+    prompts.mkdir()
+    (prompts / "p.md").write_text("---\nname: p\n---\nHello\n")
+    code = "from prompter.cli import app\napp(['export', 'p', '--format', 'claude'], standalone_mode=False)"
+    loaded = _loaded(code, env={"PROMPTER_DIR": str(prompts)})
+    assert "jinja2" not in loaded
+    assert "fastapi" not in loaded
+
+
+def test_cli_cold_import_within_budget():
+    best = None
+    for _ in range(3):
+        err = _python("-X", "importtime", "-c", "import prompter.cli").stderr
+        line = next(l for l in err.splitlines() if l.rstrip().endswith("| prompter.cli"))
+        cumulative_ms = int(line.split("|")[1]) / 1000
+        best = cumulative_ms if best is None else min(best, cumulative_ms)
+    assert best <= BUDGET_MS, f"prompter.cli import took {best:.1f}ms (budget {BUDGET_MS}ms)"
+
+
+def test_daemon_forwarding_skips_store(tmp_path):
+    prompts = tmp_path / "prompts"
+    prompts.mkdir()
+    (prompts / "p.md").write_text("---\nname: p\n---\nHello\n")
+    sock = tmp_path / "d.sock"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "prompter.cli", "daemon", "--socket", str(sock)],
+        cwd=BACKEND,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while not sock.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        code = "from prompter.cli import app\napp(['export', 'p', '--format', 'claude'], standalone_mode=False)"
+        loaded = _loaded(code, env={"PROMPTER_DIR": str(prompts), "PROMPTER_DAEMON_SOCKET": str(sock)})
+        assert {"pydantic", "frontmatter", "yaml", "jinja2"}.isdisjoint(loaded)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
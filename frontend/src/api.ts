@@ -2,10 +2,36 @@ import type { Prompt, PromptCreate, PromptListItem, Hint, Scaffold } from './typ
 
 const BASE = '/prompts'
 
-export async function listPrompts(): Promise<PromptListItem[]> {
-  const res = await fetch(BASE)
+export interface PromptFilters {
+  q?: string
+  tag?: string
+  tag_contains?: string
+  tool?: string
+  category?: string
+  limit?: number
+  cursor?: string
+}
+
+export interface PromptPage {
+  items: PromptListItem[]
+  total: number
+  nextCursor: string | null
+}
+
+export async function listPrompts(filters: PromptFilters = {}): Promise<PromptPage> {
+  const params = new URLSearchParams()
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== undefined && value !== '') params.set(key, String(value))
+  }
+  const query = params.toString()
+  const res = await fetch(query ? `${BASE}?${query}` : BASE)
   if (!res.ok) throw new Error('Failed to list prompts')
-  return res.json()
+  const items: PromptListItem[] = await res.json()
+  return {
+    items,
+    total: Number(res.headers.get('X-Total-Count') ?? items.length),
+    nextCursor: res.headers.get('X-Next-Cursor'),
+  }
 }
 
 export async function getPrompt(id: string): Promise<Prompt> {
@@ -9,23 +9,36 @@ interface Props {
   refreshKey: number
 }
 
+const PAGE_SIZE = 100
+
 export default function PromptList({ onSelect, onCreate, onBrowseTemplates, refreshKey }: Props) {
   const [prompts, setPrompts] = useState<PromptListItem[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [search, setSearch] = useState('')
   const [tagFilter, setTagFilter] = useState('')
 
+  // Filtering and pagination happen on the server; debounce keystrokes.
   useEffect(() => {
-    listPrompts().then(setPrompts).catch(() => {})
-  }, [refreshKey])
+    const timer = setTimeout(() => {
+      listPrompts({ q: search, tag_contains: tagFilter, limit: PAGE_SIZE })
+        .then((page) => {
+          setPrompts(page.items)
+          setNextCursor(page.nextCursor)
+        })
+        .catch(() => {})
+    }, 200)
+    return () => clearTimeout(timer)
+  }, [refreshKey, search, tagFilter])
 
-  const filtered = prompts.filter((p) => {
-    const matchesSearch =
-      !search ||
-      p.name.toLowerCase().includes(search.toLowerCase()) ||
-      p.description.toLowerCase().includes(search.toLowerCase())
-    const matchesTag = !tagFilter || p.tags.some((t) => t.toLowerCase().includes(tagFilter.toLowerCase()))
-    return matchesSearch && matchesTag
-  })
+  const loadMore = () => {
+    if (!nextCursor) return
+    listPrompts({ q: search, tag_contains: tagFilter, limit: PAGE_SIZE, cursor: nextCursor })
+      .then((page) => {
+        setPrompts((prev) => [...prev, ...page.items])
+        setNextCursor(page.nextCursor)
+      })
+      .catch(() => {})
+  }
 
   const handleDelete = async (e: React.MouseEvent, id: string) => {
     e.stopPropagation()
@@ -65,7 +78,7 @@ export default function PromptList({ onSelect, onCreate, onBrowseTemplates, refr
         </button>
       </div>
       <div className="space-y-2">
-        {filtered.map((p) => (
+        {prompts.map((p) => (
           <div
             key={p.id}
             onClick={() => onSelect(p.id)}
@@ -93,9 +106,17 @@ export default function PromptList({ onSelect, onCreate, onBrowseTemplates, refr
             </div>
           </div>
         ))}
-        {filtered.length === 0 && (
+        {prompts.length === 0 && (
           <p className="text-gray-500 text-center py-8">No prompts found.</p>
         )}
+        {nextCursor && (
+          <button
+            onClick={loadMore}
+            className="w-full py-2 text-sm text-blue-600 hover:text-blue-700"
+          >
+            Load more
+          </button>
+        )}
       </div>
     </div>
   )